@@ -0,0 +1,84 @@
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from typing import Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class BotIdentity:
+    """Cached get_me() result, refreshed in the background (stale-while-revalidate)
+
+    get() never makes a network call: it returns whatever is cached and, when
+    the value is older than refresh_interval, starts one background refresh.
+    A failed refresh keeps the previous value and is not retried for
+    retry_interval seconds.
+    """
+
+    def __init__(self, fetch: Callable[[], Any], refresh_interval: float = 3600.0, retry_interval: float = 30.0):
+        self.fetch = fetch
+        self.refresh_interval = refresh_interval
+        self.retry_interval = retry_interval
+        self._value = None
+        self._fetched = 0.0       # monotonic time of the last success
+        self._next_attempt = 0.0  # earliest time another refresh may start
+        self._pending: Optional[Future] = None
+        self._lock = threading.Lock()
+        self.last_error: Optional[Exception] = None
+        self.refreshes = 0
+        self.failures = 0
+
+    def get(self):
+        """The cached identity (None until the first fetch succeeds); stale values trigger a refresh"""
+        value = self._value
+        now = time.monotonic()
+        if value is None or now - self._fetched >= self.refresh_interval:
+            if now >= self._next_attempt:
+                self.refresh()
+        return value
+
+    def refresh(self) -> Future:
+        """Start a background fetch unless one is running; resolves to the identity"""
+        with self._lock:
+            if self._pending is not None:
+                return self._pending
+            future = self._pending = Future()
+            self._next_attempt = time.monotonic() + self.retry_interval
+        threading.Thread(target=self._run, args=(future,), name="bot-identity", daemon=True).start()
+        return future
+
+    def _run(self, future: Future):
+        try:
+            value = self.fetch()
+        except Exception as e:
+            self.failures += 1
+            self.last_error = e
+            logger.error(f"Error getting bot info: {e}")
+            with self._lock:
+                self._pending = None
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._value = value
+            self._fetched = time.monotonic()
+            self.last_error = None
+            self.refreshes += 1
+            self._pending = None
+        future.set_result(value)
+
+    @property
+    def age(self) -> Optional[float]:
+        """Seconds since the cached value was fetched"""
+        if self._value is None:
+            return None
+        return time.monotonic() - self._fetched
+
+    def stats(self) -> dict:
+        return {
+            "cached": self._value is not None,
+            "age": self.age,
+            "refreshes": self.refreshes,
+            "failures": self.failures,
+            "last_error": str(self.last_error) if self.last_error else None,
+        }
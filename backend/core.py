@@ -0,0 +1,529 @@
+"""
+Bot components shared by server.py (FastAPI) and serverless.py (cold-start entry point).
+
+Importing this module makes no network calls and imports neither FastAPI nor
+telebot: the TeleBot instance is built on its first API call and handlers.py
+is imported when the first update is processed.
+"""
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Awaitable, Callable, Optional, Tuple
+
+# Sibling modules are imported flat, both under uvicorn (cwd=backend) and on Vercel
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if _BACKEND_DIR not in sys.path:
+    sys.path.insert(0, _BACKEND_DIR)
+
+from dispatch import DispatchRejected, create_dispatcher
+from membership import MembershipCache, MembershipChecker
+from session_store import SessionStore
+from state_backend import create_backend
+from ratelimit import SubmissionLimiter
+from outbound import OutboundScheduler, PersistentQueue
+from outbox import OutboxLog, import_jobs
+from similarity import DuplicateIndex
+from moderation import Moderator
+from review import ReviewQueue
+from dedup import UpdateDeduplicator
+from fastpath import parse_update
+from router import Router
+from metrics import ApiCallMetrics, Registry
+from bot_identity import BotIdentity
+from logsetup import configure_logging, parse_sample_rates, stop_logging
+from transport import BotApiTransport
+
+# Bot identity (getMe) cache
+BOT_INFO_REFRESH_INTERVAL = float(os.getenv("BOT_INFO_REFRESH_INTERVAL", "3600"))
+
+# Logging Configuration
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")  # text or json (one object per line)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_BACKGROUND = os.getenv("LOG_BACKGROUND", "1") == "1"  # format and write logs on a listener thread
+# Fraction of hot-path events kept, as event=rate pairs; unlisted events are always logged
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "webhook.received=0.01,update.handled=0.1")
+LOG_PAYLOADS = os.getenv("LOG_PAYLOADS", "0") == "1"  # include update bodies and message text
+
+configure_logging(
+    fmt=LOG_FORMAT,
+    level=LOG_LEVEL,
+    background=LOG_BACKGROUND,
+    sample_rates=parse_sample_rates(LOG_SAMPLE_RATES),
+)
+logger = logging.getLogger(__name__)
+
+# Bot Configuration
+BOT_TOKEN = os.getenv("BOT_TOKEN", "7835189612:AAF6tluzNvRoWdR5FQaOTADO7mdVJWcie1U")
+CHANNEL_ID = -1002589515039  # @Anofes
+REQUIRED_CHATS = ["@Anofes", "@Mwtlan", "@KhamahdalysRoom"]
+
+# Duplicate confessions: exact or near-identical (SimHash) to a post of the last SPAM_WINDOW seconds
+# reject: the user is asked for another text; delay: posted after SPAM_DELAY seconds;
+# review: sent to REVIEW_CHAT_ID instead of the channel; off: not checked
+SPAM_ACTION = os.getenv("SPAM_ACTION", "reject")
+SPAM_WINDOW = float(os.getenv("SPAM_WINDOW", "3600"))
+SPAM_MAX_DISTANCE = int(os.getenv("SPAM_MAX_DISTANCE", "3"))  # differing SimHash bits still counted as a duplicate
+SPAM_INDEX_SIZE = int(os.getenv("SPAM_INDEX_SIZE", "65536"))  # recent posts remembered
+SPAM_DELAY = float(os.getenv("SPAM_DELAY", "600"))
+
+# Moderation: confessions containing a blocklist entry (one per line, reloaded when the file changes)
+# reject: the user is asked for another text; review: sent to REVIEW_CHAT_ID instead; off: not checked
+MODERATION_ACTION = os.getenv("MODERATION_ACTION", "reject")
+MODERATION_BLOCKLIST_PATH = os.getenv("MODERATION_BLOCKLIST_PATH", os.path.join(_BACKEND_DIR, "blocklist.txt"))
+MODERATION_RELOAD_INTERVAL = float(os.getenv("MODERATION_RELOAD_INTERVAL", "5"))
+
+# Admin review queue: held posts wait in REVIEW_CHAT_ID until an admin approves or rejects them
+# flagged: only posts held by SPAM_ACTION/MODERATION_ACTION=review; all: every confession (moderated mode)
+REVIEW_CHAT_ID = int(os.getenv("REVIEW_CHAT_ID", "0")) or None
+REVIEW_MODE = os.getenv("REVIEW_MODE", "flagged")
+REVIEW_QUEUE_PATH = os.getenv("REVIEW_QUEUE_PATH", "review_queue.db")
+REVIEW_BATCH_SIZE = int(os.getenv("REVIEW_BATCH_SIZE", "10"))  # posts the "approve next" button publishes
+REVIEW_BATCH_MAX = int(os.getenv("REVIEW_BATCH_MAX", "100"))  # most posts one /approve N publishes
+
+# Long polling (python polling.py), instead of the webhook, for self-hosted nodes
+POLLING_TIMEOUT = int(os.getenv("POLLING_TIMEOUT", "25"))  # seconds getUpdates waits for updates
+POLLING_LIMIT = int(os.getenv("POLLING_LIMIT", "100"))  # updates per getUpdates, 1-100
+POLLING_OFFSET_PATH = os.getenv("POLLING_OFFSET_PATH", "polling_offset")
+POLLING_DELETE_WEBHOOK = os.getenv("POLLING_DELETE_WEBHOOK", "1") == "1"
+
+# Dispatch Configuration
+# inline: handlers run in the request's threadpool slot before responding (safe on serverless)
+# pool:   updates are queued to DISPATCH_WORKERS threads and the webhook returns immediately
+# batch:  like pool, but updates arriving within DISPATCH_BATCH_WINDOW are run as one batch, per chat
+DISPATCH_MODE = os.getenv("DISPATCH_MODE", "inline")
+DISPATCH_WORKERS = int(os.getenv("DISPATCH_WORKERS", "8"))
+DISPATCH_QUEUE_SIZE = int(os.getenv("DISPATCH_QUEUE_SIZE", "1000"))
+DISPATCH_OVERFLOW = os.getenv("DISPATCH_OVERFLOW", "reject")  # reject, drop or block
+DISPATCH_BLOCK_TIMEOUT = float(os.getenv("DISPATCH_BLOCK_TIMEOUT", "1.0"))
+DISPATCH_BATCH_WINDOW = float(os.getenv("DISPATCH_BATCH_WINDOW", "0.005"))  # seconds
+DISPATCH_BATCH_MAX = int(os.getenv("DISPATCH_BATCH_MAX", "64"))
+# pool/batch: a chat's updates run one at a time; this many more may wait behind the one in flight
+DISPATCH_CHAT_QUEUE_SIZE = int(os.getenv("DISPATCH_CHAT_QUEUE_SIZE", "16"))
+DEDUP_WINDOW = int(os.getenv("DEDUP_WINDOW", "4096"))  # recent update_ids remembered, 0 disables
+
+# Membership Verification
+MEMBERSHIP_PARALLEL = os.getenv("MEMBERSHIP_PARALLEL", "1") == "1"
+MEMBERSHIP_TIMEOUT = float(os.getenv("MEMBERSHIP_TIMEOUT", "5.0"))
+MEMBERSHIP_WORKERS = int(os.getenv("MEMBERSHIP_WORKERS", "16"))
+MEMBERSHIP_CACHE_TTL = float(os.getenv("MEMBERSHIP_CACHE_TTL", "300"))
+MEMBERSHIP_CACHE_NEGATIVE_TTL = float(os.getenv("MEMBERSHIP_CACHE_NEGATIVE_TTL", "5"))
+MEMBERSHIP_CACHE_MAX_BYTES = int(os.getenv("MEMBERSHIP_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Session Configuration
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "3600"))
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", "100000"))
+
+# Shared state backend for multi-worker deployments
+# memory | sqlite:///path/state.db | redis://[:password@]host:port/db
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory")
+STATE_CACHE_TTL = float(os.getenv("STATE_CACHE_TTL", "1.0"))
+STATE_FLUSH_INTERVAL = float(os.getenv("STATE_FLUSH_INTERVAL", "0"))  # 0 = flush after every update
+
+# Confession submissions (texts sent for preview), limited per user and overall; 0 = no limit.
+# With a shared STATE_BACKEND every worker enforces the same limits.
+SUBMIT_USER_LIMIT = int(os.getenv("SUBMIT_USER_LIMIT", "10"))  # per SUBMIT_USER_PERIOD seconds
+SUBMIT_USER_PERIOD = float(os.getenv("SUBMIT_USER_PERIOD", "3600"))
+SUBMIT_GLOBAL_LIMIT = int(os.getenv("SUBMIT_GLOBAL_LIMIT", "0"))  # per SUBMIT_GLOBAL_PERIOD seconds
+SUBMIT_GLOBAL_PERIOD = float(os.getenv("SUBMIT_GLOBAL_PERIOD", "60"))
+SUBMIT_LIMITER_SLOTS = int(os.getenv("SUBMIT_LIMITER_SLOTS", str(1 << 18)))  # users tracked in memory, 16 bytes each
+
+# Outbound rate limits (Telegram: ~30 msg/s overall, ~1 msg/s per private chat, ~20 msg/min per channel)
+OUTBOUND_GLOBAL_RATE = float(os.getenv("OUTBOUND_GLOBAL_RATE", "30"))
+OUTBOUND_PRIVATE_RATE = float(os.getenv("OUTBOUND_PRIVATE_RATE", "1"))
+OUTBOUND_CHANNEL_RATE_PER_MIN = float(os.getenv("OUTBOUND_CHANNEL_RATE_PER_MIN", "20"))
+OUTBOUND_SENDERS = int(os.getenv("OUTBOUND_SENDERS", "4"))
+# Pending channel posts: "log" (segment files, group-committed fsyncs) or "sqlite" (one table)
+OUTBOUND_STORE = os.getenv("OUTBOUND_STORE", "log")
+OUTBOUND_QUEUE_PATH = os.getenv(  # log directory or SQLite file; empty disables persistence
+    "OUTBOUND_QUEUE_PATH", "outbound_log" if OUTBOUND_STORE == "log" else "outbound_queue.db"
+)
+OUTBOUND_LOG_SEGMENT_BYTES = int(os.getenv("OUTBOUND_LOG_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+OUTBOUND_LOG_FSYNC = os.getenv("OUTBOUND_LOG_FSYNC", "1") == "1"
+# SQLite queue (outbound_queue.db) of an earlier version whose pending posts are moved into the log at startup
+OUTBOUND_IMPORT_PATH = os.getenv("OUTBOUND_IMPORT_PATH", "")
+OUTBOUND_WAIT_TIMEOUT = float(os.getenv("OUTBOUND_WAIT_TIMEOUT", "10"))
+
+# Bot API transport: one keep-alive pool shared by the outbound senders and membership lookups
+BOT_API_TRANSPORT = os.getenv("BOT_API_TRANSPORT", "auto")  # auto, httpx, requests or telebot (its default)
+BOT_API_POOL_SIZE = int(os.getenv("BOT_API_POOL_SIZE", str(OUTBOUND_SENDERS + MEMBERSHIP_WORKERS + 1)))
+BOT_API_HTTP2 = os.getenv("BOT_API_HTTP2", "1") == "1"  # used when httpx and h2 are installed
+BOT_API_CONNECT_TIMEOUT = float(os.getenv("BOT_API_CONNECT_TIMEOUT", "5"))
+BOT_API_READ_TIMEOUT = float(os.getenv("BOT_API_READ_TIMEOUT", "10"))
+# Bot API endpoint template, e.g. a local fake for load tests (see loadtest/)
+BOT_API_URL = os.getenv("BOT_API_URL", "")  # empty uses https://api.telegram.org/bot{0}/{1}
+
+
+class LazyTeleBot:
+    """TeleBot that is only built, and telebot only imported, when first used"""
+
+    def __init__(self, token: str, setup: Optional[Callable[[], None]] = None, **kwargs):
+        self._token = token
+        # Runs once, right before the TeleBot is built (e.g. to configure apihelper)
+        self._setup = setup
+        self._kwargs = kwargs
+        self._bot = None
+        self._lock = threading.Lock()
+        # Why the last attempt to build the TeleBot failed; None once it is built
+        self.build_error: Optional[Exception] = None
+
+    def build(self):
+        """Build the TeleBot now (running setup) and return it; later calls return the same bot"""
+        return self._get()
+
+    def _get(self):
+        if self._bot is None:
+            with self._lock:
+                if self._bot is None:
+                    try:
+                        import telebot
+
+                        if self._setup is not None:
+                            self._setup()
+                        self._bot = telebot.TeleBot(self._token, **self._kwargs)
+                    except Exception as e:
+                        self.build_error = e
+                        logger.error("Failed to initialize bot: %s", e)
+                        raise
+                    self.build_error = None
+                    logger.info("Bot initialized successfully")
+        return self._bot
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    def method(self, name: str) -> Callable:
+        """A bot method that can be handed out now without building the bot"""
+        def call(*args, **kwargs):
+            return getattr(self._get(), name)(*args, **kwargs)
+        return call
+
+
+bot_api_transport = BotApiTransport(
+    pool_size=BOT_API_POOL_SIZE,
+    connect_timeout=BOT_API_CONNECT_TIMEOUT,
+    read_timeout=BOT_API_READ_TIMEOUT,
+    http2=BOT_API_HTTP2,
+    backend=BOT_API_TRANSPORT,
+)
+
+
+def _configure_telebot():
+    from telebot import apihelper
+
+    if BOT_API_URL:
+        apihelper.API_URL = BOT_API_URL
+    bot_api_transport.install()
+
+
+# Handlers are executed by our dispatcher, not telebot's internal worker pool
+bot = LazyTeleBot(BOT_TOKEN, setup=_configure_telebot, parse_mode="HTML", threaded=False)
+
+
+def _get_chat_member(chat_id, user_id, timeout: Optional[float] = None):
+    """bot.get_chat_member with the transport's timeouts capped at `timeout` for this one request"""
+    with bot_api_transport.timeout(timeout):
+        return bot.get_chat_member(chat_id, user_id)
+
+
+# Prometheus metrics served at /metrics; recording takes no lock
+metrics = Registry()
+api_metrics = ApiCallMetrics(metrics)
+webhook_requests = metrics.counter("menfes_webhook_requests_total", "Webhook requests by outcome", ("outcome",))
+webhook_duration = metrics.histogram("menfes_webhook_request_duration_seconds", "Time to answer a webhook request")
+update_latency = metrics.histogram(
+    "menfes_update_latency_seconds", "Webhook receipt to handler completion, including queueing"
+)
+handler_duration = metrics.histogram("menfes_handler_duration_seconds", "Handler execution time", ("handler",))
+_BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+dispatch_batch_size = metrics.histogram(
+    "menfes_dispatch_batch_size", "Updates per dispatch batch (batch mode)", buckets=_BATCH_BUCKETS
+)
+dispatch_batch_chats = metrics.histogram(
+    "menfes_dispatch_batch_chats", "Distinct chats per dispatch batch (batch mode)", buckets=_BATCH_BUCKETS
+)
+outbox_commit_size = metrics.histogram(
+    "menfes_outbox_commit_size", "Outbox log records written per fsync", buckets=_BATCH_BUCKETS
+)
+duplicate_posts = metrics.counter(
+    "menfes_duplicate_posts_total", "Confessions matching a recent post, by action taken", ("action",)
+)
+submissions_limited = metrics.counter(
+    "menfes_submissions_limited_total", "Confession submissions refused by the submission limits", ("scope",)
+)
+moderated_posts = metrics.counter(
+    "menfes_moderated_posts_total", "Confessions containing a blocklist entry, by action taken", ("action",)
+)
+reviewed_posts = metrics.counter(
+    "menfes_reviewed_posts_total", "Held confessions decided by an admin", ("decision",)
+)
+_webhook_ok = webhook_requests.labels("ok")
+_webhook_duplicate = webhook_requests.labels("duplicate")
+_webhook_rejected = webhook_requests.labels("rejected")
+_webhook_error = webhook_requests.labels("error")
+
+state_backend = create_backend(STATE_BACKEND)
+
+# In-memory session storage, optionally backed by a shared store
+sessions = SessionStore(
+    idle_timeout=SESSION_IDLE_TIMEOUT,
+    max_sessions=SESSION_MAX_ENTRIES,
+    backend=state_backend,
+    cache_ttl=STATE_CACHE_TTL,
+    flush_interval=STATE_FLUSH_INTERVAL,
+)
+
+submission_limiter = SubmissionLimiter(
+    SUBMIT_USER_LIMIT,
+    SUBMIT_USER_PERIOD,
+    global_limit=SUBMIT_GLOBAL_LIMIT,
+    global_period=SUBMIT_GLOBAL_PERIOD,
+    slots=SUBMIT_LIMITER_SLOTS,
+    backend=state_backend,
+)
+
+def _open_outbound_store():
+    if not OUTBOUND_QUEUE_PATH:
+        return None
+    try:
+        # A file there is an SQLite queue configured before the log store existed
+        if OUTBOUND_STORE == "sqlite" or os.path.isfile(OUTBOUND_QUEUE_PATH):
+            return PersistentQueue(OUTBOUND_QUEUE_PATH)
+        store = OutboxLog(
+            OUTBOUND_QUEUE_PATH,
+            segment_bytes=OUTBOUND_LOG_SEGMENT_BYTES,
+            fsync=OUTBOUND_LOG_FSYNC,
+            commit_sizes=outbox_commit_size,
+        )
+        _import_sqlite_queue(store)
+        return store
+    except Exception as e:
+        logger.error(f"Outbound queue persistence disabled, cannot open {OUTBOUND_QUEUE_PATH}: {e}")
+        return None
+
+def _import_sqlite_queue(store):
+    """Move the posts left in the SQLite queue named by OUTBOUND_IMPORT_PATH into the log"""
+    if not OUTBOUND_IMPORT_PATH:
+        return
+    if not os.path.isfile(OUTBOUND_IMPORT_PATH):
+        logger.warning(f"OUTBOUND_IMPORT_PATH {OUTBOUND_IMPORT_PATH} not found, nothing imported")
+        return
+    legacy = PersistentQueue(OUTBOUND_IMPORT_PATH)
+    try:
+        moved = import_jobs(legacy, store)
+    finally:
+        legacy.close()
+    logger.info(f"Imported {moved} pending outbound messages from {OUTBOUND_IMPORT_PATH}")
+
+# Every Bot API call made by the handlers goes through this scheduler
+outbound = OutboundScheduler(
+    bot,
+    global_rate=OUTBOUND_GLOBAL_RATE,
+    private_rate=OUTBOUND_PRIVATE_RATE,
+    group_rate=OUTBOUND_CHANNEL_RATE_PER_MIN / 60,
+    senders=OUTBOUND_SENDERS,
+    store=_open_outbound_store(),
+    api_metrics=api_metrics,
+)
+
+# Fetched in the background on first use and refreshed while stale copies keep being served
+bot_identity = BotIdentity(
+    api_metrics.wrap("get_me", bot.method("get_me")),
+    refresh_interval=BOT_INFO_REFRESH_INTERVAL,
+)
+
+# Handler routing tables, filled by handlers.py when it is imported
+# The admin review chat gets only the admin commands and buttons, never the confession flow
+router = Router(step_lookup=sessions.step, reserved_chats=() if REVIEW_CHAT_ID is None else (REVIEW_CHAT_ID,))
+
+def load_handlers():
+    """Register the handlers; deferred to the first update to keep cold starts short"""
+    import handlers  # noqa: F401
+
+def process_updates(views):
+    """Run the handlers, then write the session changes they made in one batch"""
+    load_handlers()
+    try:
+        with outbound.collect() as sent:
+            for view in views:
+                started = time.perf_counter()
+                route = router.dispatch(view)
+                finished = time.perf_counter()
+                if route is not None:
+                    handler_duration.labels(route.name).observe(finished - started)
+                update_latency.observe(finished - view.received)
+                logger.info(
+                    "Handled update %s", view.update_id,
+                    extra={
+                        "event": "update.handled",
+                        "update_id": view.update_id,
+                        "handler": route.name if route else None,
+                        "latency_ms": round((finished - started) * 1000, 2),
+                    },
+                )
+        if DISPATCH_MODE == "inline":
+            # Serverless may freeze the process once we respond, so let the replies go out first
+            if not outbound.wait(sent, OUTBOUND_WAIT_TIMEOUT):
+                logger.warning("Responding before all outbound messages were sent")
+    finally:
+        if not sessions.flush_interval:
+            sessions.flush()
+
+# Drops Telegram's webhook redeliveries before any parsing work
+deduplicator = UpdateDeduplicator(DEDUP_WINDOW) if DEDUP_WINDOW > 0 else None
+
+dispatcher = create_dispatcher(
+    process_updates,
+    mode=DISPATCH_MODE,
+    workers=DISPATCH_WORKERS,
+    queue_size=DISPATCH_QUEUE_SIZE,
+    overflow=DISPATCH_OVERFLOW,
+    block_timeout=DISPATCH_BLOCK_TIMEOUT,
+    batch_window=DISPATCH_BATCH_WINDOW,
+    batch_max=DISPATCH_BATCH_MAX,
+    batch_sizes=dispatch_batch_size,
+    batch_chats=dispatch_batch_chats,
+    chat_queue_size=DISPATCH_CHAT_QUEUE_SIZE,
+)
+
+membership_cache = MembershipCache(
+    positive_ttl=MEMBERSHIP_CACHE_TTL,
+    negative_ttl=MEMBERSHIP_CACHE_NEGATIVE_TTL,
+    max_bytes=MEMBERSHIP_CACHE_MAX_BYTES,
+)
+
+membership_checker = MembershipChecker(
+    api_metrics.wrap("get_chat_member", _get_chat_member),
+    REQUIRED_CHATS,
+    timeout=MEMBERSHIP_TIMEOUT,
+    parallel=MEMBERSHIP_PARALLEL,
+    max_workers=MEMBERSHIP_WORKERS,
+    cache=membership_cache,
+)
+
+if SPAM_ACTION == "review" and REVIEW_CHAT_ID is None:
+    logger.warning("SPAM_ACTION=review needs REVIEW_CHAT_ID; rejecting duplicates instead")
+    SPAM_ACTION = "reject"
+if MODERATION_ACTION == "review" and REVIEW_CHAT_ID is None:
+    logger.warning("MODERATION_ACTION=review needs REVIEW_CHAT_ID; rejecting blocked posts instead")
+    MODERATION_ACTION = "reject"
+if REVIEW_MODE == "all" and REVIEW_CHAT_ID is None:
+    logger.warning("REVIEW_MODE=all needs REVIEW_CHAT_ID; publishing posts without review")
+    REVIEW_MODE = "flagged"
+
+# Posts waiting for an admin's decision; None without an admin chat
+review_queue = None if REVIEW_CHAT_ID is None else ReviewQueue(REVIEW_QUEUE_PATH)
+
+# Blocklist filter, rebuilt when MODERATION_BLOCKLIST_PATH changes; None when posts are not checked
+moderator = None if MODERATION_ACTION == "off" else Moderator(
+    MODERATION_BLOCKLIST_PATH, check_interval=MODERATION_RELOAD_INTERVAL
+)
+
+# Fingerprints of recent channel posts; None when duplicates are not checked
+duplicate_index = None if SPAM_ACTION == "off" else DuplicateIndex(
+    window=SPAM_WINDOW,
+    capacity=SPAM_INDEX_SIZE,
+    max_distance=SPAM_MAX_DISTANCE,
+)
+
+# Queue depths and sizes are read when scraped, not tracked on the hot path
+metrics.gauge("menfes_dispatch_queue_depth", "Updates waiting for a dispatch worker", dispatcher.qsize)
+metrics.gauge("menfes_outbound_queue_depth", "Bot API calls waiting to be sent", outbound.qsize)
+metrics.gauge("menfes_outbound_in_flight", "Bot API calls being sent", lambda: outbound.in_flight)
+metrics.gauge("menfes_sessions_live", "Sessions held in memory", lambda: len(sessions))
+if review_queue is not None:
+    metrics.gauge("menfes_review_queue_depth", "Confessions waiting for an admin", lambda: len(review_queue))
+metrics.gauge("menfes_membership_cache_entries", "Cached membership answers", lambda: len(membership_cache))
+metrics.gauge("menfes_bot_api_pool_size", "Bot API connections in the pool", lambda: bot_api_transport.pool_size)
+metrics.gauge("menfes_bot_api_pool_in_use", "Bot API connections carrying a request", lambda: bot_api_transport.in_use)
+metrics.counter_func(
+    "menfes_bot_api_pool_waits_total", "Bot API requests that waited for a free connection",
+    lambda: bot_api_transport.waits,
+)
+
+async def receive_webhook(body: bytes, run_blocking: Callable[..., Awaitable]) -> Tuple[int, dict]:
+    """Parse, deduplicate and dispatch one webhook body; returns the HTTP status and JSON body
+
+    run_blocking(func, *args) runs func off the event loop; it is used when the
+    dispatcher may block (inline mode runs the handlers inside submit).
+    """
+    if bot.build_error is not None:
+        return 500, {"detail": "Bot not initialized"}
+    
+    started = time.perf_counter()
+    update_id = None
+    try:
+        # Only the routing fields are read here; telebot objects are built later, if at all
+        view = parse_update(body)
+        update_id = view.update_id
+        # Lazy %-formatting: sampled-out records are never rendered
+        if LOG_PAYLOADS:
+            logger.info("Received webhook: %s", view.raw, extra={"event": "webhook.received", "update_id": update_id})
+        else:
+            logger.info("Received webhook %s (%s)", update_id, view.kind, extra={"event": "webhook.received", "update_id": update_id})
+        
+        if deduplicator is not None and isinstance(update_id, int) and deduplicator.seen(update_id):
+            logger.info("Dropping duplicate update %s", update_id, extra={"event": "webhook.duplicate", "update_id": update_id})
+            _webhook_duplicate.inc()
+            return 200, {"ok": True}
+        
+        if dispatcher.may_block:
+            await run_blocking(dispatcher.submit, view)
+        else:
+            dispatcher.submit(view)
+        
+        _webhook_ok.inc()
+        return 200, {"ok": True}
+    except DispatchRejected:
+        # Non-2xx makes Telegram redeliver the update later
+        _forget_update(update_id)
+        _webhook_rejected.inc()
+        logger.warning("Webhook rejected: dispatch queue full")
+        return 503, {"detail": "Server busy, retry later"}
+    except Exception as e:
+        _forget_update(update_id)
+        _webhook_error.inc()
+        logger.error(f"Error processing webhook: {e}")
+        return 500, {"detail": f"Error processing webhook: {str(e)}"}
+    finally:
+        webhook_duration.observe(time.perf_counter() - started)
+
+def _forget_update(update_id):
+    """Let Telegram's redelivery of a failed update through the deduplicator"""
+    if deduplicator is not None and isinstance(update_id, int):
+        deduplicator.forget(update_id)
+
+def submit_polled_update(view):
+    """Deduplicate and dispatch an update fetched by polling.py; raises DispatchRejected when full"""
+    if deduplicator is not None and isinstance(view.update_id, int) and deduplicator.seen(view.update_id):
+        _webhook_duplicate.inc()
+        return
+    try:
+        dispatcher.submit(view)
+    except DispatchRejected:
+        _forget_update(view.update_id)
+        raise
+
+def restore_outbound():
+    """Re-queue channel posts accepted before the last restart"""
+    outbound.restore()
+
+def warm_bot_identity():
+    """Fetch getMe in the background so neither import nor startup waits on the network"""
+    bot_identity.refresh().add_done_callback(_log_bot_ready)
+
+def _log_bot_ready(future):
+    if future.exception() is None:
+        logger.info(f"Bot @{future.result().username} is ready!")
+
+def shutdown_dispatcher():
+    """Drain queued updates before the worker exits"""
+    dispatcher.shutdown()
+    outbound.shutdown(timeout=OUTBOUND_WAIT_TIMEOUT)
+    membership_checker.shutdown()
+    sessions.close()
+    if review_queue is not None:
+        review_queue.close()
+    bot_api_transport.close()
+    stop_logging()
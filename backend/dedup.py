@@ -0,0 +1,46 @@
+import threading
+from array import array
+
+_EMPTY = -1
+
+
+class UpdateDeduplicator:
+    """Remembers the last `window` update_ids in a fixed ring to drop redeliveries in O(1)
+
+    Telegram assigns consecutive update_ids, so slot update_id % window holds the
+    most recent id that mapped there; a redelivery finds its own id in its slot.
+    The ring is a flat array of int64 (8 bytes per remembered update).
+    """
+
+    def __init__(self, window: int = 4096):
+        self.window = max(1, window)
+        self._ring = array("q", [_EMPTY]) * self.window
+        self._lock = threading.Lock()
+        self.accepted = 0
+        self.duplicates = 0
+
+    def seen(self, update_id: int) -> bool:
+        """Record update_id; True if it was already recorded (a duplicate)"""
+        slot = update_id % self.window
+        with self._lock:
+            if self._ring[slot] == update_id:
+                self.duplicates += 1
+                return True
+            self._ring[slot] = update_id
+            self.accepted += 1
+            return False
+
+    def forget(self, update_id: int):
+        """Un-record an update that was not processed, so Telegram's retry is accepted"""
+        slot = update_id % self.window
+        with self._lock:
+            if self._ring[slot] == update_id:
+                self._ring[slot] = _EMPTY
+                self.accepted -= 1
+
+    def stats(self) -> dict:
+        return {
+            "window": self.window,
+            "accepted": self.accepted,
+            "duplicates": self.duplicates,
+        }
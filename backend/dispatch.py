@@ -0,0 +1,339 @@
+import logging
+import queue
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from keyed_executor import KeyedExecutor, KeyQueueFull
+
+logger = logging.getLogger(__name__)
+
+# Backpressure policies applied when the pool queue is full
+OVERFLOW_REJECT = "reject"  # refuse the update so Telegram redelivers it later
+OVERFLOW_DROP = "drop"      # acknowledge the update and discard it
+OVERFLOW_BLOCK = "block"    # wait up to block_timeout for a free slot, then reject
+OVERFLOW_POLICIES = (OVERFLOW_REJECT, OVERFLOW_DROP, OVERFLOW_BLOCK)
+
+_STOP = object()
+
+
+class DispatchRejected(Exception):
+    """Raised when an update cannot be accepted because the queue is full"""
+
+
+class InlineDispatcher:
+    """Process every update on the calling thread before returning
+
+    Webhook deliveries arrive on several threads at once; updates for the same
+    chat take turns on a per-chat lock, so a user's double taps never race on
+    the session. A chat's lock exists only while it has updates in flight.
+    """
+
+    # The webhook has to move submit() off the event loop
+    may_block = True
+
+    def __init__(self, process: Callable[[List[Any]], None]):
+        self.process = process
+        self.processed = 0
+        self._lock = threading.Lock()
+        # chat key -> [lock, updates holding or waiting for it]
+        self._chats: Dict[Any, list] = {}
+
+    def submit(self, update) -> bool:
+        key = _chat_key(update)
+        with self._lock:
+            entry = self._chats.get(key)
+            if entry is None:
+                entry = self._chats[key] = [threading.Lock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                self.process([update])
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if not entry[1]:
+                    del self._chats[key]
+                self.processed += 1
+        return True
+
+    def qsize(self) -> int:
+        return 0
+
+    def stats(self) -> dict:
+        return {"mode": "inline", "processed": self.processed, "chats_in_flight": len(self._chats)}
+
+    def shutdown(self, wait: bool = True):
+        pass
+
+
+def _chat_key(update):
+    chat_id = getattr(update, "chat_id", None)
+    # Updates without a chat have nothing to be ordered against
+    return chat_id if chat_id is not None else object()
+
+
+class PoolDispatcher:
+    """Run updates on a fixed set of worker threads, one at a time per chat
+
+    An update for a chat that already has one in flight waits behind it (at
+    most chat_queue_size of them), so a user's double taps never race on the
+    session; different chats run in parallel. queue_size bounds the chats
+    waiting for a worker.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[List[Any]], None],
+        workers: int = 8,
+        queue_size: int = 1000,
+        overflow: str = OVERFLOW_REJECT,
+        block_timeout: float = 1.0,
+        chat_queue_size: int = 16,
+    ):
+        if overflow not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy: {overflow}")
+        self.process = process
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.overflow = overflow
+        self.block_timeout = block_timeout
+        self.executor = KeyedExecutor(
+            self._run,
+            workers=self.workers,
+            max_keys=self.queue_size + self.workers,
+            max_pending_per_key=chat_queue_size,
+            name="dispatch",
+        )
+        self.processed = 0
+        self.failed = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    @property
+    def may_block(self) -> bool:
+        return self.overflow == OVERFLOW_BLOCK
+
+    def _run(self, updates: List[Any]):
+        try:
+            self.process(updates)
+            self.processed += len(updates)
+        except Exception as e:
+            self.failed += len(updates)
+            logger.error("Error processing update in worker: %s", e)
+
+    def _overflowed(self) -> bool:
+        if self.overflow == OVERFLOW_DROP:
+            self.dropped += 1
+            logger.warning("Dispatch queue full, dropping update")
+            return False
+        self.rejected += 1
+        raise DispatchRejected("Dispatch queue full")
+
+    def submit(self, update) -> bool:
+        """Queue an update; returns False if it was dropped by the overflow policy"""
+        key = _chat_key(update)
+        deadline = None
+        while True:
+            try:
+                self.executor.submit(key, [update])
+                return True
+            except KeyQueueFull:
+                if self.overflow != OVERFLOW_BLOCK:
+                    break
+            now = time.monotonic()
+            if deadline is None:
+                deadline = now + self.block_timeout
+            elif now >= deadline:
+                break
+            # Submit again whether or not a wakeup came: a key that finished between
+            # the failed submit and the wait notified nobody, but left space
+            self.executor.wait_for_space(deadline - now)
+        return self._overflowed()
+
+    def qsize(self) -> int:
+        return self.executor.qsize()
+
+    def stats(self) -> dict:
+        executor = self.executor.stats()
+        return {
+            "mode": "pool",
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "queued": self.qsize(),
+            "overflow": self.overflow,
+            "processed": self.processed,
+            "failed": self.failed,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "chat_queue_size": executor["max_pending_per_key"],
+            "chats_in_flight": executor["keys_in_flight"],
+            # Submitted to an idle chat (no lock) vs. queued behind the chat's update in flight
+            "fast_path": executor["fast_path"],
+            "queued_behind_chat": executor["queued_behind_key"],
+        }
+
+    def shutdown(self, wait: bool = True):
+        """Stop the workers after the queued updates have been processed"""
+        self.executor.shutdown(wait)
+
+
+class BatchDispatcher(PoolDispatcher):
+    """Collect updates for up to window seconds (or max_batch of them) and run them as one batch
+
+    A batch is split per chat, keeping arrival order within a chat; each chat's
+    updates go to process() as one list, so their session writes and replies
+    are flushed together. The per-chat lists run on the keyed workers, so
+    different chats run concurrently while a chat's next list waits for its
+    previous one.
+    """
+
+    def __init__(
+        self,
+        process: Callable[[List[Any]], None],
+        workers: int = 8,
+        queue_size: int = 1000,
+        overflow: str = OVERFLOW_REJECT,
+        block_timeout: float = 1.0,
+        window: float = 0.005,
+        max_batch: int = 64,
+        batch_sizes=None,
+        batch_chats=None,
+        chat_queue_size: int = 16,
+    ):
+        super().__init__(process, workers, queue_size, overflow, block_timeout, chat_queue_size)
+        self.queue: "queue.Queue[Any]" = queue.Queue(maxsize=self.queue_size)
+        self.window = window
+        self.max_batch = max(1, max_batch)
+        # Optional histograms (anything with observe()) for updates and chats per batch
+        self.batch_sizes = batch_sizes
+        self.batch_chats = batch_chats
+        self.batches = 0
+        self.batched_updates = 0
+        self.full_batches = 0
+        self._collector_thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._collector_thread is not None:
+            return
+        with self._lock:
+            if self._collector_thread is None:
+                thread = threading.Thread(target=self._collector, name="dispatch-batcher", daemon=True)
+                thread.start()
+                self._collector_thread = thread
+
+    def submit(self, update) -> bool:
+        """Queue an update; returns False if it was dropped by the overflow policy"""
+        self._ensure_started()
+        try:
+            if self.overflow == OVERFLOW_BLOCK:
+                self.queue.put(update, timeout=self.block_timeout)
+            else:
+                self.queue.put_nowait(update)
+            return True
+        except queue.Full:
+            return self._overflowed()
+
+    def _collect(self, first) -> tuple:
+        """The batch started by first; also returns True if a stop was requested"""
+        batch = [first]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch:
+            try:
+                update = self.queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    update = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if update is _STOP:
+                return batch, True
+            batch.append(update)
+        return batch, False
+
+    def _collector(self):
+        while True:
+            first = self.queue.get()
+            if first is _STOP:
+                return
+            batch, stop = self._collect(first)
+            self._run_batch(batch)
+            if stop:
+                return
+
+    def _run_batch(self, batch: List[Any]):
+        by_chat: Dict[Any, List[Any]] = {}
+        for update in batch:
+            by_chat.setdefault(_chat_key(update), []).append(update)
+        self.batches += 1
+        self.batched_updates += len(batch)
+        if len(batch) >= self.max_batch:
+            self.full_batches += 1
+        if self.batch_sizes is not None:
+            self.batch_sizes.observe(len(batch))
+        if self.batch_chats is not None:
+            self.batch_chats.observe(len(by_chat))
+        for key, updates in by_chat.items():
+            # Accepted updates are never dropped here: a full chat queue holds up the
+            # collector, and the intake queue in front of it applies the overflow policy
+            while True:
+                try:
+                    self.executor.submit(key, updates)
+                    break
+                except KeyQueueFull:
+                    self.executor.wait_for_space(0.05)
+
+    def qsize(self) -> int:
+        return self.queue.qsize() + self.executor.qsize()
+
+    def stats(self) -> dict:
+        stats = super().stats()
+        stats.update(
+            mode="batch",
+            window=self.window,
+            max_batch=self.max_batch,
+            batches=self.batches,
+            full_batches=self.full_batches,
+            # Mean batch size relative to max_batch
+            batch_fill=round(self.batched_updates / self.batches / self.max_batch, 3) if self.batches else 0.0,
+        )
+        return stats
+
+    def shutdown(self, wait: bool = True):
+        """Stop collecting after the queued updates have been processed"""
+        thread, self._collector_thread = self._collector_thread, None
+        if thread is not None:
+            self.queue.put(_STOP)
+            if wait:
+                thread.join()
+        self.executor.shutdown(wait)
+
+
+def create_dispatcher(
+    process: Callable[[List[Any]], None],
+    mode: str = "inline",
+    workers: int = 8,
+    queue_size: int = 1000,
+    overflow: str = OVERFLOW_REJECT,
+    block_timeout: float = 1.0,
+    batch_window: float = 0.005,
+    batch_max: int = 64,
+    batch_sizes=None,
+    batch_chats=None,
+    chat_queue_size: int = 16,
+):
+    """Build the dispatcher selected by DISPATCH_MODE"""
+    if mode == "inline":
+        return InlineDispatcher(process)
+    if mode == "pool":
+        return PoolDispatcher(process, workers, queue_size, overflow, block_timeout, chat_queue_size)
+    if mode == "batch":
+        return BatchDispatcher(
+            process, workers, queue_size, overflow, block_timeout, batch_window, batch_max, batch_sizes, batch_chats,
+            chat_queue_size,
+        )
+    raise ValueError(f"Unknown dispatch mode: {mode}")
@@ -0,0 +1,94 @@
+import time
+from typing import Any, Optional
+
+try:
+    import orjson
+
+    def loads(data: bytes) -> Any:
+        return orjson.loads(data)
+
+except ImportError:  # pragma: no cover - orjson is optional
+    import json
+
+    def loads(data: bytes) -> Any:
+        return json.loads(data)
+
+KIND_MESSAGE = "message"
+KIND_CALLBACK = "callback_query"
+KIND_OTHER = "other"
+
+
+class UpdateView:
+    """The few fields routing needs, read straight from the raw update dict
+
+    The full telebot object tree is only built (once) when a handler asks for
+    .update, .message or .callback_query.
+    """
+
+    __slots__ = ("update_id", "kind", "chat_id", "user_id", "text", "data", "raw", "received", "_update")
+
+    def __init__(self, raw: dict):
+        self.raw = raw
+        # perf_counter() at parse time, for end-to-end latency
+        self.received = time.perf_counter()
+        self.update_id = raw.get("update_id")
+        self.chat_id = None
+        self.user_id = None
+        self.text = None
+        self.data = None
+        self._update = None
+
+        message = raw.get("message")
+        if message is not None:
+            self.kind = KIND_MESSAGE
+            self.chat_id = (message.get("chat") or {}).get("id")
+            self.user_id = (message.get("from") or {}).get("id")
+            self.text = message.get("text")
+            return
+
+        callback = raw.get("callback_query")
+        if callback is not None:
+            self.kind = KIND_CALLBACK
+            self.data = callback.get("data")
+            self.user_id = (callback.get("from") or {}).get("id")
+            # Handlers answer in the chat the button was pressed in
+            self.chat_id = ((callback.get("message") or {}).get("chat") or {}).get("id")
+            return
+
+        self.kind = KIND_OTHER
+
+    @property
+    def command(self) -> Optional[str]:
+        """Bot command without slash and @botname, like telebot.util.extract_command"""
+        text = self.text
+        if not text or text[0] != "/":
+            return None
+        return text.split()[0].split("@")[0][1:]
+
+    @property
+    def update(self):
+        if self._update is None:
+            from telebot.types import Update
+
+            self._update = Update.de_json(self.raw)
+        return self._update
+
+    @property
+    def message(self):
+        return self.update.message
+
+    @property
+    def callback_query(self):
+        return self.update.callback_query
+
+    def __repr__(self) -> str:
+        return f"UpdateView(update_id={self.update_id}, kind={self.kind}, chat_id={self.chat_id})"
+
+
+def parse_update(body: bytes) -> UpdateView:
+    """Decode a webhook body into an UpdateView without building telebot objects"""
+    raw = loads(body)
+    if not isinstance(raw, dict):
+        raise ValueError("Update must be a JSON object")
+    return UpdateView(raw)
+
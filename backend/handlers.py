@@ -0,0 +1,558 @@
+# Imported by core.load_handlers() on the first update; the decorators fill core.router
+import logging
+import math
+from collections import Counter
+from functools import partial
+
+from telebot.types import InlineKeyboardMarkup, InlineKeyboardButton
+
+from core import (
+    CHANNEL_ID,
+    LOG_PAYLOADS,
+    MODERATION_ACTION,
+    REVIEW_BATCH_MAX,
+    REVIEW_BATCH_SIZE,
+    REVIEW_CHAT_ID,
+    REVIEW_MODE,
+    SPAM_ACTION,
+    SPAM_DELAY,
+    duplicate_index,
+    duplicate_posts,
+    membership_checker,
+    moderated_posts,
+    moderator,
+    outbound,
+    review_queue,
+    reviewed_posts,
+    router,
+    sessions,
+    submission_limiter,
+    submissions_limited,
+)
+from keyboards import KeyboardRegistry, TemplateRegistry
+from outbound import PRIORITY_CHANNEL
+from session_store import STEP_CHOOSE_LANG, STEP_PREVIEW, STEP_VERIFYING, STEP_WAIT_MSG
+
+logger = logging.getLogger(__name__)
+
+# Texts sent to users, per language; the admin chat's texts stay in Indonesian
+texts = TemplateRegistry(languages=("id", "en"))
+texts.add("welcome", id="👋 Halo {name}!\n\n🌐 Pilih bahasa / Choose your language:")
+texts.add("checking", id="🔎 Memeriksa keanggotaan kamu...", en="🔎 Checking your membership...")
+texts.add("join", id="📢 Gabung dulu ke komunitas ini ya:", en="📢 Please join these communities first:")
+texts.add(
+    "not_joined",
+    id="❗ Kamu belum join semua channel.\n\nYang belum: {chats}\n\nGabung dulu ya:",
+    en="❗ You haven't joined every channel yet.\n\nMissing: {chats}\n\nPlease join first:",
+)
+texts.add(
+    "verified",
+    id="✅ Verifikasi sukses!\n\n💬 Sekarang kirim pesan anonim kamu:",
+    en="✅ Verification successful!\n\n💬 Now send your anonymous message:",
+)
+texts.add("empty", id="❗ Pesan tidak boleh kosong. Kirim pesan teks.", en="❗ The message can't be empty. Send a text message.")
+texts.add(
+    "limited_user",
+    id="⏳ Kamu sudah mengirim terlalu banyak pesan. Coba lagi dalam {minutes} menit.",
+    en="⏳ You have sent too many messages. Try again in {minutes} min.",
+)
+texts.add(
+    "limited_global",
+    id="⏳ Bot sedang ramai. Coba kirim lagi dalam {minutes} menit.",
+    en="⏳ The bot is busy right now. Try again in {minutes} min.",
+)
+texts.add(
+    "blocked",
+    id="🚫 Pesan kamu mengandung kata yang tidak diperbolehkan. Silakan tulis ulang pesanmu.",
+    en="🚫 Your message contains words that are not allowed. Please rewrite it.",
+)
+texts.add(
+    "duplicate",
+    id="❗ Pesan ini sama atau mirip dengan pesan yang baru saja dikirim. Kirim pesan lain ya.",
+    en="❗ This message is the same as or similar to one sent recently. Please send a different one.",
+)
+texts.add(
+    "preview",
+    id="🎭 Preview Pesan Anonim:\n\n💬 \"{text}\"\n\n📤 Kirim ke channel @Anofes sekarang?",
+    en="🎭 Anonymous Message Preview:\n\n💬 \"{text}\"\n\n📤 Send it to @Anofes now?",
+)
+texts.add("edit", id="✏️ Baik, kirim pesan baru kamu:", en="✏️ OK, send your new message:")
+texts.add("nothing_to_send", id="❌ Tidak ada pesan untuk dikirim.", en="❌ There is no message to send.")
+texts.add(
+    "in_review",
+    id="⏳ Pesan kamu sedang ditinjau admin sebelum dikirim ke channel.",
+    en="⏳ Your message is being reviewed by an admin before it is posted.",
+)
+texts.add(
+    "scheduled",
+    id="🕒 Pesan kamu mirip dengan pesan lain, jadi akan dikirim ke channel dalam {minutes} menit.",
+    en="🕒 Your message looks like another recent one, so it will be posted in {minutes} minutes.",
+)
+texts.add(
+    "review_rejected",
+    id="❌ Pesan kamu tidak disetujui admin.\n\n🔄 Kirim /start untuk mengirim pesan lain.",
+    en="❌ Your message was not approved by an admin.\n\n🔄 Send /start to send another one.",
+)
+texts.add(
+    "review_rejected_many",
+    id="❌ {count} pesan kamu tidak disetujui admin.\n\n🔄 Kirim /start untuk mengirim pesan lain.",
+    en="❌ {count} of your messages were not approved by an admin.\n\n🔄 Send /start to send another one.",
+)
+texts.add(
+    "posted",
+    id="✅ Pesan berhasil dikirim ke channel @Anofes!\n\n🔄 Kirim /start untuk mengirim pesan lain.",
+    en="✅ Your message was posted to @Anofes!\n\n🔄 Send /start to send another one.",
+)
+texts.add(
+    "post_failed",
+    id="❌ Gagal mengirim pesan ke channel. Silakan coba lagi.",
+    en="❌ Could not post your message to the channel. Please try again.",
+)
+texts.add("hello", id="👋 Halo! Kirim /start untuk memulai.", en="👋 Hi! Send /start to begin.")
+texts.add(
+    "unknown",
+    id="❓ Perintah tidak dimengerti. Gunakan tombol yang tersedia atau kirim /start.",
+    en="❓ Command not understood. Use the buttons or send /start.",
+)
+texts.add("error", id="❌ Terjadi kesalahan. Silakan coba lagi.", en="❌ Something went wrong. Please try again.")
+texts.add(
+    "error_verify",
+    id="❌ Terjadi kesalahan saat verifikasi. Silakan coba lagi.",
+    en="❌ Something went wrong while verifying. Please try again.",
+)
+
+# Every keyboard is built and serialized here, once; handlers send the cached JSON
+keyboards = KeyboardRegistry(languages=("id", "en"))
+
+@keyboards.register("language", per_language=False)
+def _language_keyboard(language):
+    kb = InlineKeyboardMarkup()
+    kb.add(
+        InlineKeyboardButton("🇮🇩 Indonesia", callback_data="lang_id"),
+        InlineKeyboardButton("🇬🇧 English", callback_data="lang_en")
+    )
+    return kb
+
+@keyboards.register("join")
+def _join_keyboard(language):
+    kb = InlineKeyboardMarkup()
+    kb.add(InlineKeyboardButton("📢 Join @Anofes", url="https://t.me/Anofes"))
+    kb.add(InlineKeyboardButton("👥 Join Mwtlan", url="https://t.me/Mwtlan"))
+    kb.add(InlineKeyboardButton("📺 Join KhamahdalysRoom", url="https://t.me/KhamahdalysRoom"))
+    joined = "✅ I've Joined" if language == "en" else "✅ Saya Sudah Join"
+    kb.add(InlineKeyboardButton(joined, callback_data="check_join"))
+    return kb
+
+@keyboards.register("confirm")
+def _confirm_keyboard(language):
+    kb = InlineKeyboardMarkup()
+    if language == "en":
+        send, edit = "✅ Yes, send it now!", "✏️ Edit message"
+    else:
+        send, edit = "✅ Ya, kirim sekarang!", "✏️ Ubah pesan"
+    kb.add(
+        InlineKeyboardButton(send, callback_data="send_now"),
+        InlineKeyboardButton(edit, callback_data="edit_msg")
+    )
+    return kb
+
+def review_keyboard(post_id, user_id):
+    """Decision buttons under a held post in the admin chat (they carry ids, so are built per post)"""
+    kb = InlineKeyboardMarkup()
+    kb.add(
+        InlineKeyboardButton("✅ Setujui", callback_data=f"review_ok:{post_id}"),
+        InlineKeyboardButton("❌ Tolak", callback_data=f"review_no:{post_id}")
+    )
+    kb.add(InlineKeyboardButton("🚫 Tolak semua dari user ini", callback_data=f"review_user:{user_id}"))
+    kb.add(InlineKeyboardButton(f"⏩ Setujui {REVIEW_BATCH_SIZE} berikutnya", callback_data=f"review_next:{REVIEW_BATCH_SIZE}"))
+    return kb
+
+def join_buttons(language=None):
+    """Inline keyboard for channel joining (serialized)"""
+    return keyboards.get("join", language)
+
+def language_of(user_id):
+    """The user's chosen language, or None; safe to call from error handlers"""
+    try:
+        session = sessions.get(user_id)
+    except Exception:
+        return None
+    return session.language if session else None
+
+# Bot Command Handlers
+@router.command("start")
+def handle_start(message):
+    """Handle /start command"""
+    try:
+        user_id = message.chat.id
+        user_name = message.from_user.first_name or "User"
+        
+        logger.info("User %s (%s) started the bot", user_id, user_name, extra={"event": "user.start"})
+        
+        # Start a fresh session
+        sessions.set(user_id, STEP_CHOOSE_LANG, language=None)
+        
+        welcome_text = texts.get("welcome", name=user_name)
+        
+        outbound.send_message(
+            user_id, 
+            welcome_text, 
+            reply_markup=keyboards.get("language")
+        )
+        
+    except Exception as e:
+        logger.error("Error in handle_start: %s", e)
+        outbound.send_message(message.chat.id, texts.get("error"))
+
+@router.callback_prefix("lang_")
+def handle_language_selection(call):
+    """Handle language selection"""
+    try:
+        user_id = call.message.chat.id
+        language = call.data.split("_")[1]  # id or en
+        
+        logger.info("User %s selected language: %s", user_id, language, extra={"event": "user.language"})
+        
+        # Update state
+        sessions.set(user_id, STEP_VERIFYING, language=language)
+        
+        # Edit message to show verification in progress
+        outbound.submit(
+            "edit_message_text",
+            user_id,
+            text=texts.get("checking", language),
+            message_id=call.message.message_id
+        )
+        
+        # Send join instruction
+        join_text = texts.get("join", language)
+        outbound.send_message(user_id, join_text, reply_markup=join_buttons(language))
+        
+    except Exception as e:
+        logger.error("Error in handle_language_selection: %s", e)
+        outbound.send_message(call.message.chat.id, texts.get("error", language_of(call.message.chat.id)))
+
+@router.callback("check_join")
+def handle_join_check(call):
+    """Handle join verification"""
+    try:
+        user_id = call.message.chat.id
+        
+        logger.info("Checking membership for user %s", user_id, extra={"event": "membership.check"})
+        
+        # Check membership in all required channels concurrently
+        not_joined = membership_checker.missing(user_id)
+        language = language_of(user_id)
+        
+        if not_joined:
+            # User hasn't joined all channels
+            missing_text = texts.get("not_joined", language, chats=", ".join(not_joined))
+            outbound.send_message(user_id, missing_text, reply_markup=join_buttons(language))
+        else:
+            # User has joined all channels
+            sessions.set(user_id, STEP_WAIT_MSG)
+            outbound.send_message(user_id, texts.get("verified", language))
+            
+    except Exception as e:
+        logger.error("Error in handle_join_check: %s", e)
+        outbound.send_message(call.message.chat.id, texts.get("error_verify", language_of(call.message.chat.id)))
+
+@router.message(step=STEP_WAIT_MSG)
+def handle_message_input(msg):
+    """Handle user message input"""
+    try:
+        user_id = msg.chat.id
+        text = msg.text.strip() if msg.text else ""
+        language = language_of(user_id)
+        
+        if LOG_PAYLOADS:
+            logger.info("User %s sent message: %.50s...", user_id, text, extra={"event": "message.received"})
+        else:
+            logger.info("User %s sent a message of %s characters", user_id, len(text), extra={"event": "message.received"})
+        
+        if not text:
+            outbound.send_message(user_id, texts.get("empty", language))
+            return
+        
+        if MODERATION_ACTION == "reject" and moderator.check(text):
+            moderated_posts.labels("reject").inc()
+            outbound.send_message(user_id, texts.get("blocked", language))
+            return
+        
+        if SPAM_ACTION == "reject" and duplicate_index.check(duplicate_index.fingerprint(text)):
+            duplicate_posts.labels("reject").inc()
+            outbound.send_message(user_id, texts.get("duplicate", language))
+            return
+        
+        # Counted only once the text passed the checks, so a rejected text costs no quota
+        limited = submission_limiter.acquire(user_id)
+        if limited is not None:
+            submissions_limited.labels(limited.scope).inc()
+            outbound.send_message(user_id, limited_text(limited, language))
+            return
+        
+        # Store message in state
+        session = sessions.set(user_id, STEP_PREVIEW, text=text, message_id=msg.message_id)
+        
+        # Create preview
+        preview_text = texts.get("preview", session.language, text=text)
+        
+        outbound.send_message(user_id, preview_text, reply_markup=keyboards.get("confirm", session.language))
+        
+    except Exception as e:
+        logger.error("Error in handle_message_input: %s", e)
+        outbound.send_message(msg.chat.id, texts.get("error", language_of(msg.chat.id)))
+
+@router.callback("edit_msg")
+def handle_edit_message(call):
+    """Handle message editing"""
+    try:
+        user_id = call.message.chat.id
+        session = sessions.set(user_id, STEP_WAIT_MSG)
+        
+        outbound.send_message(user_id, texts.get("edit", session.language))
+        
+    except Exception as e:
+        logger.error("Error in handle_edit_message: %s", e)
+        outbound.send_message(call.message.chat.id, texts.get("error", language_of(call.message.chat.id)))
+
+@router.callback("send_now")
+def handle_send_message(call):
+    """Handle sending message to channel"""
+    try:
+        user_id = call.message.chat.id
+        session = sessions.get(user_id)
+        
+        if session is None or session.step != STEP_PREVIEW or not session.text:
+            outbound.send_message(user_id, texts.get("nothing_to_send", session.language if session else None))
+            return
+        
+        message_text = session.text
+        language = session.language
+        
+        blocked = moderator.check(message_text) if moderator is not None else []
+        if blocked:
+            moderated_posts.labels(MODERATION_ACTION).inc()
+            logger.info(
+                "Post from user %s contains %s blocklist entries: %s", user_id, len(blocked), MODERATION_ACTION,
+                extra={"event": "post.blocked"},
+            )
+            if MODERATION_ACTION == "reject":
+                sessions.set(user_id, STEP_WAIT_MSG)
+                outbound.send_message(user_id, texts.get("blocked", language))
+                return
+            hold_for_review(
+                user_id, message_text, f"🚫 Pesan dari user {user_id} mengandung: {', '.join(blocked)}", language
+            )
+            sessions.discard(user_id)
+            return
+        
+        delay = 0.0
+        if duplicate_index is not None:
+            fingerprint = duplicate_index.fingerprint(message_text)
+            duplicate = duplicate_index.check(fingerprint)
+            if duplicate is not None:
+                duplicate_posts.labels(SPAM_ACTION).inc()
+                logger.info(
+                    "Duplicate post from user %s (%s bits, first seen %.0fs ago): %s",
+                    user_id, duplicate.distance, duplicate.age, SPAM_ACTION, extra={"event": "post.duplicate"},
+                )
+                if SPAM_ACTION == "reject":
+                    sessions.set(user_id, STEP_WAIT_MSG)
+                    outbound.send_message(user_id, texts.get("duplicate", language))
+                    return
+                if SPAM_ACTION == "review":
+                    duplicate_index.add(fingerprint, user_id)
+                    kind = "sama persis" if duplicate.exact else "mirip"
+                    hold_for_review(
+                        user_id,
+                        message_text,
+                        f"⚠️ Pesan dari user {user_id} {kind} dengan pesan {duplicate.age / 60:.0f} menit lalu "
+                        f"(user {duplicate.user_id})",
+                        language,
+                    )
+                    sessions.discard(user_id)
+                    return
+                delay = SPAM_DELAY
+            duplicate_index.add(fingerprint, user_id)
+        
+        if REVIEW_MODE == "all":
+            hold_for_review(user_id, message_text, f"📝 Pesan dari user {user_id}", language)
+            sessions.discard(user_id)
+            return
+        
+        # Queue the post; it is persisted until Telegram accepts it, so it survives
+        # rate limits and restarts. The user is told once it actually lands.
+        outbound.send_message(
+            CHANNEL_ID,
+            channel_text(message_text),
+            priority=PRIORITY_CHANNEL,
+            persist=True,
+            on_done=partial(confirm_channel_post, user_id, message_text, language),
+            delay=delay,
+        )
+        if delay:
+            # The post is not waited for, so say now why it has not landed yet
+            minutes = max(1, math.ceil(delay / 60))
+            outbound.send_message(user_id, texts.get("scheduled", language, minutes=minutes))
+        
+        # End the session so it does not linger in memory
+        sessions.discard(user_id)
+            
+    except Exception as e:
+        logger.error("Error in handle_send_message: %s", e)
+        outbound.send_message(call.message.chat.id, texts.get("error", language_of(call.message.chat.id)))
+
+def limited_text(limited, language=None):
+    minutes = max(1, math.ceil(limited.retry_after / 60))
+    return texts.get("limited_global" if limited.scope == "global" else "limited_user", language, minutes=minutes)
+
+def channel_text(message_text):
+    """Format a confession for the channel"""
+    return f"🎭 Pesan Anonim\n\n💬 \"{message_text}\"\n\n📝 Dikirim melalui @TextMenfesbot"
+
+def hold_for_review(user_id, message_text, reason, language=None):
+    """Put a post in the review queue and show it to the admins instead of publishing it"""
+    post_id = review_queue.add(user_id, message_text, reason, language)
+    outbound.send_message(
+        REVIEW_CHAT_ID,
+        f"#{post_id} {reason}:\n\n{channel_text(message_text)}",
+        priority=PRIORITY_CHANNEL,
+        persist=True,
+        reply_markup=review_keyboard(post_id, user_id),
+    )
+    outbound.send_message(user_id, texts.get("in_review", language))
+
+def publish_reviewed(posts, approved):
+    """Carry out an admin decision on posts being taken off the review queue
+
+    Passed to review_queue.take*, which deletes the posts only after this
+    returns, so approved posts are in the outbound store before they leave the
+    review queue. They go to the scheduler together: one durable write for all
+    of them, then sent as fast as the channel's rate limit allows.
+    """
+    if not posts:
+        return
+    reviewed_posts.labels("approved" if approved else "rejected").inc(len(posts))
+    if approved:
+        outbound.submit_many(
+            "send_message",
+            [
+                (
+                    CHANNEL_ID,
+                    {"text": channel_text(post.text)},
+                    partial(confirm_channel_post, post.user_id, post.text, post.language or language_of(post.user_id)),
+                )
+                for post in posts
+            ],
+            priority=PRIORITY_CHANNEL,
+            persist=True,
+        )
+        return
+    languages = {post.user_id: post.language for post in posts}
+    for user_id, count in Counter(post.user_id for post in posts).items():
+        language = languages[user_id] or language_of(user_id)
+        if count == 1:
+            outbound.send_message(user_id, texts.get("review_rejected", language))
+        else:
+            outbound.send_message(user_id, texts.get("review_rejected_many", language, count=count))
+
+def report_review(count, approved, admin_name):
+    """One summary line in the admin chat for a bulk decision"""
+    decision = f"✅ {count} pesan disetujui" if approved else f"❌ {count} pesan ditolak"
+    outbound.send_message(
+        REVIEW_CHAT_ID, f"{decision} oleh {admin_name}. {len(review_queue)} pesan masih menunggu."
+    )
+
+def is_review_chat(chat_id):
+    return review_queue is not None and chat_id == REVIEW_CHAT_ID
+
+def confirm_channel_post(user_id, message_text, language, result, error):
+    """Report the outcome of a queued channel post back to its sender"""
+    if error is None:
+        logger.info("Message sent to channel from user %s", user_id, extra={"event": "post.sent"})
+        outbound.send_message(user_id, texts.get("posted", language))
+    else:
+        logger.error("Error sending message to channel: %s", error)
+        # Put the preview back so "Ya, kirim sekarang!" can be pressed again
+        sessions.set(user_id, STEP_PREVIEW, language=language, text=message_text)
+        outbound.send_message(user_id, texts.get("post_failed", language))
+
+# Admin review handlers (REVIEW_CHAT_ID only)
+@router.callback_prefix("review_", chats=is_review_chat)
+def handle_review_decision(call):
+    """Handle the decision buttons under a held post"""
+    try:
+        action, _, value = call.data.partition(":")
+        admin_name = call.from_user.first_name or "Admin"
+        
+        if action in ("review_ok", "review_no"):
+            approved = action == "review_ok"
+            post = review_queue.take(int(value), partial(publish_reviewed, approved=approved))
+            if post is None:
+                status = "ℹ️ Sudah ditinjau sebelumnya."
+            else:
+                status = f"✅ Disetujui oleh {admin_name}" if approved else f"❌ Ditolak oleh {admin_name}"
+            # Drop the buttons and record the decision on the post itself
+            outbound.submit(
+                "edit_message_text",
+                REVIEW_CHAT_ID,
+                text=f"{call.message.text}\n\n{status}",
+                message_id=call.message.message_id
+            )
+        elif action == "review_next":
+            posts = review_queue.take_next(min(int(value), REVIEW_BATCH_MAX), partial(publish_reviewed, approved=True))
+            report_review(len(posts), True, admin_name)
+        elif action == "review_user":
+            posts = review_queue.take_user(int(value), partial(publish_reviewed, approved=False))
+            report_review(len(posts), False, admin_name)
+        
+    except Exception as e:
+        logger.error("Error in handle_review_decision: %s", e)
+        outbound.send_message(call.message.chat.id, "❌ Terjadi kesalahan.")
+
+# Elsewhere /approve and /queue are ordinary text, e.g. a confession starting with "/approve"
+@router.command("approve", chats=is_review_chat)
+def handle_approve_command(message):
+    """/approve [N]: publish the N oldest held posts (REVIEW_BATCH_SIZE by default)"""
+    try:
+        args = message.text.split()[1:]
+        count = int(args[0]) if args and args[0].isdigit() else REVIEW_BATCH_SIZE
+        posts = review_queue.take_next(min(count, REVIEW_BATCH_MAX), partial(publish_reviewed, approved=True))
+        report_review(len(posts), True, message.from_user.first_name or "Admin")
+        
+    except Exception as e:
+        logger.error("Error in handle_approve_command: %s", e)
+        outbound.send_message(message.chat.id, "❌ Terjadi kesalahan.")
+
+@router.command("queue", chats=is_review_chat)
+def handle_queue_command(message):
+    """/queue: how many posts are waiting for review"""
+    try:
+        stats = review_queue.stats()
+        if not stats["pending"]:
+            outbound.send_message(REVIEW_CHAT_ID, "📭 Tidak ada pesan yang menunggu.")
+        else:
+            oldest = max(1, math.ceil(stats["oldest_age"] / 60))
+            outbound.send_message(
+                REVIEW_CHAT_ID, f"📋 {stats['pending']} pesan menunggu, yang terlama sejak {oldest} menit lalu."
+            )
+        
+    except Exception as e:
+        logger.error("Error in handle_queue_command: %s", e)
+        outbound.send_message(message.chat.id, "❌ Terjadi kesalahan.")
+
+# Error handler
+@router.message(raw=True)
+def handle_all_messages(view):
+    """Handle all other messages (answered from the raw update, no de_json)"""
+    try:
+        user_id = view.chat_id
+        session = sessions.get(user_id)
+        if session is None:
+            outbound.send_message(user_id, texts.get("hello"))
+        else:
+            outbound.send_message(user_id, texts.get("unknown", session.language))
+            
+    except Exception as e:
+        logger.error("Error in handle_all_messages: %s", e)
@@ -0,0 +1,70 @@
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+class KeyboardRegistry:
+    """Reply markups built once per language and kept as the JSON string the Bot API receives
+
+    A builder takes a language code and returns a markup object (anything with
+    to_json()). get() returns the cached string, which outbound and telebot
+    pass through as reply_markup without serializing it again.
+    """
+
+    def __init__(self, languages: Iterable[str] = ("id",), default_language: Optional[str] = None):
+        self.languages: Tuple[str, ...] = tuple(languages)
+        self.default_language = default_language or self.languages[0]
+        self._payloads: Dict[Tuple[str, str], str] = {}
+
+    def register(self, name: str, per_language: bool = True):
+        """Decorator: build the markup now for every language (or once, shared by all)"""
+        def decorator(build: Callable[[str], object]):
+            if per_language:
+                for language in self.languages:
+                    self._payloads[name, language] = build(language).to_json()
+            else:
+                payload = build(self.default_language).to_json()
+                for language in self.languages:
+                    self._payloads[name, language] = payload
+            return build
+        return decorator
+
+    def get(self, name: str, language: Optional[str] = None) -> str:
+        """The serialized markup; unknown or missing languages get the default variant"""
+        payload = self._payloads.get((name, language))
+        if payload is None:
+            payload = self._payloads[name, self.default_language]
+        return payload
+
+    def __contains__(self, name: str) -> bool:
+        return (name, self.default_language) in self._payloads
+
+    def __len__(self) -> int:
+        return len(self._payloads)
+
+
+class TemplateRegistry:
+    """Message texts with a variant per language, looked up by name
+
+    Variants are str.format templates. A language without its own variant gets
+    the default language's, so a text only needs translating where it differs.
+    """
+
+    def __init__(self, languages: Iterable[str] = ("id",), default_language: Optional[str] = None):
+        self.languages: Tuple[str, ...] = tuple(languages)
+        self.default_language = default_language or self.languages[0]
+        self._texts: Dict[Tuple[str, str], str] = {}
+
+    def add(self, name: str, **variants: str):
+        if self.default_language not in variants:
+            raise ValueError(f"Template {name!r} has no {self.default_language!r} variant")
+        for language in self.languages:
+            self._texts[name, language] = variants.get(language, variants[self.default_language])
+
+    def get(self, name: str, language: Optional[str] = None, /, **values) -> str:
+        """The text in `language` (or the default), with `values` filled in"""
+        template = self._texts.get((name, language))
+        if template is None:
+            template = self._texts[name, self.default_language]
+        return template.format(**values) if values else template
+
+    def __contains__(self, name: str) -> bool:
+        return (name, self.default_language) in self._texts
@@ -0,0 +1,166 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class KeyQueueFull(Exception):
+    """Raised when a key's queue, or the number of keys with queued work, is at its limit"""
+
+
+class _KeyQueue:
+    __slots__ = ("key", "pending")
+
+    def __init__(self, key: Hashable, item: Any):
+        self.key = key
+        self.pending = deque((item,))
+
+
+class KeyedExecutor:
+    """Run items one at a time per key and different keys in parallel on a fixed set of threads
+
+    A key with no work in flight is claimed with a single dict.setdefault (atomic
+    under the GIL) and handed straight to the workers, without taking a lock.
+    Items for a key that is already in flight wait in that key's queue, bounded
+    by max_pending_per_key, and are run by the same worker in order; after
+    `burst` items the key goes to the back of the line so one busy key cannot
+    hold a worker forever. At most max_keys keys can have work in flight.
+    """
+
+    def __init__(
+        self,
+        run: Callable[[Any], None],
+        workers: int = 8,
+        max_keys: int = 1000,
+        max_pending_per_key: int = 16,
+        burst: int = 8,
+        name: str = "keyed",
+    ):
+        self.run = run
+        self.workers = max(1, workers)
+        self.max_keys = max(1, max_keys)
+        self.max_pending_per_key = max(1, max_pending_per_key)
+        self.burst = max(1, burst)
+        self.name = name
+        self._active: Dict[Hashable, _KeyQueue] = {}
+        self._ready: "queue.SimpleQueue[Any]" = queue.SimpleQueue()
+        self._lock = threading.Lock()
+        self._space = threading.Condition(threading.Lock())
+        self._waiters = 0
+        self._threads: List[threading.Thread] = []
+        self.processed = 0
+        self.failed = 0
+        self.fast_path = 0   # submitted to an idle key, no lock taken
+        self.queued = 0      # submitted behind work in flight for the same key
+        self.rejected = 0
+
+    def _ensure_started(self):
+        if self._threads:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"{self.name}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, key: Hashable, item: Any):
+        """Queue item behind any in-flight work for key; raises KeyQueueFull at a limit"""
+        self._ensure_started()
+        if key not in self._active:
+            if len(self._active) >= self.max_keys:
+                self.rejected += 1
+                raise KeyQueueFull(f"{self.max_keys} keys already have work in flight")
+            claim = _KeyQueue(key, item)
+            if self._active.setdefault(key, claim) is claim:
+                self.fast_path += 1
+                self._ready.put(claim)
+                return
+        with self._lock:
+            current = self._active.get(key)
+            if current is None:
+                # Finished while we were getting here
+                claim = self._active[key] = _KeyQueue(key, item)
+                self.fast_path += 1
+                self._ready.put(claim)
+                return
+            if len(current.pending) >= self.max_pending_per_key:
+                self.rejected += 1
+                raise KeyQueueFull(f"{self.max_pending_per_key} items already queued for {key!r}")
+            current.pending.append(item)
+            self.queued += 1
+
+    def wait_for_space(self, timeout: float) -> bool:
+        """Block until some key finishes or timeout passes; False on timeout"""
+        with self._space:
+            self._waiters += 1
+            try:
+                return self._space.wait(timeout)
+            finally:
+                self._waiters -= 1
+
+    def _worker(self):
+        while True:
+            claim = self._ready.get()
+            if claim is _STOP:
+                return
+            for _ in range(self.burst):
+                item = claim.pending.popleft()
+                try:
+                    self.run(item)
+                    self.processed += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.error("Error running work for %r: %s", claim.key, e)
+                with self._lock:
+                    if not claim.pending:
+                        del self._active[claim.key]
+                        claim = None
+                if claim is None:
+                    break
+            if claim is not None:
+                # Still has queued items: let other keys have a turn first
+                self._ready.put(claim)
+            if self._waiters:
+                with self._space:
+                    self._space.notify_all()
+
+    def qsize(self) -> int:
+        """Items not yet started (approximate; read without locking)"""
+        return sum(len(claim.pending) for claim in list(self._active.values()))
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "keys_in_flight": len(self._active),
+            "max_keys": self.max_keys,
+            "max_pending_per_key": self.max_pending_per_key,
+            "processed": self.processed,
+            "failed": self.failed,
+            "fast_path": self.fast_path,
+            "queued_behind_key": self.queued,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self, wait: bool = True, timeout: Optional[float] = None):
+        """Stop the workers; with wait, only once every submitted item has run"""
+        threads, self._threads = self._threads, []
+        if not threads:
+            return
+        if wait:
+            deadline = None if timeout is None else time.monotonic() + timeout
+            # Keys re-queue themselves after a burst, so drain before sending the stops
+            while self._active and (deadline is None or time.monotonic() < deadline):
+                time.sleep(0.005)
+        for _ in threads:
+            self._ready.put(_STOP)
+        if wait:
+            for thread in threads:
+                thread.join()
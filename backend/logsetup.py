@@ -0,0 +1,136 @@
+import atexit
+import json
+import logging
+import queue
+import random
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional
+
+# Fixed fields of a JSON log line, filled from `extra=` when the call site has them
+STRUCTURED_FIELDS = ("event", "update_id", "handler", "latency_ms")
+
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+
+def parse_sample_rates(spec: str) -> Dict[str, float]:
+    """Parse "event=rate,event=rate" into a dict, rates clamped to [0, 1]"""
+    rates = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        event, _, rate = item.partition("=")
+        try:
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            raise ValueError(f"Invalid log sample rate {item.strip()!r}, expected event=rate") from None
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps a fraction of the records tagged with a sampled `event`
+
+    Records without an event, or at WARNING and above, always pass.
+    """
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+        self.dropped = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "event", None))
+        if rate is None or rate >= 1.0 or (rate > 0.0 and random.random() < rate):
+            return True
+        self.dropped += 1
+        return False
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line with a fixed set of keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            entry[field] = getattr(record, field, None)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class _DeferredQueueHandler(QueueHandler):
+    """QueueHandler that leaves all formatting to the listener thread
+
+    The stock prepare() renders the message in the caller; the queue stays
+    in-process, so the record can travel as is. Log arguments must therefore
+    not be mutated after the call, which holds for the ids and strings we log.
+    """
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Losing a log line beats stalling the request that wrote it
+            self.dropped += 1
+
+
+_listener: Optional[QueueListener] = None
+_handler: Optional[logging.Handler] = None
+
+
+def configure_logging(
+    fmt: str = "text",
+    level: str = "INFO",
+    background: bool = True,
+    sample_rates: Optional[Dict[str, float]] = None,
+    queue_size: int = 10_000,
+    stream=None,
+) -> Optional[QueueListener]:
+    """Install the root handler: text or JSON lines, optionally written by a background thread"""
+    global _listener, _handler
+    stop_logging()
+
+    output = logging.StreamHandler(stream)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    root = logging.getLogger()
+    if _handler is not None:
+        # Reconfiguring replaces our own handler, never ones installed by the host
+        root.removeHandler(_handler)
+    root.setLevel(level.upper())
+
+    if background:
+        handler = _DeferredQueueHandler(queue.Queue(queue_size))
+        _listener = QueueListener(handler.queue, output, respect_handler_level=True)
+        _listener.start()
+    else:
+        handler = output
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+    root.addHandler(handler)
+    _handler = handler
+    return _listener
+
+
+def stop_logging():
+    """Write out queued records and stop the background listener"""
+    global _listener
+    if _listener is not None:
+        listener, _listener = _listener, None
+        listener.stop()
+
+
+atexit.register(stop_logging)
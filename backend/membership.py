@@ -0,0 +1,196 @@
+import logging
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+MEMBER_STATUSES = ("member", "administrator", "creator")
+
+
+def _approx_entry_bytes() -> int:
+    """Rough footprint of one cache entry: key tuple, value tuple and dict/link overhead"""
+    key = ("@KhamahdalysRoom", 10 ** 10)
+    value = (True, time.monotonic())
+    return sys.getsizeof(key) + sys.getsizeof(key[1]) + sys.getsizeof(value) + sys.getsizeof(value[1]) + 100
+
+
+class MembershipCache:
+    """LRU cache of get_chat_member answers with separate TTLs for members and non-members"""
+
+    ENTRY_BYTES = _approx_entry_bytes()
+
+    def __init__(
+        self,
+        positive_ttl: float = 300.0,
+        negative_ttl: float = 5.0,
+        max_bytes: int = 8 * 1024 * 1024,
+    ):
+        self.positive_ttl = positive_ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max(1, max_bytes // self.ENTRY_BYTES)
+        self._entries: "OrderedDict[Tuple[str, int], Tuple[bool, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, chat: str, user_id: int) -> Optional[bool]:
+        """Cached membership, or None when unknown or expired"""
+        key = (chat, user_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[1] <= time.monotonic():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, chat: str, user_id: int, joined: bool):
+        ttl = self.positive_ttl if joined else self.negative_ttl
+        if ttl <= 0:
+            return
+        key = (chat, user_id)
+        with self._lock:
+            self._entries[key] = (joined, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "approx_bytes": len(self._entries) * self.ENTRY_BYTES,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "positive_ttl": self.positive_ttl,
+            "negative_ttl": self.negative_ttl,
+        }
+
+
+class MembershipChecker:
+    """Verify that a user has joined every required chat
+
+    Every get_chat_member call is given `timeout` as its own request timeout,
+    so a slow call frees its thread when it runs out; in parallel mode the
+    same timeout also caps the check as a whole.
+    """
+
+    def __init__(
+        self,
+        get_chat_member: Callable,
+        chats: Sequence[str],
+        timeout: float = 5.0,
+        parallel: bool = True,
+        max_workers: int = 16,
+        cache: Optional[MembershipCache] = None,
+    ):
+        self.get_chat_member = get_chat_member
+        self.cache = cache
+        self.chats = list(chats)
+        self.timeout = timeout
+        self.parallel = parallel
+        self.max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.max_workers, thread_name_prefix="membership"
+            )
+        return self._executor
+
+    def lookup(self, chat: str, user_id: int) -> Optional[bool]:
+        """Single get_chat_member call; None when the API call failed"""
+        try:
+            member = self.get_chat_member(chat, user_id, timeout=self.timeout)
+        except Exception as e:
+            logger.warning("Error checking membership in %s: %s", chat, e)
+            return None
+        joined = member.status in MEMBER_STATUSES
+        if not joined:
+            logger.info("User %s not a member of %s", user_id, chat, extra={"event": "membership.missing"})
+        # Only definite answers are cached, API errors are retried next time
+        if self.cache is not None:
+            self.cache.set(chat, user_id, joined)
+        return joined
+
+    def is_member(self, chat: str, user_id: int) -> bool:
+        """Membership in one chat; API errors count as not joined"""
+        return bool(self.lookup(chat, user_id))
+
+    def missing(self, user_id: int) -> List[str]:
+        """Return the required chats the user has not joined"""
+        chats = self.chats
+        if self.cache is not None:
+            chats = []
+            for chat in self.chats:
+                cached = self.cache.get(chat, user_id)
+                if cached is False:
+                    return [chat]
+                if cached is None:
+                    chats.append(chat)
+            if not chats:
+                return []
+
+        if not self.parallel or len(chats) < 2:
+            return [chat for chat in chats if not self.is_member(chat, user_id)]
+        return self._missing_parallel(chats, user_id)
+
+    def _missing_parallel(self, chats: List[str], user_id: int) -> List[str]:
+        # Fan out one lookup per chat and stop at the first "not joined" answer,
+        # so latency is bounded by the slowest call instead of their sum
+        futures = {
+            self.executor.submit(self.is_member, chat, user_id): chat
+            for chat in chats
+        }
+        deadline = time.monotonic() + self.timeout
+        pending = set(futures)
+        not_joined = []
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            for future in done:
+                if not future.result():
+                    not_joined.append(futures[future])
+            if not_joined:
+                break
+
+        if not not_joined and pending:
+            for future in pending:
+                logger.warning("Timed out checking membership in %s", futures[future])
+            not_joined = [futures[f] for f in pending]
+
+        for future in pending:
+            future.cancel()
+        # Keep the REQUIRED_CHATS order in the reply
+        return [chat for chat in chats if chat in not_joined]
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
@@ -0,0 +1,269 @@
+import bisect
+import math
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Seconds; spans a cached in-memory handler up to a slow Bot API round trip
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: Sequence, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Sharded:
+    """Per-thread slots so recording takes no lock
+
+    Each thread only ever writes its own list, found through a threading.local;
+    readers sum all of them. A finished thread's shard keeps its counts.
+    """
+
+    __slots__ = ("_local", "_shards", "_width", "_lock")
+
+    def __init__(self, width: int):
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._width = width
+        self._lock = threading.Lock()
+
+    def _new_shard(self) -> List[float]:
+        # Once per thread
+        shard = [0] * self._width
+        with self._lock:
+            self._shards.append(shard)
+        self._local.shard = shard
+        return shard
+
+    def totals(self) -> List[float]:
+        totals = [0] * self._width
+        with self._lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for i, value in enumerate(shard):
+                totals[i] += value
+        return totals
+
+
+class CounterChild(_Sharded):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1):
+        try:
+            self._local.shard[0] += amount
+        except AttributeError:
+            self._new_shard()[0] += amount
+
+    def value(self) -> float:
+        return self.totals()[0]
+
+
+class HistogramChild(_Sharded):
+    __slots__ = ("_bounds",)
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        # One slot per bucket (non-cumulative), then +Inf, then the sum
+        super().__init__(len(bounds) + 2)
+        self._bounds = bounds
+
+    def observe(self, value: float):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._new_shard()
+        shard[bisect.bisect_left(self._bounds, value)] += 1
+        shard[-1] += value
+
+    def snapshot(self) -> Tuple[List[int], float]:
+        """Cumulative bucket counts (the last one is +Inf, i.e. the total) and the sum"""
+        totals = self.totals()
+        cumulative, running = [], 0
+        for count in totals[:-1]:
+            running += count
+            cumulative.append(running)
+        return cumulative, totals[-1]
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        if not self.labelnames:
+            self._unlabelled = self.labels()
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values):
+        """The child for one label combination; keep it around on hot paths"""
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+            with self._lock:
+                child = self._children.setdefault(values, self._new_child())
+        return child
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items(), key=lambda item: item[0]):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self._unlabelled.inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value())}"]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def _new_child(self):
+        return HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self._unlabelled.observe(value)
+
+    def _render_child(self, values, child):
+        cumulative, total = child.snapshot()
+        lines = []
+        for bound, count in zip(self.buckets + (math.inf,), cumulative):
+            le = f'le="{_number(bound)}"'
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, le)} {count}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {cumulative[-1]}")
+        return lines
+
+
+class Gauge(_Metric):
+    """Read at scrape time from a callback, so the instrumented code does nothing"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.read = read
+        super().__init__(name, help)
+
+    def _new_child(self):
+        return None
+
+    def _render_child(self, values, child):
+        try:
+            value = self.read()
+        except Exception:
+            return []
+        return [f"{self.name} {_number(value)}"]
+
+
+class CallbackCounter(Gauge):
+    """A counter kept elsewhere (e.g. in a component's stats) and read at scrape time"""
+
+    kind = "counter"
+
+
+class Registry:
+    """Named metrics rendered in the Prometheus text exposition format"""
+
+    CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+
+    def _add(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help, labelnames))
+
+    def histogram(self, name: str, help: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help, labelnames, buckets))
+
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        return self._add(Gauge(name, help, read))
+
+    def counter_func(self, name: str, help: str, read: Callable[[], float]) -> CallbackCounter:
+        return self._add(CallbackCounter(name, help, read))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+class ApiCallMetrics:
+    """Bot API call count, latency and errors per method"""
+
+    def __init__(self, registry: Registry, prefix: str = "menfes_bot_api"):
+        self.calls = registry.counter(f"{prefix}_calls_total", "Bot API calls made", ("method",))
+        self.errors = registry.counter(f"{prefix}_errors_total", "Bot API calls that raised", ("method",))
+        self.latency = registry.histogram(f"{prefix}_call_duration_seconds", "Bot API call latency", ("method",))
+        self._by_method: Dict[str, tuple] = {}
+
+    def observe(self, method: str, seconds: float, error: Optional[Exception] = None):
+        children = self._by_method.get(method)
+        if children is None:
+            children = self._by_method.setdefault(
+                method, (self.calls.labels(method), self.latency.labels(method), self.errors.labels(method))
+            )
+        calls, latency, errors = children
+        calls.inc()
+        latency.observe(seconds)
+        if error is not None:
+            errors.inc()
+
+    def wrap(self, method: str, call: Callable) -> Callable:
+        """`call` with every invocation recorded under `method`"""
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                result = call(*args, **kwargs)
+            except Exception as e:
+                self.observe(method, time.perf_counter() - started, e)
+                raise
+            self.observe(method, time.perf_counter() - started)
+            return result
+        return timed
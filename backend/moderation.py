@@ -0,0 +1,154 @@
+import logging
+import os
+import threading
+import time
+from collections import deque
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from textnorm import skeleton
+
+logger = logging.getLogger(__name__)
+
+
+class WordFilter:
+    """Aho-Corasick automaton over the skeletons (see textnorm.skeleton) of blocklist entries
+
+    An entry matches as a whole word or phrase; a `*` at either end lets it
+    match inside a longer word on that side ("anjing*" also finds
+    "anjingnya"). Word boundaries are part of the patterns themselves (the
+    text is matched as " skeleton "), so a message is scanned once, in time
+    linear in its length, however many entries there are.
+    """
+
+    def __init__(self, entries: Iterable[str]):
+        self.terms: List[str] = []
+        self._goto: List[dict] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[Tuple[int, ...]] = [()]
+        for entry in entries:
+            self._add(entry)
+        self._link()
+
+    def _add(self, entry: str):
+        term = entry.strip()
+        key = skeleton(term.strip("*"))
+        if not key:
+            return
+        pattern = ("" if term.startswith("*") else " ") + key + ("" if term.endswith("*") else " ")
+        state = 0
+        for ch in pattern:
+            following = self._goto[state].get(ch)
+            if following is None:
+                following = self._goto[state][ch] = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append(())
+            state = following
+        self._out[state] += (len(self.terms),)
+        self.terms.append(term)
+
+    def _link(self):
+        """Failure links breadth-first; each state's outputs include those of its failure chain"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, child in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(ch, 0)
+                self._out[child] += self._out[self._fail[child]]
+                queue.append(child)
+
+    def find(self, text: str) -> List[str]:
+        """Blocklist entries found in text, each once, in the order their first matches end"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = []
+        state = 0
+        for ch in f" {skeleton(text)} ":
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.extend(out[state])
+        return [self.terms[i] for i in dict.fromkeys(found)]
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+
+def parse_blocklist(text: str) -> List[str]:
+    """One entry per line; blank lines and lines starting with # are skipped"""
+    return [line.strip() for line in text.splitlines() if line.strip() and not line.lstrip().startswith("#")]
+
+
+class Moderator:
+    """WordFilter for a blocklist file, rebuilt when the file changes
+
+    The file's modification time is checked at most every check_interval
+    seconds, from whichever thread calls check(); the new automaton is built
+    by that thread while the others keep using the current one.
+    """
+
+    def __init__(self, path: str, check_interval: float = 5.0, clock: Callable[[], float] = time.monotonic):
+        self.path = path
+        self.check_interval = check_interval
+        self.clock = clock
+        self.filter = WordFilter(())
+        self.reloads = 0
+        self.checked = 0
+        self.flagged = 0
+        self._version: Optional[Tuple[int, int]] = None
+        self._next_check = 0.0
+        self._reloading = threading.Lock()
+        self.reload()
+
+    def reload(self) -> bool:
+        """Rebuild the filter if the file changed; True if it was rebuilt"""
+        if not self._reloading.acquire(blocking=False):
+            return False
+        try:
+            self._next_check = self.clock() + self.check_interval
+            try:
+                stat = os.stat(self.path)
+            except FileNotFoundError:
+                if self._version != (0, 0):
+                    logger.warning(f"Blocklist {self.path} not found, nothing is filtered")
+                    self.filter, self._version = WordFilter(()), (0, 0)
+                return False
+            version = (stat.st_mtime_ns, stat.st_size)
+            if version == self._version:
+                return False
+            started = time.perf_counter()
+            with open(self.path, encoding="utf-8") as f:
+                entries = parse_blocklist(f.read())
+            self.filter, self._version = WordFilter(entries), version
+            self.reloads += 1
+            logger.info(
+                f"Loaded {len(self.filter)} blocklist entries from {self.path} "
+                f"in {(time.perf_counter() - started) * 1000:.1f}ms"
+            )
+            return True
+        except (OSError, UnicodeDecodeError) as e:
+            logger.error(f"Error loading blocklist {self.path}, keeping the previous one: {e}")
+            return False
+        finally:
+            self._reloading.release()
+
+    def check(self, text: str) -> List[str]:
+        """Blocklist entries found in text; empty when it may be posted"""
+        if self.clock() >= self._next_check:
+            self.reload()
+        self.checked += 1
+        found = self.filter.find(text)
+        if found:
+            self.flagged += 1
+        return found
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self.filter),
+            "reloads": self.reloads,
+            "checked": self.checked,
+            "flagged": self.flagged,
+        }
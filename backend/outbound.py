@@ -0,0 +1,505 @@
+import heapq
+import itertools
+import json
+import logging
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import wait as wait_futures
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lower value goes first when the global limit is the bottleneck
+PRIORITY_REPLY = 0    # answers to the user who is waiting in the chat
+PRIORITY_CHANNEL = 1  # posts to CHANNEL_ID
+
+
+class TokenBucket:
+    """Classic token bucket: rate tokens per second, up to capacity"""
+
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def delay(self, now: float) -> float:
+        """Seconds until one token is available"""
+        self._refill(now)
+        if self.tokens >= 1:
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class OutboundJob:
+    """One Bot API call waiting to be sent"""
+
+    __slots__ = ("method", "chat_id", "kwargs", "priority", "persist_id", "attempts", "future", "on_done", "collector")
+
+    def __init__(self, method: str, chat_id, kwargs: Dict[str, Any], priority: int, persist_id=None,
+                 on_done: Optional[Callable] = None, collector: Optional[list] = None):
+        self.method = method
+        self.chat_id = chat_id
+        self.kwargs = kwargs
+        self.priority = priority
+        self.persist_id = persist_id
+        self.attempts = 0
+        self.future: Future = Future()
+        # on_done(result, error) runs before the future resolves; jobs it submits
+        # are collected by whoever collected this one
+        self.on_done = on_done
+        self.collector = collector
+
+
+class _ChatQueue:
+    __slots__ = ("chat_id", "jobs", "bucket", "blocked_until", "busy", "scheduled")
+
+    def __init__(self, chat_id, bucket: TokenBucket):
+        self.chat_id = chat_id
+        self.jobs: "deque[OutboundJob]" = deque()
+        self.bucket = bucket
+        self.blocked_until = 0.0
+        self.busy = False
+        self.scheduled = False
+
+    def delay(self, now: float) -> float:
+        return max(self.bucket.delay(now), self.blocked_until - now)
+
+
+class PersistentQueue:
+    """SQLite table holding jobs that must survive a restart until they are sent"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS outbound ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, method TEXT NOT NULL, "
+                "chat_id INTEGER NOT NULL, kwargs TEXT NOT NULL, priority INTEGER NOT NULL)"
+            )
+
+    def add(self, method: str, chat_id, kwargs: Dict[str, Any], priority: int) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO outbound (method, chat_id, kwargs, priority) VALUES (?, ?, ?, ?)",
+                (method, chat_id, json.dumps(kwargs, ensure_ascii=False), priority),
+            )
+            return cursor.lastrowid
+
+    def add_many(self, jobs: List[tuple]) -> List[int]:
+        """add() for several (method, chat_id, kwargs, priority) jobs in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                ids = [
+                    self._conn.execute(
+                        "INSERT INTO outbound (method, chat_id, kwargs, priority) VALUES (?, ?, ?, ?)",
+                        (method, chat_id, json.dumps(kwargs, ensure_ascii=False), priority),
+                    ).lastrowid
+                    for method, chat_id, kwargs, priority in jobs
+                ]
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return ids
+
+    def remove(self, job_id: int):
+        with self._lock:
+            self._conn.execute("DELETE FROM outbound WHERE id = ?", (job_id,))
+
+    def pending(self) -> List[tuple]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, method, chat_id, kwargs, priority FROM outbound ORDER BY id"
+            ).fetchall()
+        return [(row[0], row[1], row[2], json.loads(row[3]), row[4]) for row in rows]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM outbound").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """retry_after seconds from a Telegram 429, if that is what this error is"""
+    if getattr(error, "error_code", None) != 429:
+        return None
+    result_json = getattr(error, "result_json", None) or {}
+    return float((result_json.get("parameters") or {}).get("retry_after", 1))
+
+
+def _is_permanent(error: Exception) -> bool:
+    # 4xx other than 429 will fail the same way again; network errors and 5xx will not
+    code = getattr(error, "error_code", None)
+    return isinstance(code, int) and 400 <= code < 500 and code != 429
+
+
+class OutboundScheduler:
+    """Rate-limit aware queue for every Bot API call the handlers make
+
+    Each chat has its own token bucket and FIFO queue (so messages to one chat
+    stay in order), a global bucket caps the bot as a whole, and replies are
+    preferred over channel posts when the global limit is reached. 429s are
+    honored through retry_after. Jobs submitted with persist=True are stored
+    until Telegram accepts them and are re-queued on restart.
+    """
+
+    def __init__(
+        self,
+        bot,
+        global_rate: float = 30.0,
+        private_rate: float = 1.0,
+        private_burst: float = 3.0,
+        group_rate: float = 20 / 60,
+        group_burst: float = 3.0,
+        senders: int = 4,
+        max_attempts: int = 3,
+        max_backoff: float = 60.0,
+        store: Optional[PersistentQueue] = None,
+        api_metrics=None,
+    ):
+        self.bot = bot
+        # metrics.ApiCallMetrics, or None
+        self.api_metrics = api_metrics
+        self.private_rate = private_rate
+        self.private_burst = private_burst
+        self.group_rate = group_rate
+        self.group_burst = group_burst
+        self.senders = max(1, senders)
+        self.max_attempts = max_attempts
+        self.max_backoff = max_backoff
+        self.store = store
+        self.global_bucket = TokenBucket(global_rate, global_rate)
+        self._chats: Dict[Any, _ChatQueue] = {}
+        self._ready: list = []    # (priority, seq, chat_id) allowed to send now
+        self._waiting: list = []  # (not_before, priority, seq, chat_id) throttled
+        self._delayed: list = []  # (not_before, seq, job) submitted with a delay, not queued yet
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._local = threading.local()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = False
+        self.queued = 0
+        self.in_flight = 0
+        self.sent = 0
+        self.retried = 0
+        self.rate_limited = 0
+        self.failed = 0
+
+    # Submission
+
+    def submit(self, method: str, chat_id, priority: int = PRIORITY_REPLY, persist: bool = False,
+               on_done: Optional[Callable] = None, delay: float = 0.0, **kwargs) -> Future:
+        """Queue bot.<method>(chat_id=chat_id, **kwargs); returns a Future with the API result
+
+        With a delay the job joins its chat's queue only after that many seconds,
+        so it does not hold up the chat's other messages meanwhile. A persisted
+        delayed job that is restored after a restart is sent without the delay.
+        """
+        markup = kwargs.get("reply_markup")
+        if markup is not None and hasattr(markup, "to_json"):
+            # Serialize once; telebot passes strings through untouched
+            kwargs["reply_markup"] = markup.to_json()
+        kwargs["chat_id"] = chat_id
+        persist_id = None
+        if persist and self.store is not None:
+            persist_id = self.store.add(method, chat_id, kwargs, priority)
+        # A delayed job is not collected: waiting for it would hold the caller for the whole delay
+        collected = getattr(self._local, "collected", None) if delay <= 0 else None
+        job = OutboundJob(method, chat_id, kwargs, priority, persist_id, on_done, collected)
+        if collected is not None:
+            collected.append(job.future)
+        if delay > 0:
+            self._ensure_started()
+            with self._cond:
+                heapq.heappush(self._delayed, (time.monotonic() + delay, next(self._seq), job))
+                self.queued += 1
+                self._cond.notify()
+        else:
+            self._enqueue(job)
+        return job.future
+
+    def submit_many(self, method: str, calls: List[tuple], priority: int = PRIORITY_REPLY,
+                    persist: bool = False) -> List[Future]:
+        """Queue bot.<method> for each (chat_id, kwargs, on_done) in calls
+
+        Persisted jobs are stored in one write (one transaction or log commit)
+        instead of one per job; sending them is rate limited as usual.
+        """
+        for _, kwargs, _ in calls:
+            markup = kwargs.get("reply_markup")
+            if markup is not None and hasattr(markup, "to_json"):
+                kwargs["reply_markup"] = markup.to_json()
+        calls = [(chat_id, dict(kwargs, chat_id=chat_id), on_done) for chat_id, kwargs, on_done in calls]
+        persist_ids = [None] * len(calls)
+        if persist and self.store is not None and calls:
+            persist_ids = self.store.add_many([(method, chat_id, kwargs, priority) for chat_id, kwargs, _ in calls])
+        collected = getattr(self._local, "collected", None)
+        futures = []
+        for (chat_id, kwargs, on_done), persist_id in zip(calls, persist_ids):
+            job = OutboundJob(method, chat_id, kwargs, priority, persist_id, on_done, collected)
+            if collected is not None:
+                collected.append(job.future)
+            self._enqueue(job)
+            futures.append(job.future)
+        return futures
+
+    def send_message(self, chat_id, text: str, priority: int = PRIORITY_REPLY, persist: bool = False,
+                     on_done: Optional[Callable] = None, delay: float = 0.0, **kwargs) -> Future:
+        return self.submit("send_message", chat_id, priority=priority, persist=persist, on_done=on_done,
+                           delay=delay, text=text, **kwargs)
+
+    def _enqueue(self, job: OutboundJob, front: bool = False):
+        self._ensure_started()
+        with self._cond:
+            queue = self._chats.get(job.chat_id)
+            if queue is None:
+                queue = self._chats[job.chat_id] = _ChatQueue(job.chat_id, self._bucket_for(job.chat_id))
+            if front:
+                queue.jobs.appendleft(job)
+            else:
+                queue.jobs.append(job)
+            self.queued += 1
+            self._schedule(queue, time.monotonic())
+            self._cond.notify()
+
+    def _bucket_for(self, chat_id) -> TokenBucket:
+        # Negative ids are groups and channels
+        if isinstance(chat_id, int) and chat_id > 0:
+            return TokenBucket(self.private_rate, self.private_burst)
+        return TokenBucket(self.group_rate, self.group_burst)
+
+    def restore(self) -> int:
+        """Re-queue persisted jobs left over from a previous process"""
+        if self.store is None:
+            return 0
+        pending = self.store.pending()
+        for job_id, method, chat_id, kwargs, priority in pending:
+            self._enqueue(OutboundJob(method, chat_id, kwargs, priority, job_id))
+        if pending:
+            logger.info(f"Restored {len(pending)} persisted outbound messages")
+        return len(pending)
+
+    @contextmanager
+    def collect(self):
+        """Collect the futures of every job submitted by this thread inside the block"""
+        previous = getattr(self._local, "collected", None)
+        self._local.collected = collected = []
+        try:
+            yield collected
+        finally:
+            self._local.collected = previous
+
+    @staticmethod
+    def wait(futures: List[Future], timeout: Optional[float] = None) -> bool:
+        """Wait for the collected jobs, including follow-ups their on_done hooks queue"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        checked = 0
+        while checked < len(futures):
+            checked = len(futures)
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            _, not_done = wait_futures(futures[:checked], timeout=remaining)
+            if not_done:
+                return False
+        return True
+
+    def _complete(self, job: OutboundJob, result=None, error: Optional[Exception] = None):
+        if job.on_done is not None:
+            previous = getattr(self._local, "collected", None)
+            self._local.collected = job.collector
+            try:
+                job.on_done(result, error)
+            except Exception as e:
+                logger.error(f"Error in outbound completion hook for {job.method}: {e}")
+            finally:
+                self._local.collected = previous
+        if error is None:
+            job.future.set_result(result)
+        else:
+            job.future.set_exception(error)
+
+    # Scheduling
+
+    def _schedule(self, queue: _ChatQueue, now: float):
+        """Put a chat with pending work on the ready or waiting heap (lock held)"""
+        if queue.busy or queue.scheduled:
+            return
+        if not queue.jobs:
+            del self._chats[queue.chat_id]
+            return
+        queue.scheduled = True
+        priority = queue.jobs[0].priority
+        delay = queue.delay(now)
+        if delay <= 0:
+            heapq.heappush(self._ready, (priority, next(self._seq), queue.chat_id))
+        else:
+            heapq.heappush(self._waiting, (now + delay, priority, next(self._seq), queue.chat_id))
+
+    def _ensure_started(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._executor = ThreadPoolExecutor(max_workers=self.senders, thread_name_prefix="outbound")
+            self._thread = threading.Thread(target=self._run, name="outbound-scheduler", daemon=True)
+            self._thread.start()
+
+    def _next_job(self):
+        """Pick the next job to send, or return how long to sleep (lock held)"""
+        now = time.monotonic()
+        while self._delayed and self._delayed[0][0] <= now:
+            job = heapq.heappop(self._delayed)[2]
+            queue = self._chats.get(job.chat_id)
+            if queue is None:
+                queue = self._chats[job.chat_id] = _ChatQueue(job.chat_id, self._bucket_for(job.chat_id))
+            queue.jobs.append(job)
+            self._schedule(queue, now)
+        while self._waiting and self._waiting[0][0] <= now:
+            _, priority, seq, chat_id = heapq.heappop(self._waiting)
+            heapq.heappush(self._ready, (priority, seq, chat_id))
+        if not self._ready:
+            wake = min([heap[0][0] for heap in (self._waiting, self._delayed) if heap], default=None)
+            return None, (None if wake is None else wake - now)
+        global_delay = self.global_bucket.delay(now)
+        if global_delay > 0:
+            return None, global_delay
+        _, _, chat_id = heapq.heappop(self._ready)
+        queue = self._chats[chat_id]
+        queue.scheduled = False
+        delay = queue.delay(now)
+        if delay > 0:
+            self._schedule(queue, now)
+            return None, 0
+        job = queue.jobs.popleft()
+        queue.busy = True
+        queue.bucket.consume(now)
+        self.global_bucket.consume(now)
+        self.queued -= 1
+        self.in_flight += 1
+        return (queue, job), None
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    if (self._stopped and not self._ready and not self._waiting and not self._delayed
+                            and not self.in_flight):
+                        return
+                    picked, timeout = self._next_job()
+                    if picked is not None:
+                        break
+                    if timeout != 0:
+                        self._cond.wait(timeout)
+            self._executor.submit(self._send, *picked)
+
+    def _send(self, queue: _ChatQueue, job: OutboundJob):
+        job.attempts += 1
+        started = time.perf_counter()
+        try:
+            result = getattr(self.bot, job.method)(**job.kwargs)
+        except Exception as e:
+            if self.api_metrics is not None:
+                self.api_metrics.observe(job.method, time.perf_counter() - started, e)
+            self._failed(queue, job, e)
+            return
+        if self.api_metrics is not None:
+            self.api_metrics.observe(job.method, time.perf_counter() - started)
+        if job.persist_id is not None:
+            self.store.remove(job.persist_id)
+        with self._cond:
+            self.sent += 1
+            self.in_flight -= 1
+            queue.busy = False
+            self._schedule(queue, time.monotonic())
+            self._cond.notify()
+        self._complete(job, result)
+
+    def _failed(self, queue: _ChatQueue, job: OutboundJob, error: Exception):
+        retry_after = _retry_after(error)
+        if retry_after is not None:
+            self.rate_limited += 1
+            logger.warning(f"Rate limited on {job.method} to {job.chat_id}, retrying in {retry_after}s")
+            delay = retry_after
+        elif _is_permanent(error) or (job.persist_id is None and job.attempts >= self.max_attempts):
+            logger.error(f"Giving up on {job.method} to {job.chat_id} after {job.attempts} attempts: {error}")
+            if job.persist_id is not None:
+                self.store.remove(job.persist_id)
+            with self._cond:
+                self.failed += 1
+                self.in_flight -= 1
+                queue.busy = False
+                self._schedule(queue, time.monotonic())
+                self._cond.notify()
+            self._complete(job, error=error)
+            return
+        else:
+            # Persisted jobs are retried until they succeed
+            delay = min(self.max_backoff, 2 ** (job.attempts - 1))
+            logger.warning(f"Error on {job.method} to {job.chat_id}, retrying in {delay}s: {error}")
+        with self._cond:
+            self.retried += 1
+            self.in_flight -= 1
+            self.queued += 1
+            queue.busy = False
+            queue.blocked_until = time.monotonic() + delay
+            queue.jobs.appendleft(job)
+            self._chats.setdefault(queue.chat_id, queue)
+            self._schedule(queue, time.monotonic())
+            self._cond.notify()
+
+    # Lifecycle
+
+    def qsize(self) -> int:
+        return self.queued
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "chats": len(self._chats),
+            "sent": self.sent,
+            "retried": self.retried,
+            "rate_limited": self.rate_limited,
+            "failed": self.failed,
+            "persisted": len(self.store) if self.store is not None else 0,
+        }
+
+    def shutdown(self, timeout: Optional[float] = None):
+        """Stop after the queue drains; persisted jobs still queued are kept for the next start"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            if self._thread.is_alive():
+                # Still throttled; whatever is persisted is replayed on next start
+                logger.warning(f"Outbound queue not drained on shutdown, {self.queued} jobs left")
+                return
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+        if self.store is not None:
+            self.store.close()
@@ -0,0 +1,330 @@
+import json
+import logging
+import os
+import re
+import struct
+import threading
+import zlib
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Record header: payload length and CRC32; a torn or corrupt tail fails the check
+_HEADER = struct.Struct("<II")
+_SEGMENT = re.compile(r"^outbox-(\d{8})\.log$")
+
+
+def _segment_name(number: int) -> str:
+    return f"outbox-{number:08d}.log"
+
+
+def _encode(record: dict) -> bytes:
+    payload = json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode()
+    return _HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+
+def _read_segment(path: str) -> Tuple[List[dict], bool]:
+    """Records of one segment, and whether it ended cleanly"""
+    with open(path, "rb") as f:
+        data = f.read()
+    records = []
+    position = 0
+    while position + _HEADER.size <= len(data):
+        length, crc = _HEADER.unpack_from(data, position)
+        start = position + _HEADER.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != crc:
+            return records, False
+        records.append(json.loads(payload))
+        position = start + length
+    return records, position == len(data)
+
+
+def import_jobs(source, target) -> int:
+    """Move every pending job from one outbound store to another; returns how many
+
+    The jobs are made durable in the target, in one write, before any is
+    removed from the source, so a crash in between repeats them rather than
+    losing them.
+    """
+    pending = source.pending()
+    if pending:
+        target.add_many([job[1:] for job in pending])
+    for job in pending:
+        source.remove(job[0])
+    return len(pending)
+
+
+class OutboxLog:
+    """Append-only, group-committed log of jobs that must survive a restart until they are sent
+
+    A drop-in for PersistentQueue as OutboundScheduler's store. add() and
+    remove() append a record and return once it is on disk; threads that
+    append while another one is writing are flushed together by the next
+    write + fsync (group commit), so concurrent callers share one fsync instead
+    of paying one each. Records go to numbered segment files; a new segment
+    starts every segment_bytes and on every open, and the oldest segments are
+    deleted once every job in them has been removed. Opening the directory
+    replays the segments to find the jobs still pending.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = 4 * 1024 * 1024, fsync: bool = True,
+                 commit_sizes=None):
+        self.directory = directory
+        self.segment_bytes = max(1, segment_bytes)
+        self.fsync = fsync
+        # metrics.Histogram of records per write, or None
+        self.commit_sizes = commit_sizes
+        os.makedirs(directory, exist_ok=True)
+        self._cond = threading.Condition()
+        self._jobs: Dict[int, tuple] = {}       # pending job id -> (method, chat_id, kwargs, priority)
+        self._job_segment: Dict[int, int] = {}  # pending job id -> segment holding its add record
+        self._live: Dict[int, int] = {}         # segment -> pending jobs added in it, oldest first
+        self._buffer: List[Tuple[int, bytes]] = []
+        self._appended = 0   # records appended so far
+        self._durable = 0    # records known to be on disk
+        self._failures: List[Tuple[int, int, Exception]] = []  # (first, last) records of failed writes
+        self._writing = False
+        self._file = None
+        self._file_segment = None
+        self._written_segment = 0
+        self._closed = False
+        self.commits = 0
+        self.records = 0
+        self._next_id = 1
+        last = self._replay()
+        self._segment = last + 1
+        self._segment_size = 0
+        self._live[self._segment] = 0
+        with self._cond:
+            self._compact()
+
+    def _replay(self) -> int:
+        segments = sorted(int(m.group(1)) for m in map(_SEGMENT.match, os.listdir(self.directory)) if m)
+        for number in segments:
+            self._live[number] = 0
+            records, clean = _read_segment(os.path.join(self.directory, _segment_name(number)))
+            if not clean:
+                logger.warning(f"Outbox segment {_segment_name(number)} has a torn tail, ignoring it")
+            for record in records:
+                job_id = record["id"]
+                self._next_id = max(self._next_id, job_id + 1)
+                if record["op"] == "add":
+                    self._jobs[job_id] = (record["method"], record["chat_id"], record["kwargs"], record["priority"])
+                    self._job_segment[job_id] = number
+                    self._live[number] += 1
+                elif job_id in self._jobs:
+                    del self._jobs[job_id]
+                    self._live[self._job_segment.pop(job_id)] -= 1
+        if self._jobs:
+            logger.info(f"Outbox replayed {len(segments)} segments, {len(self._jobs)} jobs pending")
+        self._written_segment = segments[-1] if segments else 0
+        return segments[-1] if segments else 0
+
+    # PersistentQueue interface
+
+    def add(self, method: str, chat_id, kwargs: Dict[str, Any], priority: int) -> int:
+        """Record a job; returns its id once the record is durable"""
+        with self._cond:
+            job_id = self._next_id
+            self._next_id += 1
+            record = {"op": "add", "id": job_id, "method": method, "chat_id": chat_id,
+                      "kwargs": kwargs, "priority": priority}
+            self._jobs[job_id] = (method, chat_id, kwargs, priority)
+            self._job_segment[job_id] = self._segment
+            self._live[self._segment] += 1
+            seq = self._append(_encode(record))
+        try:
+            self._commit(seq)
+        except BaseException:
+            with self._cond:
+                self._forget(job_id)
+            raise
+        return job_id
+
+    def add_many(self, jobs: List[tuple]) -> List[int]:
+        """add() for several (method, chat_id, kwargs, priority) jobs, made durable by one commit"""
+        with self._cond:
+            job_ids = []
+            for method, chat_id, kwargs, priority in jobs:
+                job_id = self._next_id
+                self._next_id += 1
+                record = {"op": "add", "id": job_id, "method": method, "chat_id": chat_id,
+                          "kwargs": kwargs, "priority": priority}
+                self._jobs[job_id] = (method, chat_id, kwargs, priority)
+                self._job_segment[job_id] = self._segment
+                self._live[self._segment] += 1
+                seq = self._append(_encode(record))
+                job_ids.append(job_id)
+        if not job_ids:
+            return job_ids
+        try:
+            self._commit(seq)
+        except BaseException:
+            with self._cond:
+                for job_id in job_ids:
+                    self._forget(job_id)
+            raise
+        return job_ids
+
+    def remove(self, job_id: int):
+        with self._cond:
+            if not self._forget(job_id):
+                return
+            seq = self._append(_encode({"op": "done", "id": job_id}))
+        try:
+            self._commit(seq)
+        except OSError:
+            # Already logged; at worst the job is sent again after a restart
+            pass
+
+    def pending(self) -> List[tuple]:
+        with self._cond:
+            return [(job_id, *job) for job_id, job in sorted(self._jobs.items())]
+
+    def __len__(self) -> int:
+        return len(self._jobs)
+
+    def close(self):
+        with self._cond:
+            seq = self._appended
+        self._commit(seq)
+        with self._cond:
+            self._closed = True
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    # Log internals
+
+    def _forget(self, job_id: int) -> bool:
+        if self._jobs.pop(job_id, None) is None:
+            return False
+        self._live[self._job_segment.pop(job_id)] -= 1
+        return True
+
+    def _append(self, data: bytes) -> int:
+        """Buffer a record for the next write; returns its sequence number (lock held)"""
+        if self._closed:
+            raise ValueError("outbox log is closed")
+        if self._segment_size >= self.segment_bytes:
+            self._segment += 1
+            self._segment_size = 0
+            self._live[self._segment] = 0
+        self._buffer.append((self._segment, data))
+        self._segment_size += len(data)
+        self._appended += 1
+        return self._appended
+
+    def _commit(self, seq: int):
+        """Return once record seq is on disk, writing it (and everything buffered with it) if nobody is"""
+        while True:
+            with self._cond:
+                while self._writing and self._durable < seq:
+                    self._cond.wait()
+                for first, last, error in self._failures:
+                    if first <= seq <= last:
+                        raise error
+                if self._durable >= seq:
+                    return
+                self._writing = True
+                batch, self._buffer = self._buffer, []
+                first, upto = self._durable + 1, self._appended
+            try:
+                self._write(batch)
+            except Exception as e:
+                logger.error(f"Outbox write failed, {len(batch)} records lost: {e}")
+                with self._cond:
+                    self._writing = False
+                    self._failures.append((first, upto, e))
+                    self._durable = upto
+                    self._abandon_segment()
+                    self._cond.notify_all()
+                raise
+            with self._cond:
+                self._writing = False
+                self._durable = upto
+                self.commits += 1
+                self.records += len(batch)
+                self._compact()
+                self._cond.notify_all()
+            if self.commit_sizes is not None:
+                self.commit_sizes.observe(len(batch))
+
+    def _write(self, batch: List[Tuple[int, bytes]]):
+        # Only the thread holding _writing gets here, so the file needs no lock
+        start = 0
+        while start < len(batch):
+            segment = batch[start][0]
+            end = start
+            while end < len(batch) and batch[end][0] == segment:
+                end += 1
+            if segment != self._file_segment:
+                self._open_segment(segment)
+            offset = self._file.tell()
+            try:
+                self._file.write(b"".join(data for _, data in batch[start:end]))
+                self._file.flush()
+                if self.fsync:
+                    os.fsync(self._file.fileno())
+            except OSError:
+                # The callers are told it failed, so keep it from being replayed too
+                try:
+                    os.ftruncate(self._file.fileno(), offset)
+                except OSError:
+                    pass
+                raise
+            self._written_segment = segment
+            start = end
+
+    def _abandon_segment(self):
+        """After a failed write: the file may end in a torn record, so nothing more goes after it (lock held)"""
+        if self._file is not None:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+            self._file = None
+        self._file_segment = None
+        self._segment += 1
+        self._segment_size = 0
+        self._live.setdefault(self._segment, 0)
+        # Records buffered meanwhile were meant for the abandoned file
+        self._buffer = [(self._segment, data) for _, data in self._buffer]
+
+    def _open_segment(self, segment: int):
+        if self._file is not None:
+            self._file.close()
+        self._file = open(os.path.join(self.directory, _segment_name(segment)), "ab")
+        self._file_segment = segment
+        if self.fsync and hasattr(os, "O_DIRECTORY"):
+            # Make the new file's directory entry durable too
+            fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _compact(self):
+        """Delete the oldest segments once nothing in them is pending (lock held)
+
+        Only a prefix can go: a later segment may hold the removal records
+        that keep jobs in an earlier one from coming back on replay.
+        """
+        for segment in sorted(self._live):
+            if segment >= self._written_segment or self._live[segment]:
+                return
+            del self._live[segment]
+            try:
+                os.unlink(os.path.join(self.directory, _segment_name(segment)))
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._jobs),
+            "segments": len(self._live),
+            "commits": self.commits,
+            "records": self.records,
+            "records_per_commit": round(self.records / self.commits, 2) if self.commits else 0.0,
+        }
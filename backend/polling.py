@@ -0,0 +1,219 @@
+"""
+Long-polling runner for self-hosted nodes: `python polling.py` from backend/.
+
+Fetches updates with getUpdates instead of receiving webhooks and feeds them
+through the same deduplicator, dispatcher and handlers as server.py. The next
+getUpdates is already in flight while the previous batch is being dispatched,
+and the offset is saved to POLLING_OFFSET_PATH after each batch so a restart
+picks up where it stopped. Use DISPATCH_MODE=pool or batch so handlers run on
+the worker pool; in inline mode each batch is handled before it is saved.
+"""
+import logging
+import os
+import queue
+import signal
+import sys
+import tempfile
+import threading
+import time
+from typing import Callable, List, Optional
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if _BACKEND_DIR not in sys.path:
+    sys.path.insert(0, _BACKEND_DIR)
+
+from dispatch import DispatchRejected  # noqa: E402
+from fastpath import UpdateView  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class OffsetStore:
+    """The next getUpdates offset, kept in a small file replaced atomically"""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def load(self) -> Optional[int]:
+        try:
+            with open(self.path) as f:
+                return int(f.read().strip() or 0) or None
+        except FileNotFoundError:
+            return None
+        except ValueError:
+            logger.warning(f"Ignoring unreadable polling offset in {self.path}")
+            return None
+
+    def save(self, offset: int):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, prefix=".offset-")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(str(offset))
+            os.replace(tmp, self.path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+
+class UpdatePoller:
+    """Long-polls getUpdates and dispatches each batch while the next poll is already waiting
+
+    fetch(offset, timeout, limit) returns the raw update dicts; submit(view) queues
+    one update and raises DispatchRejected when the dispatcher is full, in which
+    case it is retried until accepted (polling slows down instead of dropping).
+    A fetched batch is acknowledged to Telegram by the next poll, before it has
+    been dispatched; the saved offset only advances once it has been.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[Optional[int], int, int], List[dict]],
+        submit: Callable[[UpdateView], None],
+        offsets: OffsetStore,
+        timeout: int = 25,
+        limit: int = 100,
+        retry_interval: float = 1.0,
+        max_retry_interval: float = 30.0,
+    ):
+        self.fetch = fetch
+        self.submit = submit
+        self.offsets = offsets
+        self.timeout = timeout
+        self.limit = limit
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.offset = offsets.load()
+        # One batch waiting while another is dispatched; the poll thread blocks beyond that
+        self._batches: "queue.Queue[object]" = queue.Queue(maxsize=1)
+        self._stopping = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self.polls = 0
+        self.empty_polls = 0
+        self.updates = 0
+        self.errors = 0
+        self.retries = 0
+
+    def start(self):
+        for name, target in (("polling-fetch", self._poll_loop), ("polling-dispatch", self._dispatch_loop)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        logger.info(f"Polling for updates from offset {self.offset}")
+
+    def _poll_loop(self):
+        offset = self.offset
+        delay = self.retry_interval
+        while not self._stopping.is_set():
+            try:
+                updates = self.fetch(offset, self.timeout, self.limit)
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"getUpdates failed, retrying in {delay:g}s: {e}")
+                self._stopping.wait(delay)
+                delay = min(self.max_retry_interval, delay * 2)
+                continue
+            delay = self.retry_interval
+            self.polls += 1
+            if not updates:
+                self.empty_polls += 1
+                continue
+            if self._stopping.is_set():
+                # Not acknowledged yet: the next run fetches this batch again
+                break
+            offset = updates[-1]["update_id"] + 1
+            self._batches.put((updates, offset))
+        self._batches.put(_STOP)
+
+    def _dispatch_loop(self):
+        while True:
+            batch = self._batches.get()
+            if batch is _STOP:
+                return
+            updates, offset = batch
+            for raw in updates:
+                self._submit(UpdateView(raw))
+            self.updates += len(updates)
+            self.offset = offset
+            try:
+                self.offsets.save(offset)
+            except OSError as e:
+                logger.error(f"Could not save polling offset {offset}: {e}")
+
+    def _submit(self, view: UpdateView):
+        delay = 0.01
+        while True:
+            try:
+                self.submit(view)
+                return
+            except DispatchRejected:
+                self.retries += 1
+                time.sleep(delay)
+                delay = min(1.0, delay * 2)
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop polling; batches already fetched are dispatched first"""
+        self._stopping.set()
+        fetcher, dispatcher = self._threads or (None, None)
+        self._threads = []
+        if fetcher is None:
+            return
+        # A long poll in flight can take up to self.timeout to return
+        fetcher.join(timeout)
+        if fetcher.is_alive():
+            self._batches.put(_STOP)
+        dispatcher.join(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "offset": self.offset,
+            "polls": self.polls,
+            "empty_polls": self.empty_polls,
+            "updates": self.updates,
+            "errors": self.errors,
+            "dispatch_retries": self.retries,
+        }
+
+
+def main():
+    import core
+    from telebot import apihelper
+
+    token = core.BOT_TOKEN
+    # Points telebot at BOT_API_URL and the shared connection pool before the first call
+    core.bot.build()
+    if core.DISPATCH_MODE == "inline":
+        logger.warning("DISPATCH_MODE=inline: updates are handled one at a time on the polling thread")
+    if core.POLLING_DELETE_WEBHOOK:
+        # getUpdates is refused while a webhook is set
+        apihelper.delete_webhook(token)
+
+    def fetch(offset, timeout, limit):
+        return apihelper.get_updates(token, offset=offset, limit=limit, long_polling_timeout=timeout)
+
+    poller = UpdatePoller(
+        core.api_metrics.wrap("get_updates", fetch),
+        core.submit_polled_update,
+        OffsetStore(core.POLLING_OFFSET_PATH),
+        timeout=core.POLLING_TIMEOUT,
+        limit=core.POLLING_LIMIT,
+    )
+    stopped = threading.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(signum, lambda *args: stopped.set())
+
+    core.restore_outbound()
+    core.warm_bot_identity()
+    poller.start()
+    while not stopped.wait(1):
+        pass
+    logger.info("Stopping polling")
+    poller.stop(timeout=core.POLLING_TIMEOUT + 5)
+    logger.info(f"Polling stopped: {poller.stats()}")
+    core.shutdown_dispatcher()
+
+
+if __name__ == "__main__":
+    main()
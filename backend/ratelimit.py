@@ -0,0 +1,179 @@
+import logging
+import struct
+import threading
+import time
+from array import array
+from typing import Callable, NamedTuple, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_TAT = struct.Struct("<d")
+_GLOBAL_KEY = 0  # user ids are positive; 0 marks an empty slot and the global limit
+_MIX = 0x9E3779B97F4A7C15  # Fibonacci hashing spreads sequential ids over the sets
+_MASK64 = (1 << 64) - 1
+
+
+class Limited(NamedTuple):
+    scope: str          # "user" or "global"
+    retry_after: float  # seconds until a submission would be allowed
+
+
+def gcra(tat: float, now: float, interval: float, tolerance: float) -> Tuple[bool, float]:
+    """Generic cell rate algorithm: (allowed, new theoretical arrival time, or seconds to wait if not)"""
+    tat = max(tat, now)
+    if tat - now > tolerance:
+        return False, tat - now - tolerance
+    return True, tat + interval
+
+
+class SubmissionLimiter:
+    """GCRA limits on confession submissions, per user and across all users
+
+    `user_limit` submissions per `user_period` may come at once, then one every
+    user_period / user_limit seconds; the same for the global limit (0 turns a
+    limit off). A user's whole state is one timestamp. Locally the timestamps
+    live in two flat arrays of `slots` entries, grouped into `ways`-entry sets
+    by a hash of the user id: a user whose timestamp has passed holds no state,
+    so its slot is free, and when a set is full of active users the one closest
+    to being free is evicted (and gets through early). With a shared backend
+    the timestamps are read from and written to it instead, so every worker
+    enforces the same limits; the round trip is made without holding the lock,
+    and two submissions racing on one user (in one worker or in several) can
+    both get through.
+    """
+
+    def __init__(
+        self,
+        user_limit: int,
+        user_period: float,
+        global_limit: int = 0,
+        global_period: float = 60.0,
+        slots: int = 1 << 18,
+        ways: int = 4,
+        backend=None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.user = (user_period / user_limit, user_period * (user_limit - 1) / user_limit) if user_limit > 0 else None
+        self.overall = (
+            (global_period / global_limit, global_period * (global_limit - 1) / global_limit) if global_limit > 0 else None
+        )
+        self.ways = max(1, ways)
+        self.sets = max(1, slots // self.ways)
+        self._shift = 64 - max(1, (self.sets - 1).bit_length())
+        self._keys = array("q", bytes(8 * self.sets * self.ways))
+        self._tats = array("d", bytes(8 * self.sets * self.ways))
+        self._global_tat = 0.0
+        self.backend = backend
+        self.clock = clock
+        self._lock = threading.Lock()
+        self.allowed = 0
+        self.limited = 0
+        self.evicted = 0
+        self.backend_errors = 0
+
+    # Local table
+
+    def _slot(self, user_id: int, now: float) -> int:
+        """Index of user_id's slot, claiming one if it has none (lock held)"""
+        start = (((user_id * _MIX) & _MASK64) >> self._shift) % self.sets * self.ways
+        free = oldest = -1
+        for slot in range(start, start + self.ways):
+            key = self._keys[slot]
+            if key == user_id:
+                return slot
+            if key == _GLOBAL_KEY or self._tats[slot] <= now:
+                if free < 0:
+                    free = slot
+            elif oldest < 0 or self._tats[slot] < self._tats[oldest]:
+                oldest = slot
+        if free < 0:
+            free = oldest
+            self.evicted += 1
+        self._keys[free] = user_id
+        self._tats[free] = 0.0
+        return free
+
+    # Shared backend
+
+    @staticmethod
+    def _key(user_id: int) -> str:
+        return "limit:global" if user_id == _GLOBAL_KEY else f"limit:{user_id}"
+
+    def _load(self, user_id: int) -> Optional[Tuple[float, float]]:
+        keys = [self._key(user_id)]
+        if self.overall is not None:
+            keys.append(self._key(_GLOBAL_KEY))
+        try:
+            found = self.backend.get_many(keys)
+        except Exception as e:
+            with self._lock:
+                self.backend_errors += 1
+            logger.error(f"Error reading submission limits from {self.backend.name} backend: {e}")
+            return None
+        tats = [_TAT.unpack(found[key])[0] if key in found else 0.0 for key in keys]
+        return tats[0], tats[1] if len(tats) > 1 else 0.0
+
+    def _store(self, user_id: int, user_tat: float, global_tat: float, now: float):
+        items = {}
+        if self.user is not None:
+            items[self._key(user_id)] = _TAT.pack(user_tat)
+        if self.overall is not None:
+            items[self._key(_GLOBAL_KEY)] = _TAT.pack(global_tat)
+        try:
+            # A timestamp that has passed means no state, so it may expire then
+            self.backend.set_many(items, ttl=max(1.0, max(user_tat, global_tat) - now))
+        except Exception as e:
+            with self._lock:
+                self.backend_errors += 1
+            logger.error(f"Error writing submission limits to {self.backend.name} backend: {e}")
+
+    def _check(self, user_tat: float, global_tat: float, now: float) -> Tuple[Optional[Limited], float, float]:
+        """(which limit refuses the submission or None, new user and global timestamps)"""
+        if self.user is not None:
+            allowed, user_tat = gcra(user_tat, now, *self.user)
+            if not allowed:
+                return Limited("user", user_tat), user_tat, global_tat
+        if self.overall is not None:
+            allowed, global_tat = gcra(global_tat, now, *self.overall)
+            if not allowed:
+                return Limited("global", global_tat), user_tat, global_tat
+        return None, user_tat, global_tat
+
+    def _count(self, limited: Optional[Limited]):
+        if limited is None:
+            self.allowed += 1
+        else:
+            self.limited += 1
+
+    def acquire(self, user_id: int) -> Optional[Limited]:
+        """Count a submission by user_id; returns None if allowed, else which limit refused it"""
+        if self.user is None and self.overall is None:
+            return None
+        now = self.clock()
+        # The backend round trip is made without the lock, so a slow backend only holds up its own caller
+        shared = self._load(user_id) if self.backend is not None else None
+        if shared is not None:
+            limited, user_tat, global_tat = self._check(*shared, now)
+            if limited is None:
+                self._store(user_id, user_tat, global_tat, now)
+            with self._lock:
+                self._count(limited)
+            return limited
+        with self._lock:
+            slot = self._slot(user_id, now)
+            limited, user_tat, global_tat = self._check(self._tats[slot], self._global_tat, now)
+            if limited is None:
+                self._tats[slot] = user_tat
+                self._global_tat = global_tat
+            self._count(limited)
+        return limited
+
+    def stats(self) -> dict:
+        return {
+            "slots": len(self._keys),
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "evicted": self.evicted,
+            "backend": self.backend.name if self.backend is not None else "memory",
+            "backend_errors": self.backend_errors,
+        }
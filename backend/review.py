@@ -0,0 +1,116 @@
+import sqlite3
+import threading
+import time
+from typing import Callable, List, NamedTuple, Optional
+
+
+class ReviewPost(NamedTuple):
+    id: int
+    user_id: int
+    text: str      # the confession as the user wrote it
+    reason: str    # why it is waiting for review, shown to the admins
+    created: float
+    language: Optional[str] = None  # the sender's, for the decision notices
+
+
+# Called with the posts being taken, before they are deleted
+Handle = Callable[[List[ReviewPost]], None]
+
+
+class ReviewQueue:
+    """SQLite table of confessions waiting for an admin's decision
+
+    Posts are taken off the queue (to be published or dropped) in the same
+    transaction that reads them, so when several admins, or several workers,
+    act at once each post is decided exactly once. The take methods accept a
+    `handle(posts)` that runs inside that transaction, before the rows are
+    deleted: if it raises, or the process dies before the commit, the posts
+    stay queued. A post handed to the outbound store this way is never lost;
+    after a crash at the wrong moment it may still be waiting for review.
+    """
+
+    def __init__(self, path: str, clock: Callable[[], float] = time.time):
+        self.path = path
+        self.clock = clock
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self.added = 0
+        self.taken = 0
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS review ("
+                "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, "
+                "text TEXT NOT NULL, reason TEXT NOT NULL, created REAL NOT NULL, language TEXT)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS review_user ON review (user_id)")
+            # Queues written before the language column get it, empty for the posts already held
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(review)")}
+            if "language" not in columns:
+                try:
+                    self._conn.execute("ALTER TABLE review ADD COLUMN language TEXT")
+                except sqlite3.OperationalError as e:
+                    # Another worker sharing the file added it first
+                    if "duplicate column" not in str(e):
+                        raise
+
+    def add(self, user_id: int, text: str, reason: str, language: Optional[str] = None) -> int:
+        with self._lock:
+            cursor = self._conn.execute(
+                "INSERT INTO review (user_id, text, reason, created, language) VALUES (?, ?, ?, ?, ?)",
+                (user_id, text, reason, self.clock(), language),
+            )
+            self.added += 1
+            return cursor.lastrowid
+
+    def _take(self, where: str, params: tuple, handle: Optional[Handle]) -> List[ReviewPost]:
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so no other process can take the same rows
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                posts = [
+                    ReviewPost(*row) for row in self._conn.execute(
+                        f"SELECT id, user_id, text, reason, created, language FROM review {where}", params
+                    )
+                ]
+                if posts and handle is not None:
+                    handle(posts)
+                self._conn.executemany("DELETE FROM review WHERE id = ?", [(post.id,) for post in posts])
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            self.taken += len(posts)
+        return posts
+
+    def take(self, post_id: int, handle: Optional[Handle] = None) -> Optional[ReviewPost]:
+        """Remove and return one post; None if it was already decided"""
+        posts = self._take("WHERE id = ?", (post_id,), handle)
+        return posts[0] if posts else None
+
+    def take_next(self, count: int, handle: Optional[Handle] = None) -> List[ReviewPost]:
+        """Remove and return the `count` oldest posts"""
+        return self._take("ORDER BY id LIMIT ?", (max(0, count),), handle)
+
+    def take_user(self, user_id: int, handle: Optional[Handle] = None) -> List[ReviewPost]:
+        """Remove and return every post by user_id"""
+        return self._take("WHERE user_id = ? ORDER BY id", (user_id,), handle)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM review").fetchone()[0]
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending, oldest = self._conn.execute("SELECT COUNT(*), MIN(created) FROM review").fetchone()
+        return {
+            "pending": pending,
+            "oldest_age": self.clock() - oldest if oldest is not None else None,
+            "added": self.added,
+            "taken": self.taken,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,147 @@
+from typing import Callable, Collection, Dict, Optional
+
+from fastpath import KIND_CALLBACK, KIND_MESSAGE, UpdateView
+
+
+class Route:
+    """A handler plus what it wants to receive"""
+
+    __slots__ = ("handler", "raw", "name", "chats")
+
+    def __init__(self, handler: Callable, raw: bool, chats: Optional[Callable[[int], bool]] = None):
+        self.handler = handler
+        # raw handlers get the UpdateView; the rest get telebot's Message / CallbackQuery
+        self.raw = raw
+        self.name = handler.__name__
+        # Chats the route applies to (called with the chat id); None means every chat
+        self.chats = chats
+
+
+class _TrieNode:
+    __slots__ = ("children", "route")
+
+    def __init__(self):
+        self.children: Dict[str, "_TrieNode"] = {}
+        self.route: Optional[Route] = None
+
+
+class Router:
+    """Update routing by table lookup instead of a linear scan of predicates
+
+    Callback data is matched exactly through a dict, then by longest registered
+    prefix through a character trie. Text messages are matched by bot command,
+    then by the sender's session step, then by the default message route; a
+    command limited to some chats is, anywhere else, an ordinary text. The
+    session step is looked up at most once per update.
+
+    In `reserved_chats` (e.g. an admin chat) only the routes registered with a
+    chats filter run; the user-facing routes ignore those chats.
+    """
+
+    def __init__(
+        self,
+        step_lookup: Optional[Callable[[int], Optional[str]]] = None,
+        reserved_chats: Collection[int] = (),
+    ):
+        self.step_lookup = step_lookup
+        self.reserved_chats = frozenset(reserved_chats)
+        self._callbacks: Dict[str, Route] = {}
+        self._prefixes = _TrieNode()
+        self._commands: Dict[str, Route] = {}
+        self._steps: Dict[str, Route] = {}
+        self._default_message: Optional[Route] = None
+
+    # Registration
+
+    def _register(self, table: Dict[str, Route], key: str, raw: bool, chats: Optional[Callable[[int], bool]] = None):
+        def decorator(handler):
+            if key in table:
+                raise ValueError(f"Route {key!r} is already handled by {table[key].name}")
+            table[key] = Route(handler, raw, chats)
+            return handler
+        return decorator
+
+    def command(self, name: str, raw: bool = False, chats: Optional[Callable[[int], bool]] = None):
+        """/name handler; with chats, only in the chats it accepts"""
+        return self._register(self._commands, name, raw, chats)
+
+    def callback(self, data: str, raw: bool = False, chats: Optional[Callable[[int], bool]] = None):
+        return self._register(self._callbacks, data, raw, chats)
+
+    def callback_prefix(self, prefix: str, raw: bool = False, chats: Optional[Callable[[int], bool]] = None):
+        def decorator(handler):
+            node = self._prefixes
+            for char in prefix:
+                node = node.children.setdefault(char, _TrieNode())
+            if node.route is not None:
+                raise ValueError(f"Prefix {prefix!r} is already handled by {node.route.name}")
+            node.route = Route(handler, raw, chats)
+            return handler
+        return decorator
+
+    def message(self, step: Optional[str] = None, raw: bool = False):
+        """Text message handler for users in `step`, or for everyone else when step is None"""
+        if step is not None:
+            return self._register(self._steps, step, raw)
+
+        def decorator(handler):
+            self._default_message = Route(handler, raw)
+            return handler
+        return decorator
+
+    # Lookup
+
+    def _allowed(self, route: Route, chat_id) -> bool:
+        if route.chats is not None:
+            return route.chats(chat_id)
+        return chat_id not in self.reserved_chats
+
+    def _match_prefix(self, data: str) -> Optional[Route]:
+        node, found = self._prefixes, None
+        for char in data:
+            node = node.children.get(char)
+            if node is None:
+                break
+            if node.route is not None:
+                found = node.route
+        return found
+
+    def resolve(self, view: UpdateView) -> Optional[Route]:
+        if view.kind == KIND_CALLBACK:
+            data = view.data
+            if data is None:
+                return None
+            route = self._callbacks.get(data)
+            if route is None:
+                route = self._match_prefix(data)
+            return route if route is not None and self._allowed(route, view.chat_id) else None
+
+        if view.kind == KIND_MESSAGE and view.text is not None:
+            command = view.command
+            if command is not None:
+                route = self._commands.get(command)
+                if route is not None and self._allowed(route, view.chat_id):
+                    return route
+            if view.chat_id in self.reserved_chats:
+                return None
+            if self._steps and self.step_lookup is not None:
+                route = self._steps.get(self.step_lookup(view.chat_id))
+                if route is not None:
+                    return route
+            return self._default_message
+
+        # Non-text messages and other update types have no handlers
+        return None
+
+    def dispatch(self, view: UpdateView) -> Optional[Route]:
+        """Run the matching handler; returns the route used, or None if nothing matched"""
+        route = self.resolve(view)
+        if route is None:
+            return None
+        if route.raw:
+            route.handler(view)
+        elif view.kind == KIND_CALLBACK:
+            route.handler(view.callback_query)
+        else:
+            route.handler(view.message)
+        return route
@@ -0,0 +1,76 @@
+"""
+Serverless entry point (see vercel.json): answers Telegram webhooks without FastAPI.
+
+A cold start only imports core.py, which neither makes network calls nor
+imports FastAPI or telebot. POST / and GET / are served here as plain ASGI;
+any other path imports server.py once and is handed to its FastAPI app.
+Measure with: python benchmarks/bench_coldstart.py
+"""
+import asyncio
+import json
+import os
+import sys
+from functools import partial
+
+_BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+if _BACKEND_DIR not in sys.path:
+    sys.path.insert(0, _BACKEND_DIR)
+
+import core  # noqa: E402
+
+_JSON_HEADERS = [(b"content-type", b"application/json")]
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            return b"".join(chunks)
+
+
+async def _send_json(send, status: int, payload: dict):
+    body = json.dumps(payload, ensure_ascii=False).encode()
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": _JSON_HEADERS + [(b"content-length", str(len(body)).encode())],
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _run_blocking(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(None, partial(func, *args))
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # getMe is not warmed here: it would import telebot during the first request
+            core.restore_outbound()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            core.shutdown_dispatcher()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    """ASGI app: the webhook and health check here, everything else through server.app"""
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+        return
+    if scope["type"] == "http" and scope["path"] == "/":
+        if scope["method"] == "POST":
+            status, payload = await core.receive_webhook(await _read_body(receive), _run_blocking)
+            await _send_json(send, status, payload)
+            return
+        if scope["method"] == "GET":
+            await _send_json(send, 200, {"status": "Menfes API Aktif", "bot_status": "active" if core.bot else "inactive"})
+            return
+    # Stats, metrics and /bot/info are rare enough to pay for FastAPI on first use
+    import server
+
+    await server.app(scope, receive, send)
@@ -0,0 +1,278 @@
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Conversation steps, in flow order
+STEP_CHOOSE_LANG = "choose_lang"
+STEP_VERIFYING = "verifying"
+STEP_WAIT_MSG = "wait_msg"
+STEP_PREVIEW = "preview"
+
+
+class Session:
+    """Per-user conversation state"""
+
+    __slots__ = ("step", "language", "text", "message_id", "touched", "synced")
+
+    def __init__(
+        self,
+        step: str,
+        language: Optional[str] = None,
+        text: Optional[str] = None,
+        message_id: Optional[int] = None,
+    ):
+        self.step = step
+        self.language = language
+        self.text = text
+        self.message_id = message_id
+        self.touched = time.monotonic()
+        # When this copy was last read from or written to the shared backend
+        self.synced = self.touched
+
+    def dumps(self) -> bytes:
+        return json.dumps(
+            [self.step, self.language, self.text, self.message_id],
+            ensure_ascii=False, separators=(",", ":"),
+        ).encode()
+
+    @classmethod
+    def loads(cls, data: bytes) -> "Session":
+        return cls(*json.loads(data))
+
+    def __repr__(self) -> str:
+        return f"Session(step={self.step!r}, language={self.language!r}, message_id={self.message_id!r})"
+
+
+_KEEP = object()
+
+
+class SessionStore:
+    """Sessions keyed by chat id with idle expiry and an LRU-evicted size cap
+
+    With a shared backend (see state_backend.py) the in-memory map becomes a
+    read-through cache: a cached session is trusted for cache_ttl seconds, and
+    changes are collected and written in one batch by flush().
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = 3600.0,
+        max_sessions: int = 100_000,
+        backend=None,
+        cache_ttl: float = 1.0,
+        flush_interval: float = 0.0,
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max(1, max_sessions)
+        self.backend = backend
+        self.cache_ttl = cache_ttl
+        self.flush_interval = flush_interval
+        # Ordered by last access, so the least recently used (and the expired) sit in front
+        self._sessions: "OrderedDict[int, Session]" = OrderedDict()
+        self._dirty: Dict[int, Optional[Session]] = {}
+        # Batch currently being written; still authoritative until the write lands
+        self._inflight: Dict[int, Optional[Session]] = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        self.backend_reads = 0
+        self.backend_writes = 0
+        self.backend_errors = 0
+        self._flusher: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        if backend is not None and flush_interval > 0:
+            self._flusher = threading.Thread(target=self._flush_loop, name="session-flush", daemon=True)
+            self._flusher.start()
+
+    def _expired(self, session: Session, now: float) -> bool:
+        return self.idle_timeout > 0 and now - session.touched > self.idle_timeout
+
+    def get(self, user_id: int) -> Optional[Session]:
+        """Return the live session for a user, refreshing its idle timer"""
+        now = time.monotonic()
+        with self._lock:
+            session = self._sessions.get(user_id)
+            if session is not None and self._expired(session, now):
+                del self._sessions[user_id]
+                self.expirations += 1
+                session = None
+            pending = user_id in self._dirty or user_id in self._inflight
+            if session is not None and (
+                self.backend is None or pending or now - session.synced < self.cache_ttl
+            ):
+                session.touched = now
+                self._sessions.move_to_end(user_id)
+                return session
+            if self.backend is None:
+                return None
+            if pending:
+                # Evicted from the cache but not yet written
+                return self._pending_locked(user_id)
+        return self._load(user_id)
+
+    def _pending_locked(self, user_id: int) -> Optional[Session]:
+        if user_id in self._dirty:
+            return self._dirty[user_id]
+        return self._inflight.get(user_id)
+
+    def _load(self, user_id: int) -> Optional[Session]:
+        # Backend I/O happens outside the lock
+        try:
+            data = self.backend.get(str(user_id))
+            self.backend_reads += 1
+        except Exception as e:
+            self.backend_errors += 1
+            logger.error(f"Error reading session {user_id} from {self.backend.name} backend: {e}")
+            with self._lock:
+                return self._sessions.get(user_id)
+        with self._lock:
+            if user_id in self._dirty or user_id in self._inflight:
+                # Changed locally while we were reading
+                return self._pending_locked(user_id)
+            if data is None:
+                self._sessions.pop(user_id, None)
+                return None
+            session = Session.loads(data)
+            self._sessions.pop(user_id, None)
+            self._sessions[user_id] = session
+            self._purge_locked(session.touched)
+            return session
+
+    def step(self, user_id: int) -> Optional[str]:
+        session = self.get(user_id)
+        return session.step if session else None
+
+    def set(
+        self,
+        user_id: int,
+        step: str,
+        language=_KEEP,
+        text: Optional[str] = None,
+        message_id: Optional[int] = None,
+    ) -> Session:
+        """Move a user to a new step; the chosen language is carried over unless given"""
+        if language is _KEEP:
+            # May read through to the backend if another worker owns the latest copy
+            previous = self.get(user_id)
+            language = previous.language if previous else None
+        with self._lock:
+            self._sessions.pop(user_id, None)
+            session = Session(step, language, text, message_id)
+            self._sessions[user_id] = session
+            if self.backend is not None:
+                self._dirty[user_id] = session
+            self._purge_locked(session.touched)
+            return session
+
+    def put(self, user_id: int, session: Session):
+        with self._lock:
+            self._sessions.pop(user_id, None)
+            session.touched = time.monotonic()
+            self._sessions[user_id] = session
+            if self.backend is not None:
+                self._dirty[user_id] = session
+            self._purge_locked(session.touched)
+
+    def discard(self, user_id: int):
+        """End a user's session"""
+        with self._lock:
+            self._sessions.pop(user_id, None)
+            if self.backend is not None:
+                self._dirty[user_id] = None
+
+    def flush(self):
+        """Write every pending change to the backend in a single batch"""
+        if self.backend is None or not self._dirty:
+            return
+        with self._flush_lock:
+            self._flush()
+
+    def _flush(self):
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            self._inflight = dirty
+        if not dirty:
+            return
+        items = {
+            str(user_id): (session.dumps() if session is not None else None)
+            for user_id, session in dirty.items()
+        }
+        try:
+            self.backend.set_many(items, ttl=self.idle_timeout or None)
+            self.backend_writes += 1
+        except Exception as e:
+            self.backend_errors += 1
+            logger.error(f"Error writing {len(items)} sessions to {self.backend.name} backend: {e}")
+            with self._lock:
+                # Retry next flush unless a newer change superseded them
+                for user_id, session in dirty.items():
+                    self._dirty.setdefault(user_id, session)
+                self._inflight = {}
+            return
+        now = time.monotonic()
+        for session in dirty.values():
+            if session is not None:
+                session.synced = now
+        with self._lock:
+            self._inflight = {}
+
+    def _flush_loop(self):
+        while not self._stopped.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        self._stopped.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        if self.backend is not None:
+            self.backend.close()
+
+    def _purge_locked(self, now: float):
+        # Expired sessions are at the front, so this costs O(expired), not O(n)
+        sessions = self._sessions
+        while sessions:
+            user_id, oldest = next(iter(sessions.items()))
+            if not self._expired(oldest, now):
+                break
+            del sessions[user_id]
+            self.expirations += 1
+        while len(sessions) > self.max_sessions:
+            # With a backend this only drops the cached copy
+            sessions.popitem(last=False)
+            self.evictions += 1
+
+    def purge_expired(self):
+        with self._lock:
+            self._purge_locked(time.monotonic())
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self._dirty.clear()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.get(user_id) is not None
+
+    def stats(self) -> dict:
+        return {
+            "live_sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_timeout": self.idle_timeout,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "backend": self.backend.name if self.backend is not None else "memory",
+            "pending_writes": len(self._dirty),
+            "backend_reads": self.backend_reads,
+            "backend_writes": self.backend_writes,
+            "backend_errors": self.backend_errors,
+        }
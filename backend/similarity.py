@@ -0,0 +1,154 @@
+import hashlib
+import threading
+import time
+from array import array
+from typing import Callable, List, NamedTuple, Optional
+
+from textnorm import fold
+
+# SimHash fingerprints are split into 4 bands of 16 bits. Two fingerprints at
+# Hamming distance <= 3 agree on at least one band, so looking up each band
+# finds every near-duplicate within that distance.
+_BANDS = 4
+_BAND_BITS = 16
+_BAND_MASK = (1 << _BAND_BITS) - 1
+_MAX_FEATURES = 4096
+# The 8 bits of a byte spread over 8 16-bit counters: summing these for every
+# feature's hash counts, for all 64 bit positions at once, how many have it set
+_SPREAD = tuple(sum(1 << (16 * bit) for bit in range(8) if byte >> bit & 1) for byte in range(256))
+_MAX_PROBES = 64  # per band, so a flooded bucket stays cheap to search
+
+
+def _hash64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "little")
+
+
+def simhash(features: List[str]) -> int:
+    """64-bit SimHash of equally weighted features"""
+    total = 0
+    for feature in features[:_MAX_FEATURES]:
+        digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+        for i, byte in enumerate(digest):
+            total += _SPREAD[byte] << (128 * i)
+    half = min(len(features), _MAX_FEATURES) // 2
+    value = 0
+    for bit in range(64):
+        if (total >> (16 * bit)) & 0xFFFF > half:
+            value |= 1 << bit
+    return value
+
+
+class Fingerprint(NamedTuple):
+    exact: int     # hash of the folded text
+    simhash: int   # SimHash of its words and word pairs, or the exact hash for short texts
+    near: bool     # long enough for near-duplicate matching
+
+
+class Match(NamedTuple):
+    exact: bool
+    distance: int
+    user_id: int
+    age: float  # seconds since the earlier text was recorded
+
+
+class DuplicateIndex:
+    """Recently recorded texts, searchable for exact and near duplicates
+
+    Texts are folded (case, diacritics, punctuation) and fingerprinted; texts
+    with at least min_features words and word pairs also match others within
+    max_distance bits of SimHash. Entries live in fixed-size arrays used as a
+    ring of `capacity` slots and expire after `window` seconds. Each band has a
+    table of 65536 chain heads, and every slot links to the previous entry with
+    the same band value; a slot that has been reused ends the chains through it.
+    """
+
+    def __init__(self, window: float = 3600.0, capacity: int = 65536, max_distance: int = 3,
+                 min_features: int = 8, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.capacity = max(1, capacity)
+        self.max_distance = max_distance
+        self.min_features = min_features
+        self.clock = clock
+        self._exact = array("Q", bytes(8 * self.capacity))
+        self._simhash = array("Q", bytes(8 * self.capacity))
+        self._time = array("d", bytes(8 * self.capacity))
+        self._user = array("q", bytes(8 * self.capacity))
+        self._seqs = array("q", [-1]) * self.capacity
+        # Chains hold sequence numbers (slot = seq % capacity); -1 ends a chain
+        self._heads = [array("q", [-1]) * (1 << _BAND_BITS) for _ in range(_BANDS)]
+        self._links = [array("q", [-1]) * self.capacity for _ in range(_BANDS)]
+        self._seq = 0
+        self._lock = threading.Lock()
+        self.checked = 0
+        self.duplicates = 0
+
+    def fingerprint(self, text: str) -> Fingerprint:
+        folded = fold(text)
+        words = folded.split()
+        if not words:
+            # Emoji or punctuation only: compare the text itself
+            return Fingerprint(_hash64(text.strip().encode()), _hash64(text.strip().encode()), False)
+        exact = _hash64(" ".join(words).encode())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        if len(features) < self.min_features:
+            return Fingerprint(exact, exact, False)
+        return Fingerprint(exact, simhash(features), True)
+
+    def check(self, fingerprint: Fingerprint, now: Optional[float] = None) -> Optional[Match]:
+        """The closest recorded text within the window, exact matches first, or None"""
+        now = self.clock() if now is None else now
+        oldest = now - self.window
+        best: Optional[Match] = None
+        with self._lock:
+            self.checked += 1
+            for band in range(_BANDS):
+                value = (fingerprint.simhash >> (_BAND_BITS * band)) & _BAND_MASK
+                seq = self._heads[band][value]
+                links = self._links[band]
+                for _ in range(_MAX_PROBES):
+                    if seq < 0:
+                        break
+                    slot = seq % self.capacity
+                    if self._seqs[slot] != seq or self._time[slot] < oldest:
+                        break
+                    if self._exact[slot] == fingerprint.exact:
+                        self.duplicates += 1
+                        return Match(True, 0, self._user[slot], now - self._time[slot])
+                    if fingerprint.near:
+                        distance = bin(self._simhash[slot] ^ fingerprint.simhash).count("1")
+                        if distance <= self.max_distance and (best is None or distance < best.distance):
+                            best = Match(False, distance, self._user[slot], now - self._time[slot])
+                    seq = links[slot]
+            if best is not None:
+                self.duplicates += 1
+        return best
+
+    def add(self, fingerprint: Fingerprint, user_id: int, now: Optional[float] = None):
+        now = self.clock() if now is None else now
+        with self._lock:
+            seq = self._seq
+            self._seq += 1
+            slot = seq % self.capacity
+            self._exact[slot] = fingerprint.exact
+            self._simhash[slot] = fingerprint.simhash
+            self._time[slot] = now
+            self._user[slot] = user_id
+            self._seqs[slot] = seq
+            for band in range(_BANDS):
+                value = (fingerprint.simhash >> (_BAND_BITS * band)) & _BAND_MASK
+                self._links[band][slot] = self._heads[band][value]
+                self._heads[band][value] = seq
+
+    def __len__(self) -> int:
+        """Entries recorded within the window"""
+        oldest = self.clock() - self.window
+        with self._lock:
+            return sum(1 for slot in range(min(self._seq, self.capacity)) if self._time[slot] >= oldest)
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "recorded": self._seq,
+            "checked": self.checked,
+            "duplicates": self.duplicates,
+        }
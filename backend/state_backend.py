@@ -0,0 +1,272 @@
+import logging
+import socket
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class StateBackend:
+    """Key/value storage shared by every worker process
+
+    Values are opaque bytes. Writes are always batched: a single set_many call
+    carries every change collected since the last flush, None meaning delete.
+    """
+
+    name = "base"
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        raise NotImplementedError
+
+    def set_many(self, items: Dict[str, Optional[bytes]], ttl: Optional[float] = None):
+        raise NotImplementedError
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.get_many([key]).get(key)
+
+    def close(self):
+        pass
+
+
+class MemoryBackend(StateBackend):
+    """Process-local backend, mostly useful for tests"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._data: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        now = time.time()
+        found = {}
+        with self._lock:
+            for key in keys:
+                entry = self._data.get(key)
+                if entry is None:
+                    continue
+                if entry[1] is not None and entry[1] <= now:
+                    del self._data[key]
+                    continue
+                found[key] = entry[0]
+        return found
+
+    def set_many(self, items: Dict[str, Optional[bytes]], ttl: Optional[float] = None):
+        expires = time.time() + ttl if ttl else None
+        with self._lock:
+            for key, value in items.items():
+                if value is None:
+                    self._data.pop(key, None)
+                else:
+                    self._data[key] = (value, expires)
+
+
+class SqliteBackend(StateBackend):
+    """SQLite file in WAL mode, shared by workers on the same host"""
+
+    name = "sqlite"
+
+    def __init__(self, path: str, busy_timeout: float = 5.0):
+        self.path = path
+        self._conn = sqlite3.connect(path, timeout=busy_timeout, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS kv (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS kv_expires ON kv (expires)")
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT key, value FROM kv WHERE key IN ({placeholders}) AND (expires IS NULL OR expires > ?)",
+                (*keys, time.time()),
+            ).fetchall()
+        return {key: bytes(value) for key, value in rows}
+
+    def set_many(self, items: Dict[str, Optional[bytes]], ttl: Optional[float] = None):
+        if not items:
+            return
+        now = time.time()
+        expires = now + ttl if ttl else None
+        upserts = [(k, v, expires) for k, v in items.items() if v is not None]
+        deletes = [(k,) for k, v in items.items() if v is None]
+        with self._lock:
+            # One transaction per batch; expired rows are swept along with it
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if upserts:
+                    self._conn.executemany("INSERT OR REPLACE INTO kv (key, value, expires) VALUES (?, ?, ?)", upserts)
+                if deletes:
+                    self._conn.executemany("DELETE FROM kv WHERE key = ?", deletes)
+                self._conn.execute("DELETE FROM kv WHERE expires IS NOT NULL AND expires <= ?", (now,))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class RedisError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+class RedisBackend(StateBackend):
+    """Minimal RESP2 client: MGET for reads, one pipelined round trip per write batch"""
+
+    name = "redis"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 5.0, prefix: str = "menfes:"):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self.prefix = prefix
+        self._sock: Optional[socket.socket] = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    # RESP framing
+    @staticmethod
+    def _encode(*args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def _read_reply(self):
+        line = self._file.readline()
+        if not line:
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest
+        if kind == b"-":
+            raise RedisError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._file.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            if count < 0:
+                return None
+            return [self._read_reply() for _ in range(count)]
+        raise RedisError(f"Unexpected reply: {line!r}")
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._sock = sock
+        self._file = sock.makefile("rb")
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        if setup:
+            self._pipeline_locked(setup)
+
+    def _close_locked(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = None
+        self._file = None
+
+    def _pipeline_locked(self, commands: List[tuple]) -> list:
+        self._sock.sendall(b"".join(self._encode(*cmd) for cmd in commands))
+        replies, error = [], None
+        for _ in commands:
+            try:
+                replies.append(self._read_reply())
+            except RedisError as e:
+                # Keep reading so the connection stays in sync
+                error = error or e
+                replies.append(None)
+        if error:
+            raise error
+        return replies
+
+    def pipeline(self, commands: List[tuple]) -> list:
+        """Send all commands in one write and read every reply"""
+        with self._lock:
+            for attempt in range(2):
+                try:
+                    if self._sock is None:
+                        self._connect()
+                    return self._pipeline_locked(commands)
+                except (OSError, ConnectionError):
+                    self._close_locked()
+                    if attempt:
+                        raise
+        return []
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self.execute("MGET", *(self.prefix + key for key in keys))
+        return {key: value for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, items: Dict[str, Optional[bytes]], ttl: Optional[float] = None):
+        if not items:
+            return
+        commands = []
+        for key, value in items.items():
+            if value is None:
+                commands.append(("DEL", self.prefix + key))
+            elif ttl:
+                commands.append(("SET", self.prefix + key, value, "PX", int(ttl * 1000)))
+            else:
+                commands.append(("SET", self.prefix + key, value))
+        self.pipeline(commands)
+
+    def close(self):
+        with self._lock:
+            self._close_locked()
+
+
+def create_backend(url: str) -> Optional[StateBackend]:
+    """Build a backend from STATE_BACKEND; None keeps state in process memory only
+
+    memory                  process memory (single worker)
+    sqlite:///path/state.db SQLite file in WAL mode
+    redis://[:password@]host:port/db
+    """
+    if not url or url == "memory":
+        return None
+    parsed = urlparse(url)
+    if parsed.scheme == "sqlite":
+        path = url[len("sqlite:///"):] if url.startswith("sqlite:///") else parsed.path
+        return SqliteBackend(path or "state.db")
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        return RedisBackend(parsed.hostname or "127.0.0.1", parsed.port or 6379, db, parsed.password)
+    raise ValueError(f"Unsupported state backend: {url}")
@@ -0,0 +1,38 @@
+import re
+import unicodedata
+
+_NON_WORD = re.compile(r"[\W_]+")
+_REPEATS = re.compile(r"(.)\1+")
+_SPACED = re.compile(r"\b\w(?: \w\b){2,}")  # "b a b i": three or more single letters in a row
+# Digits and symbols standing in for letters: "4nj1ng", "$h!t". A symbol only
+# counts when a letter or digit follows it, so "bangsat!" stays punctuation.
+_LEET_DIGITS = str.maketrans("013456789", "oieasgtbg")
+_LEET_SYMBOLS = {"@": "a", "$": "s", "!": "i", "|": "i", "+": "t", "€": "e"}
+_LEET_SYMBOL = re.compile(r"[@$!|+€](?=\w)")
+
+
+def _strip_accents(text: str) -> str:
+    decomposed = unicodedata.normalize("NFKD", text)
+    if decomposed.isascii():
+        return decomposed
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch))
+
+
+def fold(text: str) -> str:
+    """Lowercase, diacritics removed, punctuation and runs of whitespace turned into single spaces
+
+    "Café  MANTAP!!" and "cafe mantap" fold to the same string.
+    """
+    return _NON_WORD.sub(" ", _strip_accents(text.casefold())).strip()
+
+
+def skeleton(text: str) -> str:
+    """fold() after undoing common evasions: leetspeak, spaced-out and stretched letters
+
+    "4NJ!iinggg", "a.n.j.i.n.g" and "anjing" have the same skeleton. Used on both the text and
+    the blocklist, so words that really have double letters still match.
+    """
+    text = _strip_accents(text.casefold())
+    text = _LEET_SYMBOL.sub(lambda m: _LEET_SYMBOLS[m.group()], text).translate(_LEET_DIGITS)
+    text = _SPACED.sub(lambda m: m.group().replace(" ", ""), _NON_WORD.sub(" ", text))
+    return _REPEATS.sub(r"\1", text).strip()
@@ -0,0 +1,222 @@
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+TRANSPORT_AUTO = "auto"
+TRANSPORT_HTTPX = "httpx"
+TRANSPORT_REQUESTS = "requests"
+TRANSPORT_TELEBOT = "telebot"  # leave telebot's per-thread requests sessions alone
+
+
+class PoolExhausted(Exception):
+    """No pooled connection became free within the connect timeout"""
+
+
+class _HttpxResponse:
+    """The parts of a requests.Response that telebot's apihelper reads"""
+
+    __slots__ = ("_response",)
+
+    def __init__(self, response):
+        self._response = response
+
+    @property
+    def status_code(self) -> int:
+        return self._response.status_code
+
+    @property
+    def reason(self) -> str:
+        return self._response.reason_phrase
+
+    @property
+    def text(self) -> str:
+        return self._response.text
+
+    def json(self):
+        return self._response.json()
+
+
+def _httpx_available(http2: bool) -> Tuple[bool, bool]:
+    try:
+        import httpx  # noqa: F401
+    except ImportError:
+        return False, False
+    if not http2:
+        return True, False
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return True, False
+    return True, True
+
+
+class BotApiTransport:
+    """One keep-alive connection pool shared by every thread that calls the Bot API
+
+    Installed as telebot's apihelper.CUSTOM_REQUEST_SENDER, replacing its
+    per-thread requests sessions (one pool, and one TLS handshake, per thread).
+    Uses httpx when installed (HTTP/2 if h2 is installed too), otherwise a
+    requests session whose adapter holds pool_size connections. The HTTP client
+    is created on the first request so that nothing is imported before then.
+    """
+
+    def __init__(
+        self,
+        pool_size: int = 8,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 10.0,
+        http2: bool = True,
+        backend: str = TRANSPORT_AUTO,
+    ):
+        self.pool_size = max(1, pool_size)
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.http2 = http2
+        self.backend = backend
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(self.pool_size)
+        self._lock = threading.Lock()
+        self._local = threading.local()  # per-thread cap from timeout()
+        self.in_use = 0
+        self.max_in_use = 0
+        self.requests = 0
+        self.errors = 0
+        self.waits = 0          # requests that found every connection busy
+        self.wait_seconds = 0.0
+        self.exhausted = 0      # requests that gave up waiting
+
+    # Client
+
+    def _create_client(self):
+        has_httpx, has_h2 = _httpx_available(self.http2)
+        if self.backend == TRANSPORT_HTTPX or (self.backend == TRANSPORT_AUTO and has_httpx):
+            import httpx
+
+            self.backend = TRANSPORT_HTTPX
+            # httpx logs every request at INFO; ours are counted in the metrics instead
+            logging.getLogger("httpx").setLevel(logging.WARNING)
+            self.http2 = has_h2
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            timeout = httpx.Timeout(self.read_timeout, connect=self.connect_timeout)
+            return httpx.Client(http2=has_h2, limits=limits, timeout=timeout)
+
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        self.backend = TRANSPORT_REQUESTS
+        self.http2 = False
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=True)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _get_client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+                    logger.info(
+                        f"Bot API transport: {self.backend}, pool of {self.pool_size}"
+                        f"{', HTTP/2' if self.http2 else ''}"
+                    )
+        return self._client
+
+    def install(self):
+        """Route all of telebot's Bot API requests through this pool"""
+        if self.backend == TRANSPORT_TELEBOT:
+            self.http2 = False
+            return
+        from telebot import apihelper
+
+        apihelper.CONNECT_TIMEOUT = self.connect_timeout
+        apihelper.READ_TIMEOUT = self.read_timeout
+        apihelper.CUSTOM_REQUEST_SENDER = self.request
+
+    # Requests
+
+    @contextmanager
+    def timeout(self, seconds: Optional[float]):
+        """Cap the connect and read timeouts of this thread's requests at `seconds` (None: no cap)"""
+        previous = getattr(self._local, "cap", None)
+        if seconds is not None and (previous is None or seconds < previous):
+            self._local.cap = seconds
+        try:
+            yield
+        finally:
+            self._local.cap = previous
+
+    def _acquire(self, connect_timeout: float):
+        if self._slots.acquire(blocking=False):
+            return
+        started = time.monotonic()
+        acquired = self._slots.acquire(timeout=connect_timeout)
+        with self._lock:
+            self.waits += 1
+            self.wait_seconds += time.monotonic() - started
+            if not acquired:
+                self.exhausted += 1
+        if not acquired:
+            raise PoolExhausted(f"All {self.pool_size} Bot API connections busy for {connect_timeout}s")
+
+    def request(self, method: str, url: str, params=None, files=None, timeout=None, proxies=None):
+        """apihelper.CUSTOM_REQUEST_SENDER signature; timeout is (connect, read) per request"""
+        connect_timeout, read_timeout = timeout or (self.connect_timeout, self.read_timeout)
+        cap = getattr(self._local, "cap", None)
+        if cap is not None:
+            connect_timeout, read_timeout = min(connect_timeout, cap), min(read_timeout, cap)
+        client = self._get_client()
+        self._acquire(connect_timeout)
+        with self._lock:
+            self.in_use += 1
+            self.requests += 1
+            if self.in_use > self.max_in_use:
+                self.max_in_use = self.in_use
+        try:
+            if params:
+                params = {key: value for key, value in params.items() if value is not None}
+            if self.backend == TRANSPORT_HTTPX:
+                import httpx
+
+                response = client.request(
+                    method.upper(), url, params=params, files=files,
+                    timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+                )
+                return _HttpxResponse(response)
+            return client.request(
+                method, url, params=params, files=files,
+                timeout=(connect_timeout, read_timeout), proxies=proxies,
+            )
+        except Exception:
+            with self._lock:
+                self.errors += 1
+            raise
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.backend,
+            "http2": self.http2,
+            "pool_size": self.pool_size,
+            "in_use": self.in_use,
+            "max_in_use": self.max_in_use,
+            "requests": self.requests,
+            "errors": self.errors,
+            "waits": self.waits,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "exhausted": self.exhausted,
+        }
+
+    def close(self):
+        with self._client_lock:
+            client, self._client = self._client, None
+        if client is not None:
+            client.close()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the serverless entry point, with a budget.
+
+Each round starts a fresh interpreter with `python -X importtime` and reads the
+cumulative import time of backend/serverless.py (vercel.json's entry point)
+and, for comparison, backend/server.py (FastAPI). asyncio is imported first,
+as the ASGI runtime has already done so before loading the app.
+
+The same child process also checks that importing serverless.py
+  - opens no network connection (socket connects are made to fail), and
+  - does not import fastapi, starlette, telebot or requests,
+then times its first webhook request (an update with no handler, so no Bot
+API call is made; the network stays blocked), which includes registering
+the handlers.
+
+Exits non-zero when the median serverless import exceeds the budget or a check
+fails, so it can gate CI:
+
+    python benchmarks/bench_coldstart.py                       # budget 60 ms
+    COLDSTART_BUDGET_MS=40 python benchmarks/bench_coldstart.py
+"""
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend")
+
+BUDGET_MS = float(os.getenv("COLDSTART_BUDGET_MS", "60"))
+ROUNDS = int(os.getenv("COLDSTART_ROUNDS", "7"))
+HEAVY_MODULES = ("fastapi", "starlette", "telebot", "requests")
+
+CHILD = r"""
+import asyncio, json, socket, sys, time
+
+def no_network(*args, **kwargs):
+    raise AssertionError("unexpected network I/O")
+
+socket.socket.connect = no_network
+socket.create_connection = no_network
+socket.getaddrinfo = no_network
+
+import {module}
+
+result = {{"heavy": [name for name in {heavy!r} if name in sys.modules]}}
+if "{module}" == "serverless":
+    body = json.dumps({{"update_id": 1, "edited_message": {{"message_id": 1, "date": 0}}}}).encode()
+    sent = []
+
+    async def receive():
+        return {{"type": "http.request", "body": body, "more_body": False}}
+
+    async def send(message):
+        sent.append(message)
+
+    started = time.perf_counter()
+    asyncio.run(serverless.app({{"type": "http", "method": "POST", "path": "/"}}, receive, send))
+    result["first_request_ms"] = (time.perf_counter() - started) * 1000
+    result["status"] = sent[0]["status"]
+print("RESULT " + json.dumps(result))
+"""
+
+
+def run_child(module: str, workdir: str) -> dict:
+    env = dict(
+        os.environ,
+        BOT_TOKEN="123:coldstart",
+        OUTBOUND_QUEUE_PATH=os.path.join(workdir, "outbound"),
+        LOG_LEVEL="WARNING",
+    )
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", CHILD.format(module=module, heavy=HEAVY_MODULES)],
+        cwd=BACKEND, env=env, capture_output=True, text=True, timeout=120,
+    )
+    if proc.returncode != 0:
+        raise SystemExit(f"importing {module} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.split("RESULT ", 1)[1])
+    for line in proc.stderr.splitlines():
+        # "import time:  self [us] | cumulative | imported package", nesting by indent
+        parts = line.split("|")
+        if len(parts) == 3 and parts[2].strip() == module and parts[2].startswith(" " + module):
+            result["import_ms"] = int(parts[1]) / 1000
+    return result
+
+
+def main():
+    with tempfile.TemporaryDirectory() as workdir:
+        # Compile bytecode once, as a deployed image would have it
+        run_child("serverless", workdir)
+        serverless = [run_child("serverless", workdir) for _ in range(ROUNDS)]
+        server = [run_child("server", workdir) for _ in range(max(1, ROUNDS // 2))]
+
+    failures = []
+    imports = [r["import_ms"] for r in serverless]
+    first = [r["first_request_ms"] for r in serverless]
+    median = statistics.median(imports)
+    heavy = sorted({name for r in serverless for name in r["heavy"]})
+    if heavy:
+        failures.append(f"serverless.py imported {', '.join(heavy)}")
+    if any(r["status"] != 200 for r in serverless):
+        failures.append("first webhook request did not return 200")
+    if median > BUDGET_MS:
+        failures.append(f"median import {median:.1f} ms is over the {BUDGET_MS:.0f} ms budget")
+
+    print(f"{ROUNDS} fresh interpreters, median (min-max)")
+    print(f"{'import serverless':<28}{median:>8.1f} ms ({min(imports):.1f}-{max(imports):.1f})  budget {BUDGET_MS:.0f} ms")
+    print(f"{'  + first webhook request':<28}{statistics.median(first):>8.1f} ms (registers handlers, imports telebot)")
+    print(f"{'import server (FastAPI)':<28}{statistics.median(r['import_ms'] for r in server):>8.1f} ms")
+    print(f"heavy modules after import: {heavy or 'none'}; network at import: none")
+    if failures:
+        print("FAIL: " + "; ".join(failures))
+        sys.exit(1)
+    print("OK")
+
+
+if __name__ == "__main__":
+    main()
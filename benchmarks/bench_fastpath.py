@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: full Update.de_json vs. the fast-path UpdateView for routing.
+
+Replays the bot flow fixtures (tests/fixtures.py, the same updates as
+bot_flow_test.py) as raw webhook bodies and times, per update:
+  full  json.loads + telebot.types.Update.de_json (what the webhook used to do)
+  fast  fastpath.parse_update (orjson when installed) + reading the routing fields
+
+Run from the repository root: python benchmarks/bench_fastpath.py
+"""
+
+import json
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from telebot.types import Update  # noqa: E402
+
+import fastpath  # noqa: E402
+from tests.fixtures import flow_updates  # noqa: E402
+
+
+def full_path(body):
+    update = Update.de_json(json.loads(body))
+    if update.message:
+        return update.message.chat.id, update.message.text
+    return update.callback_query.message.chat.id, update.callback_query.data
+
+
+def fast_path(body):
+    view = fastpath.parse_update(body)
+    return view.chat_id, view.text if view.kind == fastpath.KIND_MESSAGE else view.data
+
+
+def best_of(func, bodies, number, repeat=5):
+    timer = timeit.Timer(lambda: [func(body) for body in bodies])
+    return min(timer.repeat(repeat=repeat, number=number)) / (number * len(bodies))
+
+
+def main():
+    bodies = [json.dumps(update).encode() for update in flow_updates()]
+    number = int(os.getenv("BENCH_NUMBER", "2000"))
+
+    for body in bodies:
+        assert full_path(body) == fast_path(body)
+
+    full = best_of(full_path, bodies, number)
+    fast = best_of(fast_path, bodies, number)
+    decoder = "orjson" if "orjson" in sys.modules else "json"
+
+    print(f"{len(bodies)} flow updates, best of 5 x {number} rounds")
+    print(f"{'path':<32}{'per update':>14}")
+    print(f"{'json.loads + Update.de_json':<32}{full * 1e6:>11.2f} us")
+    print(f"{'parse_update (' + decoder + ')':<32}{fast * 1e6:>11.2f} us")
+    print(f"speedup: {full / fast:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: cost of recording one metric event.
+
+Times a labelled counter increment and a histogram observation on a child
+fetched once (as server.py does), the labels() lookup on top of that, and
+ApiCallMetrics.observe (three records per Bot API call).
+
+Run from the repository root: python benchmarks/bench_metrics.py
+"""
+
+import os
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from metrics import ApiCallMetrics, Registry  # noqa: E402
+
+
+def per_call(stmt, number, repeat=5):
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+
+
+def main():
+    number = int(os.getenv("BENCH_NUMBER", "200000"))
+    registry = Registry()
+    counter = registry.counter("requests_total", "Requests", ("outcome",))
+    histogram = registry.histogram("handler_seconds", "Handler time", ("handler",))
+    api = ApiCallMetrics(registry)
+    ok = counter.labels("ok")
+    start = histogram.labels("handle_start")
+
+    cases = [
+        ("counter child .inc()", ok.inc),
+        ("histogram child .observe()", lambda: start.observe(0.0042)),
+        ("histogram .labels().observe()", lambda: histogram.labels("handle_start").observe(0.0042)),
+        ("ApiCallMetrics.observe()", lambda: api.observe("send_message", 0.12)),
+        ("empty lambda (call overhead)", lambda: None),
+    ]
+    print(f"best of 5 x {number} calls")
+    for name, stmt in cases:
+        print(f"{name:<34}{per_call(stmt, number) * 1e9:>8.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
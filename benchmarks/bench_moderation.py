@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Blocklist matching cost per message as the blocklist grows.
+
+A synthetic blocklist of N entries (a quarter of them starred) is matched
+against generated confessions with the Aho-Corasick WordFilter and, for
+comparison, with one precompiled regex per entry tried in turn over the same
+skeleton. Both report µs per message and characters per second; building the
+automaton (what a hot reload costs) is timed as well.
+
+Run from the repository root: python benchmarks/bench_moderation.py
+BENCH_MODERATION_MESSAGES (default 5000) sets the messages per run.
+"""
+
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from moderation import WordFilter  # noqa: E402
+from textnorm import skeleton  # noqa: E402
+
+SIZES = (100, 1000, 10000)
+VOCABULARY = (
+    "aku kamu dia suka banget sama yang di kelas tadi pagi semoga baca ini ya kantin penuh "
+    "kenapa hari selasa perpustakaan pojok duduk senyum manis kangen tiap ketemu jadi malu"
+).split()
+
+
+def blocklist(size: int, rng: random.Random):
+    letters = "abcdefghijklmnoprstuwy"
+    entries = set()
+    while len(entries) < size:
+        word = "".join(rng.choice(letters) for _ in range(rng.randint(4, 9)))
+        entries.add(word + "*" if rng.random() < 0.25 else word)
+    return sorted(entries)
+
+
+def messages(count: int, entries, rng: random.Random):
+    texts = []
+    for _ in range(count):
+        words = [rng.choice(VOCABULARY) for _ in range(rng.randint(8, 40))]
+        if rng.random() < 0.05:
+            words.insert(rng.randrange(len(words)), entries[rng.randrange(len(entries))].strip("*"))
+        texts.append(" ".join(words))
+    return texts
+
+
+def regex_filter(entries):
+    patterns = []
+    for entry in entries:
+        key = re.escape(skeleton(entry.strip("*")))
+        left = "" if entry.startswith("*") else r"(?<!\w)"
+        right = "" if entry.endswith("*") else r"(?!\w)"
+        patterns.append((entry, re.compile(left + key + right)))
+
+    def find(text):
+        folded = skeleton(text)
+        return [entry for entry, pattern in patterns if pattern.search(folded)]
+
+    return find
+
+
+def run(find, texts) -> float:
+    began = time.perf_counter()
+    flagged = sum(1 for text in texts if find(text))
+    elapsed = time.perf_counter() - began
+    return elapsed, flagged
+
+
+def main():
+    count = int(os.getenv("BENCH_MODERATION_MESSAGES", "5000"))
+    rng = random.Random(42)
+    print(f"{count} messages per run")
+    print(f"{'entries':>8}{'filter':>10}{'build ms':>10}{'µs/msg':>10}{'chars/s':>12}{'flagged':>9}")
+    for size in SIZES:
+        entries = blocklist(size, rng)
+        texts = messages(count, entries, rng)
+        chars = sum(len(text) for text in texts)
+        for name, build in (("ac", lambda: WordFilter(entries).find), ("regex", lambda: regex_filter(entries))):
+            began = time.perf_counter()
+            find = build()
+            built = (time.perf_counter() - began) * 1000
+            elapsed, flagged = run(find, texts)
+            print(
+                f"{size:>8}{name:>10}{built:>10.1f}{elapsed / count * 1e6:>10.1f}"
+                f"{chars / elapsed:>12.0f}{flagged:>9}"
+            )
+
+
+if __name__ == "__main__":
+    main()
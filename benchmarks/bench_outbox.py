@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Throughput of the durable outbound stores under concurrent writers.
+
+N threads each record channel posts (add, then remove once "sent", as the
+outbound senders do) into a fresh OutboxLog and, for comparison, the SQLite
+PersistentQueue. With more writers the log's group commit shares each fsync
+between more records; records per commit is reported next to posts/s.
+
+Run from the repository root: python benchmarks/bench_outbox.py
+BENCH_OUTBOX_POSTS (default 2000) sets the posts per run and BENCH_OUTBOX_DIR
+the directory to write in (default: a temporary one; use the real disk, as
+tmpfs makes fsync free).
+"""
+
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "backend"))
+
+from outbound import PRIORITY_CHANNEL, PersistentQueue  # noqa: E402
+from outbox import OutboxLog  # noqa: E402
+
+WRITERS = (1, 4, 16, 64)
+KWARGS = {"chat_id": -1002589515039, "text": "🎭 Pesan Anonim\n\n💬 \"" + "x" * 200 + "\"\n\n📝 Dikirim melalui @TextMenfesbot"}
+
+
+def run(store, writers: int, posts: int) -> float:
+    start = threading.Barrier(writers + 1)
+    per_writer = posts // writers
+
+    def writer():
+        start.wait()
+        for _ in range(per_writer):
+            job_id = store.add("send_message", KWARGS["chat_id"], KWARGS, PRIORITY_CHANNEL)
+            store.remove(job_id)
+
+    threads = [threading.Thread(target=writer) for _ in range(writers)]
+    for thread in threads:
+        thread.start()
+    start.wait()
+    began = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return per_writer * writers / (time.perf_counter() - began)
+
+
+def main():
+    posts = int(os.getenv("BENCH_OUTBOX_POSTS", "2000"))
+    with tempfile.TemporaryDirectory(dir=os.getenv("BENCH_OUTBOX_DIR")) as workdir:
+        print(f"{posts} posts (add + remove) per run in {workdir}")
+        print(f"{'store':<10}{'writers':>8}{'posts/s':>10}{'records/commit':>16}")
+        for writers in WRITERS:
+            log = OutboxLog(os.path.join(workdir, f"log-{writers}"))
+            rate = run(log, writers, posts)
+            per_commit = log.stats()["records_per_commit"]
+            log.close()
+            print(f"{'log':<10}{writers:>8}{rate:>10.0f}{per_commit:>16}")
+        for writers in WRITERS:
+            queue = PersistentQueue(os.path.join(workdir, f"queue-{writers}.db"))
+            rate = run(queue, writers, posts)
+            queue.close()
+            print(f"{'sqlite':<10}{writers:>8}{rate:>10.0f}{'-':>16}")
+
+
+if __name__ == "__main__":
+    main()
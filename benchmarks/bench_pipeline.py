@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+pytest-benchmark suite for the webhook pipeline, with a stored baseline.
+
+Covers Update.de_json and fastpath.parse_update on the bot flow fixtures,
+handler lookup, join_buttons() (the cached keyboard JSON), session get/set (in
+memory and on the SQLite backend) and the webhook round trip through both ASGI
+apps in process, with the Bot API answered by loadtest's fake server.
+
+    python benchmarks/bench_pipeline.py                  # compare with the baseline, fail on regressions
+    python benchmarks/bench_pipeline.py --save-baseline  # re-record the baseline on this machine
+
+A benchmark fails the comparison when its fastest round (min) is more than
+BENCH_REGRESSION_THRESHOLD (default 30%) slower than the baseline, or, for the
+webhook round trips, BENCH_ROUNDTRIP_THRESHOLD (default 150%). Medians of
+these microsecond benchmarks move by half or more between identical runs,
+while the min, with warmup, the GC off and rounds calibrated to at least
+BENCH_MIN_TIME seconds, stays within about 20%. Benchmarks over the limit are
+run once more and fail only if the faster of the two runs still is. The
+baseline is kept per platform/interpreter in benchmarks/baseline/; record it
+on the machine that runs the gate, with the same settings. Extra arguments go
+to pytest, e.g. `-k de_json`.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend")
+BASELINE_DIR = os.path.join(ROOT, "benchmarks", "baseline")
+BASELINE_NAME = "baseline"
+THRESHOLD = os.getenv("BENCH_REGRESSION_THRESHOLD", "30%")
+# A webhook round trip hops between the event loop, a worker, the outbound sender and the fake API's
+# threads; its fastest round moves with thread scheduling far more than the in-process benchmarks do
+THRESHOLDS = {"test_webhook_round_trip": os.getenv("BENCH_ROUNDTRIP_THRESHOLD", "150%")}
+MIN_TIME = os.getenv("BENCH_MIN_TIME", "0.0002")  # seconds per round; short benchmarks loop until they reach it
+
+for path in (ROOT, BACKEND):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+from tests.fixtures import flow_updates, message_update  # noqa: E402
+
+UPDATES = flow_updates()
+BODIES = [json.dumps(update).encode() for update in UPDATES]
+
+
+@pytest.fixture(scope="session")
+def workdir():
+    with tempfile.TemporaryDirectory(prefix="bench-pipeline-") as path:
+        yield path
+
+
+@pytest.fixture(scope="session")
+def core(workdir):
+    """core and the handlers, configured for the fake Bot API without rate limits"""
+    from loadtest.fake_bot_api import FakeBotApi
+
+    fake = FakeBotApi(record_calls=False)
+    # core reads its configuration when first imported
+    os.environ.update(
+        BOT_TOKEN="123:bench",
+        BOT_API_URL=fake.api_url,
+        OUTBOUND_QUEUE_PATH=os.path.join(workdir, "outbound"),
+        OUTBOUND_GLOBAL_RATE="1000000",
+        OUTBOUND_PRIVATE_RATE="1000000",
+        LOG_LEVEL="WARNING",
+    )
+    import core
+
+    core.load_handlers()
+    yield core
+    core.shutdown_dispatcher()
+    fake.stop()
+
+
+def test_update_de_json(benchmark):
+    """telebot objects for all seven flow updates"""
+    from telebot.types import Update
+
+    payloads = [json.loads(body) for body in BODIES]
+    benchmark(lambda: [Update.de_json(payload) for payload in payloads])
+
+
+def test_fastpath_parse(benchmark):
+    """UpdateView for all seven flow updates, straight from the raw bodies"""
+    import fastpath
+
+    benchmark(lambda: [fastpath.parse_update(body) for body in BODIES])
+
+
+def test_handler_lookup(benchmark, core):
+    """Router.resolve for all seven flow updates"""
+    import fastpath
+
+    views = [fastpath.parse_update(body) for body in BODIES]
+    benchmark(lambda: [core.router.resolve(view) for view in views])
+
+
+def test_join_buttons(benchmark, core):
+    """The REQUIRED_CHATS keyboard as it is sent (cached JSON)"""
+    import handlers
+
+    benchmark(handlers.join_buttons)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def session_store(request, workdir):
+    from session_store import SessionStore
+    from state_backend import SqliteBackend
+
+    backend = None
+    if request.param == "sqlite":
+        backend = SqliteBackend(os.path.join(workdir, "state.db"))
+    store = SessionStore(backend=backend, cache_ttl=1.0)
+    yield store
+    store.close()
+
+
+def test_session_set_get(benchmark, session_store):
+    """One step change and read back; the SQLite store also writes the change"""
+    user_ids = itertools.cycle(range(1, 1001))
+
+    def step():
+        user_id = next(user_ids)
+        session_store.set(user_id, "wait_msg", language="id")
+        session_store.get(user_id)
+        if session_store.backend is not None:
+            session_store.flush()
+
+    benchmark(step)
+
+
+@pytest.fixture(params=["server", "serverless"])
+def webhook_client(request, core):
+    httpx = pytest.importorskip("httpx")
+    module = __import__(request.param)
+    loop = asyncio.new_event_loop()
+    client = httpx.AsyncClient(transport=httpx.ASGITransport(app=module.app), base_url="http://bench")
+    yield loop, client
+    loop.run_until_complete(client.aclose())
+    loop.close()
+
+
+def test_webhook_round_trip(benchmark, webhook_client):
+    """POST / with /start until the bot's reply has reached the (fake) Bot API"""
+    loop, client = webhook_client
+    update_ids = itertools.count(10_000_000)
+
+    def post():
+        update_id = next(update_ids)
+        body = message_update(update_id, "/start", user_id=20_000_000 + update_id % 1000)
+        response = loop.run_until_complete(client.post("/", json=body))
+        assert response.status_code == 200
+
+    benchmark(post)
+
+
+def _percent(value: str) -> float:
+    return float(value.rstrip("%")) / 100
+
+
+def regressions(results_paths: list, baseline_path: str) -> dict:
+    """Benchmarks whose best min over the runs is slower than the baseline's by more than their threshold"""
+    with open(baseline_path) as f:
+        baseline = {bench["name"]: bench["stats"]["min"] for bench in json.load(f)["benchmarks"]}
+    best = {}
+    for path in results_paths:
+        with open(path) as f:
+            for bench in json.load(f)["benchmarks"]:
+                best[bench["name"]] = min(bench["stats"]["min"], best.get(bench["name"], float("inf")))
+    failed = {}
+    for name, fastest in best.items():
+        if name not in baseline:
+            continue
+        limit = _percent(THRESHOLDS.get(name.split("[")[0], THRESHOLD))
+        change = fastest / baseline[name] - 1
+        if change > limit:
+            failed[name] = f"{name}: min {change:+.0%} against the baseline (limit {limit:.0%})"
+    return failed
+
+
+def main(argv) -> int:
+    from pytest_benchmark.utils import get_machine_id
+
+    options = [
+        "-q", "-p", "no:cacheprovider", f"--benchmark-storage=file://{BASELINE_DIR}",
+        "--benchmark-warmup=on", "--benchmark-disable-gc", f"--benchmark-min-time={MIN_TIME}",
+    ]
+    machine_dir = os.path.join(BASELINE_DIR, get_machine_id())
+    saved = sorted(os.listdir(machine_dir)) if os.path.isdir(machine_dir) else []
+    if "--save-baseline" in argv:
+        argv.remove("--save-baseline")
+        # Replace, rather than add to, this machine's recorded baseline
+        for filename in saved:
+            os.remove(os.path.join(machine_dir, filename))
+        return pytest.main([__file__] + options + [f"--benchmark-save={BASELINE_NAME}"] + argv)
+
+    if not saved:
+        print(f"No baseline for {get_machine_id()}; record one with --save-baseline", file=sys.stderr)
+        return 1
+    baseline_path = os.path.join(machine_dir, saved[-1])
+    with tempfile.TemporaryDirectory(prefix="bench-results-") as directory:
+        results = [os.path.join(directory, "results.json")]
+        # --benchmark-compare prints the side-by-side table; the pass/fail decision is made below
+        status = pytest.main([__file__] + options + ["--benchmark-compare", f"--benchmark-json={results[0]}"] + argv)
+        if status != 0:
+            return status
+        failed = regressions(results, baseline_path)
+        if failed:
+            # A burst of load on the machine slows whatever runs during it; a real regression shows up again
+            print(f"Re-running {len(failed)} slower benchmark(s) to confirm", file=sys.stderr)
+            results.append(os.path.join(directory, "rerun.json"))
+            status = pytest.main(
+                [f"{__file__}::{name}" for name in failed] + options + [f"--benchmark-json={results[1]}"]
+            )
+            if status != 0:
+                return status
+            failed = regressions(results, baseline_path)
+    for line in failed.values():
+        print(f"Performance has regressed: {line}", file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -9,6 +9,8 @@ import json
 import sys
 import time
 
+from tests.fixtures import TEST_USER_ID, callback_update, message_update
+
 # Add backend to path
 sys.path.append('/app/backend')
 
@@ -29,31 +31,11 @@ def test_complete_bot_flow():
     """Test complete bot flow from /start to message sending"""
     print("🚀 Testing Complete Bot Flow\n")
     
-    test_user_id = 987654321
-    test_user_name = "TestUser"
+    test_user_id = TEST_USER_ID
     
     # Step 1: Test /start command
     print("📱 Step 1: Testing /start command...")
-    start_update = {
-        "update_id": 1,
-        "message": {
-            "message_id": 1,
-            "from": {
-                "id": test_user_id,
-                "is_bot": False,
-                "first_name": test_user_name,
-                "username": "testuser"
-            },
-            "chat": {
-                "id": test_user_id,
-                "first_name": test_user_name,
-                "username": "testuser",
-                "type": "private"
-            },
-            "date": 1640995200,
-            "text": "/start"
-        }
-    }
+    start_update = message_update(1, "/start")
     
     status, response = simulate_webhook_update(start_update)
     if status == 200 and response.get("ok"):
@@ -65,7 +47,7 @@ def test_complete_bot_flow():
     # Check state after /start
     try:
         import server
-        user_state = server.state.get(test_user_id)
+        user_state = server.sessions.step(test_user_id)
         if user_state == "choose_lang":
             print("✅ User state correctly set to 'choose_lang'")
         else:
@@ -77,30 +59,7 @@ def test_complete_bot_flow():
     
     # Step 2: Test language selection
     print("\n📱 Step 2: Testing language selection (Indonesian)...")
-    lang_update = {
-        "update_id": 2,
-        "callback_query": {
-            "id": "callback_1",
-            "from": {
-                "id": test_user_id,
-                "is_bot": False,
-                "first_name": test_user_name,
-                "username": "testuser"
-            },
-            "message": {
-                "message_id": 2,
-                "chat": {
-                    "id": test_user_id,
-                    "first_name": test_user_name,
-                    "username": "testuser",
-                    "type": "private"
-                },
-                "date": 1640995200,
-                "text": "Language selection message"
-            },
-            "data": "lang_id"
-        }
-    }
+    lang_update = callback_update(2, "lang_id", "callback_1", "Language selection message")
     
     status, response = simulate_webhook_update(lang_update)
     if status == 200 and response.get("ok"):
@@ -111,8 +70,8 @@ def test_complete_bot_flow():
     
     # Check state after language selection
     try:
-        user_state = server.state.get(test_user_id)
-        if isinstance(user_state, dict) and user_state.get("language") == "id":
+        user_state = server.sessions.get(test_user_id)
+        if user_state is not None and user_state.language == "id":
             print("✅ User state correctly updated with language selection")
         else:
             print(f"❌ Unexpected user state after language selection: {user_state}")
@@ -125,30 +84,7 @@ def test_complete_bot_flow():
     print("\n📱 Step 3: Testing channel verification...")
     
     # First, let's simulate the user clicking "check_join"
-    check_join_update = {
-        "update_id": 3,
-        "callback_query": {
-            "id": "callback_2",
-            "from": {
-                "id": test_user_id,
-                "is_bot": False,
-                "first_name": test_user_name,
-                "username": "testuser"
-            },
-            "message": {
-                "message_id": 3,
-                "chat": {
-                    "id": test_user_id,
-                    "first_name": test_user_name,
-                    "username": "testuser",
-                    "type": "private"
-                },
-                "date": 1640995200,
-                "text": "Join channels message"
-            },
-            "data": "check_join"
-        }
-    }
+    check_join_update = callback_update(3, "check_join", "callback_2", "Join channels message")
     
     status, response = simulate_webhook_update(check_join_update)
     if status == 200 and response.get("ok"):
@@ -160,7 +96,7 @@ def test_complete_bot_flow():
     # Note: In real scenario, bot would check membership via Telegram API
     # For testing, we'll manually set the state to simulate successful verification
     try:
-        server.state[test_user_id] = "wait_msg"
+        server.sessions.set(test_user_id, "wait_msg")
         print("✅ Simulated successful channel verification (state set to 'wait_msg')")
     except Exception as e:
         print(f"❌ Error setting state for message waiting: {e}")
@@ -168,28 +104,9 @@ def test_complete_bot_flow():
     
     # Step 4: Test message input
     print("\n📱 Step 4: Testing message input...")
-    message_update = {
-        "update_id": 4,
-        "message": {
-            "message_id": 4,
-            "from": {
-                "id": test_user_id,
-                "is_bot": False,
-                "first_name": test_user_name,
-                "username": "testuser"
-            },
-            "chat": {
-                "id": test_user_id,
-                "first_name": test_user_name,
-                "username": "testuser",
-                "type": "private"
-            },
-            "date": 1640995200,
-            "text": "Ini adalah pesan anonim untuk testing bot menfes!"
-        }
-    }
-    
-    status, response = simulate_webhook_update(message_update)
+    message_input_update = message_update(4, "Ini adalah pesan anonim untuk testing bot menfes!")
+    
+    status, response = simulate_webhook_update(message_input_update)
     if status == 200 and response.get("ok"):
         print("✅ Message input processed successfully")
     else:
@@ -198,10 +115,10 @@ def test_complete_bot_flow():
     
     # Check state after message input
     try:
-        user_state = server.state.get(test_user_id)
-        if isinstance(user_state, dict) and user_state.get("state") == "preview":
+        user_state = server.sessions.get(test_user_id)
+        if user_state is not None and user_state.step == "preview":
             print("✅ User state correctly set to 'preview' with message stored")
-            print(f"   Stored message: {user_state.get('text', 'N/A')[:50]}...")
+            print(f"   Stored message: {(user_state.text or 'N/A')[:50]}...")
         else:
             print(f"❌ Unexpected user state after message input: {user_state}")
             return False
@@ -211,30 +128,7 @@ def test_complete_bot_flow():
     
     # Step 5: Test message editing (optional step)
     print("\n📱 Step 5: Testing message editing option...")
-    edit_update = {
-        "update_id": 5,
-        "callback_query": {
-            "id": "callback_3",
-            "from": {
-                "id": test_user_id,
-                "is_bot": False,
-                "first_name": test_user_name,
-                "username": "testuser"
-            },
-            "message": {
-                "message_id": 5,
-                "chat": {
-                    "id": test_user_id,
-                    "first_name": test_user_name,
-                    "username": "testuser",
-                    "type": "private"
-                },
-                "date": 1640995200,
-                "text": "Preview message"
-            },
-            "data": "edit_msg"
-        }
-    }
+    edit_update = callback_update(5, "edit_msg", "callback_3", "Preview message")
     
     status, response = simulate_webhook_update(edit_update)
     if status == 200 and response.get("ok"):
@@ -245,7 +139,7 @@ def test_complete_bot_flow():
     
     # Check state after edit request
     try:
-        user_state = server.state.get(test_user_id)
+        user_state = server.sessions.step(test_user_id)
         if user_state == "wait_msg":
             print("✅ User state correctly reset to 'wait_msg' for editing")
         else:
@@ -259,26 +153,7 @@ def test_complete_bot_flow():
     print("\n📱 Step 6: Testing final message and send confirmation...")
     
     # Send new message
-    final_message_update = {
-        "update_id": 6,
-        "message": {
-            "message_id": 6,
-            "from": {
-                "id": test_user_id,
-                "is_bot": False,
-                "first_name": test_user_name,
-                "username": "testuser"
-            },
-            "chat": {
-                "id": test_user_id,
-                "first_name": test_user_name,
-                "username": "testuser",
-                "type": "private"
-            },
-            "date": 1640995200,
-            "text": "Pesan anonim final yang sudah diedit untuk testing!"
-        }
-    }
+    final_message_update = message_update(6, "Pesan anonim final yang sudah diedit untuk testing!")
     
     status, response = simulate_webhook_update(final_message_update)
     if status == 200 and response.get("ok"):
@@ -288,30 +163,7 @@ def test_complete_bot_flow():
         return False
     
     # Confirm sending
-    send_update = {
-        "update_id": 7,
-        "callback_query": {
-            "id": "callback_4",
-            "from": {
-                "id": test_user_id,
-                "is_bot": False,
-                "first_name": test_user_name,
-                "username": "testuser"
-            },
-            "message": {
-                "message_id": 7,
-                "chat": {
-                    "id": test_user_id,
-                    "first_name": test_user_name,
-                    "username": "testuser",
-                    "type": "private"
-                },
-                "date": 1640995200,
-                "text": "Final preview message"
-            },
-            "data": "send_now"
-        }
-    }
+    send_update = callback_update(7, "send_now", "callback_4", "Final preview message")
     
     status, response = simulate_webhook_update(send_update)
     if status == 200 and response.get("ok"):
@@ -322,9 +174,9 @@ def test_complete_bot_flow():
     
     # Check final state
     try:
-        user_state = server.state.get(test_user_id)
+        user_state = server.sessions.get(test_user_id)
         if user_state is None:
-            print("✅ User state correctly reset to None after sending")
+            print("✅ User session correctly ended after sending")
         else:
             print(f"❌ User state not reset after sending: {user_state}")
             return False
@@ -354,13 +206,13 @@ def test_multiple_users():
         users = [111111, 222222, 333333]
         
         for user_id in users:
-            server.state[user_id] = f"test_state_{user_id}"
+            server.sessions.set(user_id, f"test_state_{user_id}")
         
         # Verify each user has their own state
         all_correct = True
         for user_id in users:
             expected_state = f"test_state_{user_id}"
-            actual_state = server.state.get(user_id)
+            actual_state = server.sessions.step(user_id)
             if actual_state != expected_state:
                 print(f"❌ User {user_id} state incorrect: expected {expected_state}, got {actual_state}")
                 all_correct = False
@@ -369,7 +221,7 @@ def test_multiple_users():
         
         # Clean up
         for user_id in users:
-            del server.state[user_id]
+            server.sessions.discard(user_id)
         
         if all_correct:
             print("✅ Multiple user state management working correctly")
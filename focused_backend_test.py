@@ -186,35 +186,35 @@ def test_state_management():
     try:
         import server
         
-        # Test state dictionary exists
-        if hasattr(server, 'state') and isinstance(server.state, dict):
-            print("✅ State dictionary is initialized")
+        # Test session store exists
+        if hasattr(server, 'sessions') and isinstance(server.sessions, server.SessionStore):
+            print("✅ Session store is initialized")
         else:
-            print("❌ State dictionary is missing or wrong type")
+            print("❌ Session store is missing or wrong type")
             return False
             
         # Test state operations
         test_user_id = 123456789
         
         # Test setting state
-        server.state[test_user_id] = "choose_lang"
-        if server.state.get(test_user_id) == "choose_lang":
+        server.sessions.set(test_user_id, "choose_lang")
+        if server.sessions.step(test_user_id) == "choose_lang":
             print("✅ State setting works correctly")
         else:
             print("❌ State setting failed")
             return False
             
         # Test updating state
-        server.state[test_user_id] = {"state": "verifying", "language": "id"}
-        stored_state = server.state.get(test_user_id)
-        if isinstance(stored_state, dict) and stored_state.get("language") == "id":
+        server.sessions.set(test_user_id, "verifying", language="id")
+        stored_state = server.sessions.get(test_user_id)
+        if stored_state is not None and stored_state.language == "id":
             print("✅ Complex state storage works correctly")
         else:
             print("❌ Complex state storage failed")
             return False
             
         # Clean up test state
-        del server.state[test_user_id]
+        server.sessions.discard(test_user_id)
         
         return True
         
@@ -0,0 +1,239 @@
+"""In-process stand-in for the Telegram Bot API (HTTP/1.1 keep-alive, no TLS)
+
+Point the bot at it with BOT_API_URL=<api_url> (or, in-process,
+telebot.apihelper.API_URL = server.api_url). Run standalone with:
+
+    python -m loadtest.fake_bot_api --port 8081 --latency 0.05 --error-rate 0.01 --rate-limit-rate 0.01
+"""
+import argparse
+import itertools
+import json
+import random
+import sys
+import threading
+import time
+from collections import Counter, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional, Sequence
+from urllib.parse import parse_qs, urlparse
+
+BOT = {"id": 1, "is_bot": True, "first_name": "Menfes", "username": "TextMenfesbot"}
+METHODS = ("getMe", "sendMessage", "editMessageText", "getChatMember", "answerCallbackQuery", "getUpdates")
+
+
+def _flatten(query: dict) -> dict:
+    return {key: values[-1] for key, values in query.items()}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; avoid the Nagle/delayed-ACK stall
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def _params(self) -> dict:
+        url = urlparse(self.path)
+        params = _flatten(parse_qs(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        if length:
+            body = self.rfile.read(length)
+            if self.headers.get("Content-Type", "").startswith("application/json"):
+                params.update(json.loads(body))
+            else:
+                params.update(_flatten(parse_qs(body.decode())))
+        return params
+
+    def _reply(self, status: int, payload: dict):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle(self):
+        method = urlparse(self.path).path.rsplit("/", 1)[-1]
+        params = self._params()
+        server = self.server
+        with server.lock:
+            if server.record_calls:
+                server.calls.append((method, params))
+            server.counts[method] += 1
+            server.active += 1
+            server.max_active = max(server.max_active, server.active)
+        try:
+            if server.latency:
+                time.sleep(server.latency)
+            status, payload = server.respond(method, params)
+            self._reply(status, payload)
+            if status == 200 and server.on_call is not None:
+                server.on_call(method, params)
+        finally:
+            with server.lock:
+                server.active -= 1
+
+    do_GET = do_POST = _handle
+
+
+class FakeBotApi(ThreadingHTTPServer):
+    """Answers getMe, sendMessage, editMessageText, getChatMember, answerCallbackQuery and getUpdates
+
+    latency delays every answer; error_rate and rate_limit_rate are the
+    fractions of calls (to inject_methods, or all) that fail with HTTP 500 or
+    with 429 and retry_after. on_call(method, params) runs, on the serving
+    thread, after each successful answer has been written.
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        retry_after: int = 1,
+        inject_methods: Optional[Sequence[str]] = None,
+        record_calls: bool = True,
+        seed: Optional[int] = None,
+        on_call: Optional[Callable[[str, dict], None]] = None,
+    ):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.inject_methods = set(inject_methods) if inject_methods else None
+        self.record_calls = record_calls
+        self.on_call = on_call
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.calls = []
+        self.counts: Counter = Counter()
+        self.errors_injected = 0
+        self.rate_limits_injected = 0
+        self.connections = 0
+        self.active = 0
+        self.max_active = 0
+        self._message_id = 0
+        # Updates served by getUpdates (long polling), see push_update()
+        self._updates = deque()
+        self._update_id = 0
+        self._updates_ready = threading.Condition()
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    @property
+    def api_url(self) -> str:
+        """URL template for BOT_API_URL / telebot.apihelper.API_URL"""
+        return f"http://127.0.0.1:{self.server_port}/bot{{0}}/{{1}}"
+
+    def respond(self, method: str, params: dict):
+        """HTTP status and JSON body for one call, with failures injected"""
+        if self.inject_methods is None or method in self.inject_methods:
+            with self.lock:
+                roll = self.random.random()
+                if roll < self.rate_limit_rate:
+                    self.rate_limits_injected += 1
+                    return 429, {
+                        "ok": False,
+                        "error_code": 429,
+                        "description": f"Too Many Requests: retry after {self.retry_after}",
+                        "parameters": {"retry_after": self.retry_after},
+                    }
+                if roll < self.rate_limit_rate + self.error_rate:
+                    self.errors_injected += 1
+                    return 500, {"ok": False, "error_code": 500, "description": "Internal Server Error"}
+        return 200, {"ok": True, "result": self.result_for(method, params)}
+
+    def push_update(self, update: dict) -> int:
+        """Queue an update for getUpdates; like Telegram, it is given the next update_id"""
+        with self._updates_ready:
+            self._update_id += 1
+            update["update_id"] = self._update_id
+            self._updates.append(update)
+            self._updates_ready.notify_all()
+            return self._update_id
+
+    def _get_updates(self, params: dict) -> list:
+        offset = int(params.get("offset") or 0)
+        limit = int(params.get("limit") or 100)
+        with self._updates_ready:
+            # Like Telegram: asking for offset confirms everything before it
+            while self._updates and self._updates[0]["update_id"] < offset:
+                self._updates.popleft()
+            self._updates_ready.wait_for(lambda: self._updates, float(params.get("timeout") or 0))
+            return list(itertools.islice(self._updates, limit))
+
+    def result_for(self, method: str, params: dict):
+        if method == "getMe":
+            return BOT
+        if method == "getUpdates":
+            return self._get_updates(params)
+        if method == "getChatMember":
+            user = {"id": int(params.get("user_id", 1)), "is_bot": False, "first_name": "User"}
+            return {"status": "member", "user": user}
+        if method in ("sendMessage", "editMessageText"):
+            with self.lock:
+                self._message_id += 1
+                message_id = self._message_id
+            chat = {"id": int(params.get("chat_id", 1)), "type": "private"}
+            return {"message_id": message_id, "date": int(time.time()), "chat": chat, "text": params.get("text", "")}
+        return True
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {
+                "calls": dict(self.counts),
+                "errors_injected": self.errors_injected,
+                "rate_limits_injected": self.rate_limits_injected,
+                "connections": self.connections,
+                "max_concurrent": self.max_active,
+            }
+
+    def handle_error(self, request, client_address):
+        # Clients that gave up (read timeouts) are expected; anything else is reported
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Telegram Bot API server")
+    parser.add_argument("--port", type=int, default=8081)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every call")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of calls answered with HTTP 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of calls answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--inject-methods", default="", help="comma-separated methods to inject failures into")
+    args = parser.parse_args()
+    server = FakeBotApi(
+        port=args.port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        inject_methods=[m for m in args.inject_methods.split(",") if m] or None,
+        record_calls=False,
+    )
+    print(f"Fake Bot API on {server.api_url} (BOT_API_URL)")
+    try:
+        while True:
+            time.sleep(10)
+            print(json.dumps(server.stats()))
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,345 @@
+#!/usr/bin/env python3
+"""
+Load generator: simulated users walking the whole bot flow against a fake Bot API.
+
+Each user sends /start → lang_id → check_join → their message → send_now as
+webhook updates, one step at a time, and waits for the bot's answer (the
+sendMessage that reaches the fake Bot API for their chat) before the next
+step. A step's latency runs from posting the update to that answer, so it
+includes dispatch, membership lookups and the outbound queue. A user whose
+answer is not the expected one (an error, "not joined yet") stops there and
+is reported as a failure.
+
+By default the fake Bot API runs in this process and the bot is started as
+`uvicorn server:app` in backend/, pointed at the fake through BOT_API_URL with
+Telegram's rate limits lifted (--telegram-limits keeps them):
+
+    python -m loadtest.loadgen --users 2000 --concurrency 500
+    python -m loadtest.loadgen --app serverless --latency 0.05 --error-rate 0.01 --rate-limit-rate 0.01
+    python -m loadtest.loadgen --env DISPATCH_MODE=pool --env DISPATCH_WORKERS=32
+    python -m loadtest.loadgen --transport polling
+
+With --transport polling the bot runs `python polling.py` instead and the
+updates are handed out through the fake's getUpdates (with the update_ids
+Telegram would assign) rather than posted to a webhook.
+
+To drive a bot that is already running, start it with
+BOT_API_URL=http://127.0.0.1:8081/bot{0}/{1} and pass --url and --fake-port 8081.
+Needs httpx and uvicorn (loadtest/requirements.txt).
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND = os.path.join(ROOT, "backend")
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from loadtest.fake_bot_api import FakeBotApi  # noqa: E402
+from tests.fixtures import callback_update, message_update  # noqa: E402
+
+CHANNEL_ID = -1002589515039
+FIRST_USER_ID = 10_000_000
+# Each step and the start of the answer that lets the user carry on
+STEPS = {
+    "start": "👋 Halo",
+    "lang": "📢 Gabung",
+    "check_join": "✅ Verifikasi",
+    "wait_msg": "🎭 Preview",
+    "send_now": "✅ Pesan berhasil",
+}
+# Lifted so that the bot, not the simulated Telegram limits, is what gets measured
+NO_LIMITS = {
+    "OUTBOUND_GLOBAL_RATE": "1000000",
+    "OUTBOUND_PRIVATE_RATE": "1000000",
+    "OUTBOUND_CHANNEL_RATE_PER_MIN": "100000000",
+}
+
+
+def flow_updates(user_id: int, update_ids) -> List[tuple]:
+    """(step, update) pairs of one user's journey"""
+    name = f"User{user_id}"
+    return [
+        ("start", message_update(next(update_ids), "/start", user_id, name)),
+        ("lang", callback_update(next(update_ids), "lang_id", f"{user_id}-1", "Language", user_id, name)),
+        ("check_join", callback_update(next(update_ids), "check_join", f"{user_id}-2", "Join", user_id, name)),
+        ("wait_msg", message_update(next(update_ids), f"Pesan anonim dari {user_id} untuk load test", user_id, name)),
+        ("send_now", callback_update(next(update_ids), "send_now", f"{user_id}-3", "Preview", user_id, name)),
+    ]
+
+
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Replies:
+    """Routes the bot's sendMessage calls, seen by the fake Bot API, to the waiting users"""
+
+    def __init__(self, loop: asyncio.AbstractEventLoop):
+        self.loop = loop
+        self.queues: Dict[int, asyncio.Queue] = {}
+        self.channel_posts = 0
+        self.unexpected = 0
+
+    def on_call(self, method: str, params: dict):
+        # Runs on the fake's serving threads
+        if method != "sendMessage":
+            return
+        chat_id = int(params.get("chat_id", 0))
+        if chat_id == CHANNEL_ID:
+            self.channel_posts += 1
+            return
+        queue = self.queues.get(chat_id)
+        if queue is None:
+            self.unexpected += 1
+            return
+        self.loop.call_soon_threadsafe(queue.put_nowait, params.get("text", ""))
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, url: str, replies: Replies, timeout: float, fake: Optional[FakeBotApi] = None):
+        self.client = client
+        self.url = url
+        # Set for --transport polling: updates go out through the fake's getUpdates
+        self.fake = fake
+        self.replies = replies
+        self.timeout = timeout
+        self.update_ids = itertools.count(1)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.flows: List[float] = []
+        self.failures: Counter = Counter()
+        self.updates = 0
+
+    async def user(self, user_id: int):
+        queue = self.replies.queues[user_id] = asyncio.Queue()
+        started = time.perf_counter()
+        try:
+            for step, update in flow_updates(user_id, self.update_ids):
+                sent = time.perf_counter()
+                if self.fake is not None:
+                    self.fake.push_update(update)
+                    self.updates += 1
+                else:
+                    try:
+                        response = await self.client.post(self.url, json=update)
+                    except httpx.HTTPError:
+                        self.failures[f"{step}: request error"] += 1
+                        return
+                    self.updates += 1
+                    if response.status_code != 200:
+                        self.failures[f"{step}: HTTP {response.status_code}"] += 1
+                        return
+                try:
+                    text = await asyncio.wait_for(queue.get(), self.timeout)
+                except asyncio.TimeoutError:
+                    self.failures[f"{step}: no answer in {self.timeout:g}s"] += 1
+                    return
+                if not text.startswith(STEPS[step]):
+                    # e.g. a getChatMember failure is answered with "not joined yet"
+                    self.failures[f"{step}: {text.splitlines()[0]}"] += 1
+                    return
+                self.latencies[step].append(time.perf_counter() - sent)
+            self.flows.append(time.perf_counter() - started)
+        finally:
+            del self.replies.queues[user_id]
+
+    async def run(self, users: int, concurrency: int) -> float:
+        slots = asyncio.Semaphore(concurrency)
+
+        async def limited(user_id: int):
+            async with slots:
+                await self.user(user_id)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(limited(FIRST_USER_ID + i) for i in range(users)))
+        return time.perf_counter() - started
+
+
+def spawn_bot(app: str, port: int, api_url: str, workdir: str, limits: bool, extra_env: List[str]) -> subprocess.Popen:
+    env = dict(
+        os.environ,
+        BOT_TOKEN=os.getenv("BOT_TOKEN", "123:loadtest"),
+        BOT_API_URL=api_url,
+        OUTBOUND_QUEUE_PATH=os.path.join(workdir, "outbound"),
+        LOG_LEVEL=os.getenv("LOG_LEVEL", "WARNING"),
+        # The simulated users' texts differ in one word, which the duplicate check rightly flags
+        SPAM_ACTION="off",
+    )
+    if not limits:
+        env.update(NO_LIMITS)
+    if app == "polling":
+        env.update(
+            DISPATCH_MODE="pool",
+            POLLING_OFFSET_PATH=os.path.join(workdir, "polling_offset"),
+            POLLING_TIMEOUT="2",
+        )
+        command = [sys.executable, "polling.py"]
+    else:
+        command = [
+            sys.executable, "-m", "uvicorn", f"{app}:app",
+            "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning", "--no-access-log",
+        ]
+    env.update(item.split("=", 1) for item in extra_env)
+    return subprocess.Popen(command, cwd=BACKEND, env=env)
+
+
+async def wait_until_up(client: httpx.AsyncClient, url: str, process: Optional[subprocess.Popen], timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise SystemExit(f"bot exited with status {process.returncode}")
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.1)
+    raise SystemExit(f"bot not answering at {url} after {timeout:g}s")
+
+
+async def wait_until_polling(fake: FakeBotApi, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"bot exited with status {process.returncode}")
+        if fake.counts["getUpdates"]:
+            return
+        await asyncio.sleep(0.1)
+    raise SystemExit(f"bot has not called getUpdates after {timeout:g}s")
+
+
+async def run(args) -> dict:
+    replies = Replies(asyncio.get_running_loop())
+    fake = FakeBotApi(
+        port=args.fake_port,
+        latency=args.latency,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        retry_after=args.retry_after,
+        record_calls=False,
+        on_call=replies.on_call,
+    )
+    process = None
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    polling = args.transport == "polling"
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            url = args.url
+            if polling:
+                process = spawn_bot("polling", 0, fake.api_url, workdir, args.telegram_limits, args.env)
+            elif url is None:
+                port = free_port()
+                url = f"http://127.0.0.1:{port}/"
+                process = spawn_bot(args.app, port, fake.api_url, workdir, args.telegram_limits, args.env)
+            async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+                if polling:
+                    await wait_until_polling(fake, process)
+                else:
+                    await wait_until_up(client, url, process)
+                test = LoadTest(client, url, replies, args.timeout, fake if polling else None)
+                elapsed = await test.run(args.users, args.concurrency)
+            if process is not None:
+                process.terminate()
+                process.wait(timeout=15)
+    finally:
+        if process is not None and process.poll() is None:
+            process.kill()
+        fake.stop()
+
+    steps = {}
+    for step in STEPS:
+        values = test.latencies[step]
+        steps[step] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+            "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+            "max_ms": round(max(values, default=0) * 1000, 1),
+        }
+    return {
+        "transport": args.transport,
+        "users": args.users,
+        "concurrency": args.concurrency,
+        "seconds": round(elapsed, 2),
+        "completed_flows": len(test.flows),
+        "updates": test.updates,
+        "updates_per_second": round(test.updates / elapsed, 1),
+        "flows_per_second": round(len(test.flows) / elapsed, 1),
+        "flow_p50_ms": round(percentile(test.flows, 0.50) * 1000, 1),
+        "flow_p99_ms": round(percentile(test.flows, 0.99) * 1000, 1),
+        "steps": steps,
+        "failures": dict(test.failures),
+        "channel_posts": replies.channel_posts,
+        "bot_api": fake.stats(),
+    }
+
+
+def print_report(report: dict):
+    print(
+        f"{report['users']} users, {report['concurrency']} concurrent: {report['completed_flows']} flows "
+        f"in {report['seconds']}s ({report['flows_per_second']} flows/s, {report['updates_per_second']} updates/s)"
+    )
+    print(f"{'step':<14}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step, row in report["steps"].items():
+        print(f"{step:<14}{row['count']:>8}{row['p50_ms']:>10}{row['p99_ms']:>10}{row['max_ms']:>10}")
+    print(f"{'whole flow':<14}{report['completed_flows']:>8}{report['flow_p50_ms']:>10}{report['flow_p99_ms']:>10}")
+    print(f"channel posts: {report['channel_posts']}")
+    print(f"failures: {report['failures'] or 'none'}")
+    print(f"bot api: {json.dumps(report['bot_api'])}")
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Replay simulated users through the bot flow")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="users in flight at once")
+    parser.add_argument("--url", help="webhook of a running bot (default: start one)")
+    parser.add_argument("--app", default="server", choices=("server", "serverless"))
+    parser.add_argument(
+        "--transport", default="webhook", choices=("webhook", "polling"),
+        help="post updates to a webhook, or start polling.py and serve them through getUpdates",
+    )
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="extra env for the bot")
+    parser.add_argument("--telegram-limits", action="store_true", help="keep the outbound rate limits")
+    parser.add_argument("--fake-port", type=int, default=0, help="fake Bot API port (default: any free port)")
+    parser.add_argument("--latency", type=float, default=0.0, help="fake Bot API latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of Bot API calls failing with 500")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of Bot API calls failing with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30.0, help="seconds to wait for each answer")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    args = parse_args(argv)
+    report = asyncio.run(run(args))
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        print_report(report)
+    return 0 if report["completed_flows"] == args.users else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
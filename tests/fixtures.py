@@ -0,0 +1,105 @@
+"""
+Telegram update payloads for the bot flow:
+/start → lang_ → check_join → wait_msg → edit_msg → send_now
+
+and the fakes shared by the component tests.
+"""
+
+import threading
+import time
+
+TEST_USER_ID = 987654321
+TEST_USER_NAME = "TestUser"
+FLOW_DATE = 1640995200
+
+
+def _user(user_id, first_name):
+    return {
+        "id": user_id,
+        "is_bot": False,
+        "first_name": first_name,
+        "username": "testuser"
+    }
+
+
+def _chat(user_id, first_name):
+    return {
+        "id": user_id,
+        "first_name": first_name,
+        "username": "testuser",
+        "type": "private"
+    }
+
+
+def message_update(update_id, text, user_id=TEST_USER_ID, first_name=TEST_USER_NAME, message_id=None):
+    """Private text message from the test user"""
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id if message_id is None else message_id,
+            "from": _user(user_id, first_name),
+            "chat": _chat(user_id, first_name),
+            "date": FLOW_DATE,
+            "text": text
+        }
+    }
+
+
+def callback_update(update_id, data, callback_id, message_text, user_id=TEST_USER_ID,
+                    first_name=TEST_USER_NAME, message_id=None):
+    """Inline button press on one of the bot's messages"""
+    return {
+        "update_id": update_id,
+        "callback_query": {
+            "id": callback_id,
+            "from": _user(user_id, first_name),
+            "chat_instance": f"chat_instance_{user_id}",
+            "message": {
+                "message_id": update_id if message_id is None else message_id,
+                "chat": _chat(user_id, first_name),
+                "date": FLOW_DATE,
+                "text": message_text
+            },
+            "data": data
+        }
+    }
+
+
+def flow_updates(user_id=TEST_USER_ID, first_name=TEST_USER_NAME, first_update_id=1):
+    """The seven updates of a full journey, in order"""
+    n = first_update_id
+    return [
+        message_update(n, "/start", user_id, first_name),
+        callback_update(n + 1, "lang_id", "callback_1", "Language selection message", user_id, first_name),
+        callback_update(n + 2, "check_join", "callback_2", "Join channels message", user_id, first_name),
+        message_update(n + 3, "Ini adalah pesan anonim untuk testing bot menfes!", user_id, first_name),
+        callback_update(n + 4, "edit_msg", "callback_3", "Preview message", user_id, first_name),
+        message_update(n + 5, "Pesan anonim final yang sudah diedit untuk testing!", user_id, first_name),
+        callback_update(n + 6, "send_now", "callback_4", "Final preview message", user_id, first_name),
+    ]
+
+
+class Clock:
+    """Time source for components that take a clock; tests move it by setting now"""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeBot:
+    """Stands in for TeleBot under the OutboundScheduler; raises `failures` in turn before sending"""
+
+    def __init__(self, failures=None):
+        self.sent = []  # (chat_id, text, time.monotonic())
+        self.failures = list(failures or [])
+        self.lock = threading.Lock()
+
+    def send_message(self, chat_id, text, **kwargs):
+        with self.lock:
+            if self.failures:
+                raise self.failures.pop(0)
+            self.sent.append((chat_id, text, time.monotonic()))
+        return {"chat_id": chat_id, "text": text}
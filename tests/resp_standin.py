@@ -0,0 +1,76 @@
+"""Tiny in-process Redis-protocol server for tests (GET/MGET/SET PX/DEL/PING/SELECT)"""
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        count = int(line[1:-2])
+        args = []
+        for _ in range(count):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _bulk(self, value):
+        if value is None:
+            return b"$-1\r\n"
+        return b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def handle(self):
+        server = self.server
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            server.commands.append(args)
+            name = args[0].upper()
+            with server.lock:
+                if name == b"PING":
+                    reply = b"+PONG\r\n"
+                elif name in (b"SELECT", b"AUTH"):
+                    reply = b"+OK\r\n"
+                elif name == b"SET":
+                    expires = None
+                    if len(args) == 5 and args[3].upper() == b"PX":
+                        expires = time.time() + int(args[4]) / 1000
+                    server.data[args[1]] = (args[2], expires)
+                    reply = b"+OK\r\n"
+                elif name == b"DEL":
+                    removed = sum(1 for key in args[1:] if server.data.pop(key, None) is not None)
+                    reply = b":%d\r\n" % removed
+                elif name in (b"GET", b"MGET"):
+                    values = [server.get(key) for key in args[1:]]
+                    if name == b"GET":
+                        reply = self._bulk(values[0])
+                    else:
+                        reply = b"*%d\r\n" % len(values) + b"".join(self._bulk(v) for v in values)
+                else:
+                    reply = b"-ERR unknown command\r\n"
+            self.wfile.write(reply)
+
+
+class RespStandin(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), _Handler)
+        self.data = {}
+        self.commands = []
+        self.lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, kwargs={"poll_interval": 0.05}, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def get(self, key):
+        entry = self.data.get(key)
+        if entry is None or (entry[1] is not None and entry[1] <= time.time()):
+            return None
+        return entry[0]
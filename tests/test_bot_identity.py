@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from bot_identity import BotIdentity
+
+
+class FakeGetMe:
+    def __init__(self, failures=0):
+        self.calls = 0
+        self.failures = failures
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self):
+        self.release.wait(5)
+        self.calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("getMe failed")
+        return {"username": "TextMenfesbot", "call": self.calls}
+
+
+def test_get_never_blocks_and_fetches_once():
+    fetch = FakeGetMe()
+    fetch.release.clear()
+    identity = BotIdentity(fetch)
+    assert identity.get() is None
+    assert identity.get() is None
+    future = identity.refresh()
+    fetch.release.set()
+    assert future.result(5)["call"] == 1
+    assert identity.get()["call"] == 1
+    assert fetch.calls == 1
+
+
+def test_stale_value_is_served_while_revalidating():
+    fetch = FakeGetMe()
+    identity = BotIdentity(fetch, refresh_interval=0.05)
+    identity.refresh().result(5)
+    time.sleep(0.06)
+    fetch.release.clear()
+    # Stale: the old value comes back immediately and a refresh starts
+    assert identity.get()["call"] == 1
+    pending = identity.refresh()
+    fetch.release.set()
+    assert pending.result(5)["call"] == 2
+    assert identity.get()["call"] == 2
+
+
+def test_failed_refresh_keeps_value_and_waits_before_retrying():
+    fetch = FakeGetMe()
+    identity = BotIdentity(fetch, refresh_interval=0, retry_interval=60)
+    identity.refresh().result(5)
+    fetch.failures = 1
+    with pytest.raises(RuntimeError):
+        identity.refresh().result(5)
+    assert identity.get()["call"] == 1
+    assert identity.stats()["failures"] == 1
+    # Within retry_interval get() does not start another fetch
+    identity.get()
+    time.sleep(0.05)
+    assert fetch.calls == 2
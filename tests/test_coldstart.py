@@ -0,0 +1,31 @@
+import json
+import os
+import subprocess
+import sys
+
+from .conftest import BACKEND_DIR
+
+CHILD = """
+import json, socket, sys
+
+def no_network(*args, **kwargs):
+    raise AssertionError("network I/O at import time")
+
+socket.socket.connect = socket.create_connection = socket.getaddrinfo = no_network
+import serverless
+
+print(json.dumps({
+    "heavy": [name for name in ("fastapi", "starlette", "telebot", "requests") if name in sys.modules],
+    "handlers": "handlers" in sys.modules,
+}))
+"""
+
+
+def test_serverless_import_is_light_and_offline():
+    env = dict(os.environ, BOT_TOKEN="123:test", OUTBOUND_QUEUE_PATH="", LOG_LEVEL="WARNING")
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, timeout=60,
+    )
+    assert proc.returncode == 0, proc.stderr
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    assert result == {"heavy": [], "handlers": False}
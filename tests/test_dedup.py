@@ -0,0 +1,28 @@
+from dedup import UpdateDeduplicator
+
+
+def test_redelivery_is_detected():
+    dedup = UpdateDeduplicator(window=8)
+    assert dedup.seen(100) is False
+    assert dedup.seen(101) is False
+    assert dedup.seen(100) is True
+    assert dedup.stats()["duplicates"] == 1
+
+
+def test_window_covers_recent_ids_only():
+    dedup = UpdateDeduplicator(window=8)
+    for update_id in range(100, 108):
+        assert not dedup.seen(update_id)
+    assert all(dedup.seen(update_id) for update_id in range(100, 108))
+    assert not dedup.seen(108)
+    # 100 shared a slot with 108 and has been pushed out of the window
+    assert not dedup.seen(100)
+
+
+def test_forget_allows_retry_of_failed_update():
+    dedup = UpdateDeduplicator(window=8)
+    dedup.seen(5)
+    dedup.forget(5)
+    assert dedup.seen(5) is False
+    dedup.forget(6)
+    assert dedup.seen(5) is True
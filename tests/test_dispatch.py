@@ -0,0 +1,223 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from dispatch import (
+    BatchDispatcher,
+    DispatchRejected,
+    InlineDispatcher,
+    PoolDispatcher,
+    create_dispatcher,
+)
+from keyed_executor import KeyQueueFull
+
+
+def test_inline_dispatcher_processes_before_returning():
+    seen = []
+    dispatcher = InlineDispatcher(seen.extend)
+    assert dispatcher.submit("u1") is True
+    assert seen == ["u1"]
+    assert dispatcher.may_block
+
+
+def test_inline_dispatcher_serializes_each_chat():
+    active, overlaps, lock = {}, [], threading.Lock()
+
+    def process(updates):
+        chat_id = updates[0].chat_id
+        with lock:
+            active[chat_id] = active.get(chat_id, 0) + 1
+            if active[chat_id] > 1:
+                overlaps.append(chat_id)
+        time.sleep(0.01)
+        with lock:
+            active[chat_id] -= 1
+
+    dispatcher = InlineDispatcher(process)
+    updates = [SimpleNamespace(chat_id=i % 2) for i in range(16)]
+    threads = [threading.Thread(target=dispatcher.submit, args=(update,)) for update in updates]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert overlaps == []
+    # The two chats still ran side by side
+    assert time.monotonic() - started < 0.15
+    assert dispatcher.stats() == {"mode": "inline", "processed": 16, "chats_in_flight": 0}
+
+
+def test_pool_dispatcher_processes_all_updates():
+    seen = []
+    lock = threading.Lock()
+
+    def process(updates):
+        with lock:
+            seen.extend(updates)
+
+    dispatcher = PoolDispatcher(process, workers=4, queue_size=100)
+    for i in range(50):
+        assert dispatcher.submit(i)
+    dispatcher.shutdown()
+    assert sorted(seen) == list(range(50))
+    assert dispatcher.stats()["processed"] == 50
+
+
+def test_pool_dispatcher_serializes_a_chats_updates():
+    in_flight = set()
+    overlaps = []
+    posted = []
+    lock = threading.Lock()
+
+    def process(updates):
+        (update,) = updates
+        with lock:
+            if update.chat_id in in_flight:
+                overlaps.append(update)
+            in_flight.add(update.chat_id)
+        time.sleep(0.002)
+        with lock:
+            in_flight.discard(update.chat_id)
+            posted.append((update.chat_id, update.n))
+
+    dispatcher = PoolDispatcher(process, workers=8)
+    # A double-tapped send_now from each of three users
+    for n in range(2):
+        for chat_id in range(3):
+            dispatcher.submit(SimpleNamespace(chat_id=chat_id, n=n))
+    dispatcher.shutdown()
+    assert overlaps == []
+    assert [n for chat_id, n in posted if chat_id == 0] == [0, 1]
+    stats = dispatcher.stats()
+    assert stats["fast_path"] + stats["queued_behind_chat"] == 6
+
+
+def _blocked_pool(overflow):
+    release = threading.Event()
+    started = threading.Event()
+
+    def process(updates):
+        started.set()
+        release.wait(5)
+
+    dispatcher = PoolDispatcher(process, workers=1, queue_size=1, overflow=overflow, block_timeout=0.05)
+    dispatcher.submit("busy")
+    started.wait(5)
+    dispatcher.submit("queued")
+    return dispatcher, release
+
+
+def test_pool_dispatcher_rejects_when_full():
+    dispatcher, release = _blocked_pool("reject")
+    with pytest.raises(DispatchRejected):
+        dispatcher.submit("overflow")
+    assert dispatcher.rejected == 1
+    release.set()
+    dispatcher.shutdown()
+
+
+def test_pool_dispatcher_drops_when_full():
+    dispatcher, release = _blocked_pool("drop")
+    assert dispatcher.submit("overflow") is False
+    assert dispatcher.dropped == 1
+    release.set()
+    dispatcher.shutdown()
+
+
+def test_pool_dispatcher_block_times_out_into_reject():
+    dispatcher, release = _blocked_pool("block")
+    assert dispatcher.may_block
+    with pytest.raises(DispatchRejected):
+        dispatcher.submit("overflow")
+    release.set()
+    dispatcher.shutdown()
+
+
+def test_pool_dispatcher_block_retries_after_a_missed_wakeup():
+    dispatcher = PoolDispatcher(lambda updates: None, workers=1, overflow="block", block_timeout=0.05)
+    attempts = []
+
+    def submit(key, item):
+        attempts.append(item)
+        if len(attempts) == 1:
+            raise KeyQueueFull("full")
+
+    # The key finished before wait_for_space started, so no notify arrives
+    dispatcher.executor = SimpleNamespace(submit=submit, wait_for_space=lambda timeout: time.sleep(timeout) or False)
+    assert dispatcher.submit("update") is True
+    assert len(attempts) == 2 and dispatcher.rejected == 0
+
+
+def test_create_dispatcher_validates_mode():
+    with pytest.raises(ValueError):
+        create_dispatcher(lambda updates: None, mode="turbo")
+    with pytest.raises(ValueError):
+        create_dispatcher(lambda updates: None, mode="pool", overflow="explode")
+
+
+class Sizes:
+    def __init__(self):
+        self.values = []
+
+    def observe(self, value):
+        self.values.append(value)
+
+
+def test_batch_dispatcher_groups_per_chat_in_order():
+    calls = []
+    lock = threading.Lock()
+
+    def process(updates):
+        with lock:
+            calls.append([(u.chat_id, u.n) for u in updates])
+
+    sizes, chats = Sizes(), Sizes()
+    dispatcher = BatchDispatcher(process, workers=4, window=0.05, max_batch=100, batch_sizes=sizes, batch_chats=chats)
+    for n in range(12):
+        dispatcher.submit(SimpleNamespace(chat_id=n % 3, n=n))
+    dispatcher.shutdown()
+    # One call per chat, each with that chat's updates in arrival order
+    assert sorted(calls) == [[(c, n) for n in range(c, 12, 3)] for c in range(3)]
+    assert sizes.values == [12] and chats.values == [3]
+    stats = dispatcher.stats()
+    assert stats["mode"] == "batch" and stats["batches"] == 1 and stats["processed"] == 12
+    assert stats["batch_fill"] == 0.12
+
+
+def test_batch_dispatcher_runs_chats_concurrently():
+    running = []
+    both = threading.Barrier(2, timeout=2)
+
+    def process(updates):
+        running.append(updates[0].chat_id)
+        both.wait()  # only passes if the two chats are in flight together
+
+    dispatcher = BatchDispatcher(process, workers=2, window=0.05)
+    dispatcher.submit(SimpleNamespace(chat_id=1))
+    dispatcher.submit(SimpleNamespace(chat_id=2))
+    dispatcher.shutdown()
+    assert sorted(running) == [1, 2] and dispatcher.failed == 0
+
+
+def test_batch_dispatcher_closes_batch_at_max_size():
+    sizes = Sizes()
+    dispatcher = BatchDispatcher(lambda updates: None, window=10, max_batch=4, batch_sizes=sizes)
+    started = time.monotonic()
+    for n in range(8):
+        dispatcher.submit(SimpleNamespace(chat_id=n))
+    dispatcher.shutdown()
+    assert sizes.values == [4, 4]
+    assert dispatcher.stats()["full_batches"] == 2
+    assert time.monotonic() - started < 5
+
+
+def test_batch_dispatcher_window_bounds_latency():
+    done = threading.Event()
+    dispatcher = create_dispatcher(lambda updates: done.set(), mode="batch", batch_window=0.01, batch_max=64)
+    started = time.monotonic()
+    dispatcher.submit(SimpleNamespace(chat_id=1))
+    assert done.wait(2)
+    assert time.monotonic() - started < 1
+    dispatcher.shutdown()
@@ -0,0 +1,42 @@
+import json
+
+import pytest
+
+from fastpath import KIND_CALLBACK, KIND_MESSAGE, KIND_OTHER, UpdateView, parse_update
+
+from .fixtures import TEST_USER_ID, callback_update, flow_updates, message_update
+
+
+def body(update):
+    return json.dumps(update).encode()
+
+
+def test_message_view_fields():
+    view = parse_update(body(message_update(4, "halo")))
+    assert (view.update_id, view.kind, view.chat_id, view.user_id, view.text) == (4, KIND_MESSAGE, TEST_USER_ID, TEST_USER_ID, "halo")
+    assert view.command is None
+
+
+def test_callback_view_fields():
+    view = parse_update(body(callback_update(2, "lang_en", "cb", "pilih")))
+    assert (view.kind, view.chat_id, view.data) == (KIND_CALLBACK, TEST_USER_ID, "lang_en")
+
+
+@pytest.mark.parametrize("text, command", [("/start", "start"), ("/start@TextMenfesbot", "start"), ("/start ref", "start"), ("start", None)])
+def test_command_matches_telebot_extraction(text, command):
+    assert UpdateView(message_update(1, text)).command == command
+
+
+def test_other_updates_and_bad_bodies():
+    assert parse_update(b'{"update_id": 9, "edited_message": {}}').kind == KIND_OTHER
+    with pytest.raises(ValueError):
+        parse_update(b"[1, 2]")
+
+
+def test_full_update_is_built_lazily_and_once():
+    pytest.importorskip("telebot")
+    view = UpdateView(flow_updates()[1])
+    assert view._update is None
+    assert view.callback_query.data == "lang_id"
+    assert view.update is view.update
+
@@ -0,0 +1,399 @@
+import itertools
+import json
+import sys
+import threading
+import time
+import uuid
+
+import pytest
+
+from loadtest.fake_bot_api import FakeBotApi
+
+from .fixtures import callback_update, message_update
+
+REVIEW_CHAT_ID = 555
+MODULES = ("core", "handlers")
+
+_update_ids = itertools.count(1)
+_user_ids = itertools.count(100000)
+
+
+@pytest.fixture(scope="module")
+def api():
+    server = FakeBotApi()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(scope="module")
+def core(api, tmp_path_factory):
+    """The real core and handlers, in this process, talking to the fake Bot API"""
+    # core reads its configuration when first imported; the scripts at the repo root may have imported it already
+    saved = {name: sys.modules.pop(name) for name in MODULES if name in sys.modules}
+    env = {
+        "BOT_TOKEN": "123:test",
+        "BOT_API_URL": api.api_url,
+        "OUTBOUND_QUEUE_PATH": "",
+        "OUTBOUND_GLOBAL_RATE": "100000",
+        "OUTBOUND_PRIVATE_RATE": "100000",
+        "OUTBOUND_CHANNEL_RATE_PER_MIN": "6000000",
+        "REVIEW_CHAT_ID": str(REVIEW_CHAT_ID),
+        "REVIEW_QUEUE_PATH": str(tmp_path_factory.mktemp("review") / "review.db"),
+        "LOG_LEVEL": "WARNING",
+    }
+    with pytest.MonkeyPatch.context() as mp:
+        for name, value in env.items():
+            mp.setenv(name, value)
+        import core
+        core.load_handlers()
+        yield core
+        core.shutdown_dispatcher()
+    for name in MODULES:
+        sys.modules.pop(name, None)
+    sys.modules.update(saved)
+
+
+@pytest.fixture(scope="module")
+def handlers(core):
+    return sys.modules["handlers"]
+
+
+def run(core, *updates):
+    from fastpath import parse_update
+    core.process_updates([parse_update(json.dumps(update).encode()) for update in updates])
+
+
+def new_user():
+    return next(_user_ids)
+
+
+def new_text():
+    """Unrelated to every other test's text, so the duplicate index never links them"""
+    return " ".join(uuid.uuid4().hex for _ in range(4))
+
+
+def message(user_id, text):
+    return message_update(next(_update_ids), text, user_id=user_id)
+
+
+def callback(user_id, data, chat_id=None, first_name="TestUser"):
+    update = callback_update(
+        next(_update_ids), data, f"cb{next(_update_ids)}", "Bot message", user_id=user_id, first_name=first_name
+    )
+    if chat_id is not None:
+        update["callback_query"]["message"]["chat"] = {"id": chat_id, "type": "supergroup", "title": "Review"}
+    return update
+
+
+def compose(core, user_id, text):
+    """/start, pick English, pass the join check and type text; leaves the user at the preview"""
+    run(core, message(user_id, "/start"), callback(user_id, "lang_en"), callback(user_id, "check_join"))
+    run(core, message(user_id, text))
+
+
+def sent_to(api, chat_id):
+    with api.lock:
+        calls = list(api.calls)
+    return [
+        params["text"] for method, params in calls
+        if method == "sendMessage" and str(params.get("chat_id")) == str(chat_id)
+    ]
+
+
+def posted(api, core, text, count=1, timeout=5.0):
+    """Wait until text has been posted to the channel count times"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        found = [post for post in sent_to(api, core.CHANNEL_ID) if text in post]
+        if len(found) >= count:
+            return found
+        time.sleep(0.01)
+    return [post for post in sent_to(api, core.CHANNEL_ID) if text in post]
+
+
+def test_full_flow_posts_to_the_channel(api, core, handlers):
+    user_id, text = new_user(), new_text()
+    compose(core, user_id, text)
+    run(core, callback(user_id, "send_now"))
+    assert len(posted(api, core, text)) == 1
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("posted", "en")
+
+
+def test_duplicate_is_rejected(api, core, handlers):
+    first, second, text = new_user(), new_user(), new_text()
+    compose(core, first, text)
+    run(core, callback(first, "send_now"))
+    compose(core, second, text)
+
+    assert sent_to(api, second)[-1] == handlers.texts.get("duplicate", "en")
+    # The user can try again with a different message
+    assert core.sessions.step(second) == "wait_msg"
+    run(core, message(second, new_text()))
+    assert core.sessions.step(second) == "preview"
+    assert len(posted(api, core, text, count=2, timeout=0.3)) == 1
+
+
+def test_duplicate_is_delayed_without_holding_the_update(api, core, handlers, monkeypatch):
+    monkeypatch.setattr(handlers, "SPAM_ACTION", "delay")
+    monkeypatch.setattr(handlers, "SPAM_DELAY", 1.0)
+    first, second, text = new_user(), new_user(), new_text()
+    compose(core, first, text)
+    run(core, callback(first, "send_now"))
+    assert len(posted(api, core, text)) == 1
+
+    compose(core, second, text)
+    started = time.monotonic()
+    run(core, callback(second, "send_now"))
+    assert time.monotonic() - started < 0.8
+    assert sent_to(api, second)[-1] == handlers.texts.get("scheduled", "en", minutes=1)
+    assert len(posted(api, core, text, count=2, timeout=0.1)) == 1
+
+    assert len(posted(api, core, text, count=2)) == 2
+    deadline = time.monotonic() + 5
+    while sent_to(api, second)[-1] != handlers.texts.get("posted", "en") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert sent_to(api, second)[-1] == handlers.texts.get("posted", "en")
+
+
+def test_rejected_texts_use_no_submission_quota(api, core, handlers, monkeypatch):
+    from ratelimit import SubmissionLimiter
+
+    monkeypatch.setattr(handlers, "submission_limiter", SubmissionLimiter(1, 3600))
+    first, user_id, text = new_user(), new_user(), new_text()
+    compose(core, first, text)
+    run(core, callback(first, "send_now"))
+    compose(core, user_id, "dasar bangsat")
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("blocked", "en")
+    run(core, message(user_id, text))
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("duplicate", "en")
+
+    text = new_text()
+    run(core, message(user_id, text))
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("preview", "en", text=text)
+    # The one allowed submission is now used up
+    run(core, callback(user_id, "edit_msg"), message(user_id, new_text()))
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("limited_user", "en", minutes=60)
+
+
+def test_blocklisted_text_is_rejected_when_typed(api, core, handlers):
+    user_id = new_user()
+    compose(core, user_id, f"{new_text()} dasar B4NGSAT")
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("blocked", "en")
+    assert core.sessions.step(user_id) == "wait_msg"
+
+
+def test_blocklisted_text_is_rejected_when_sent(api, core, handlers, monkeypatch, tmp_path):
+    from moderation import Moderator
+
+    user_id, text = new_user(), new_text()
+    compose(core, user_id, text)
+    # The blocklist gained one of its words after the preview was shown
+    blocklist = tmp_path / "blocklist.txt"
+    blocklist.write_text(text.split()[1] + "\n")
+    monkeypatch.setattr(handlers, "moderator", Moderator(str(blocklist)))
+    run(core, callback(user_id, "send_now"))
+
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("blocked", "en")
+    assert core.sessions.step(user_id) == "wait_msg"
+    assert posted(api, core, text, timeout=0.3) == []
+
+
+@pytest.fixture
+def review_all(core, handlers, monkeypatch):
+    """REVIEW_MODE=all, starting from an empty review queue"""
+    monkeypatch.setattr(handlers, "REVIEW_MODE", "all")
+    core.review_queue.take_next(1 << 30)
+
+
+def admin_command(text):
+    return message_update(next(_update_ids), text, user_id=REVIEW_CHAT_ID, first_name="Admin")
+
+
+def admin_press(data):
+    return callback(REVIEW_CHAT_ID, data, chat_id=REVIEW_CHAT_ID, first_name="Admin")
+
+
+def edited_in(api, chat_id):
+    with api.lock:
+        calls = list(api.calls)
+    return [
+        params["text"] for method, params in calls
+        if method == "editMessageText" and str(params.get("chat_id")) == str(chat_id)
+    ]
+
+
+def hold(core, api, user_id, text):
+    """Send text through the flow and return the id of the post held for review"""
+    compose(core, user_id, text)
+    run(core, callback(user_id, "send_now"))
+    held = [post for post in sent_to(api, REVIEW_CHAT_ID) if text in post]
+    assert len(held) == 1
+    return int(held[0].split()[0].lstrip("#"))
+
+
+def test_held_post_is_published_when_approved(api, core, handlers, review_all):
+    user_id, text = new_user(), new_text()
+    post_id = hold(core, api, user_id, text)
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("in_review", "en")
+    assert posted(api, core, text, timeout=0.2) == []
+
+    run(core, admin_press(f"review_ok:{post_id}"))
+    assert len(posted(api, core, text)) == 1
+    assert edited_in(api, REVIEW_CHAT_ID)[-1].endswith("✅ Disetujui oleh Admin")
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("posted", "en")
+    # A second press finds it already decided
+    run(core, admin_press(f"review_ok:{post_id}"))
+    assert edited_in(api, REVIEW_CHAT_ID)[-1].endswith("ℹ️ Sudah ditinjau sebelumnya.")
+    assert len(posted(api, core, text, count=2, timeout=0.2)) == 1
+
+
+def test_held_post_is_dropped_when_rejected(api, core, handlers, review_all):
+    user_id, text = new_user(), new_text()
+    post_id = hold(core, api, user_id, text)
+    run(core, admin_press(f"review_no:{post_id}"))
+    assert edited_in(api, REVIEW_CHAT_ID)[-1].endswith("❌ Ditolak oleh Admin")
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("review_rejected", "en")
+    assert len(core.review_queue) == 0
+    assert posted(api, core, text, timeout=0.2) == []
+
+
+def test_rejecting_a_user_drops_all_their_posts(api, core, handlers, review_all):
+    spammer, other = new_user(), new_user()
+    texts = [new_text(), new_text()]
+    for text in texts:
+        hold(core, api, spammer, text)
+    hold(core, api, other, new_text())
+    run(core, admin_press(f"review_user:{spammer}"))
+    assert sent_to(api, spammer)[-1] == handlers.texts.get("review_rejected_many", "en", count=2)
+    assert sent_to(api, REVIEW_CHAT_ID)[-1] == "❌ 2 pesan ditolak oleh Admin. 1 pesan masih menunggu."
+    assert [post.user_id for post in core.review_queue.take_next(10)] == [other]
+
+
+def test_approve_next_and_approve_command_publish_the_oldest(api, core, handlers, review_all):
+    texts = [new_text() for _ in range(4)]
+    for text in texts:
+        hold(core, api, new_user(), text)
+    run(core, admin_press("review_next:2"))
+    assert sent_to(api, REVIEW_CHAT_ID)[-1] == "✅ 2 pesan disetujui oleh Admin. 2 pesan masih menunggu."
+    run(core, admin_command("/approve 1"))
+    assert sent_to(api, REVIEW_CHAT_ID)[-1] == "✅ 1 pesan disetujui oleh Admin. 1 pesan masih menunggu."
+    for text in texts[:3]:
+        assert len(posted(api, core, text)) == 1
+    assert posted(api, core, texts[3], timeout=0.2) == []
+
+
+def test_queue_command_reports_waiting_posts(api, core, handlers, review_all):
+    run(core, admin_command("/queue"))
+    assert sent_to(api, REVIEW_CHAT_ID)[-1] == "📭 Tidak ada pesan yang menunggu."
+    for _ in range(2):
+        hold(core, api, new_user(), new_text())
+    run(core, admin_command("/queue"))
+    assert sent_to(api, REVIEW_CHAT_ID)[-1] == "📋 2 pesan menunggu, yang terlama sejak 1 menit lalu."
+
+
+def test_approved_posts_stay_queued_if_they_cannot_be_stored(api, core, handlers, review_all, monkeypatch):
+    text = new_text()
+    hold(core, api, new_user(), text)
+
+    def store_failed(*args, **kwargs):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(core.outbound, "submit_many", store_failed)
+    run(core, admin_command("/approve"))
+    assert sent_to(api, REVIEW_CHAT_ID)[-1] == "❌ Terjadi kesalahan."
+    assert len(core.review_queue) == 1
+    monkeypatch.undo()
+    run(core, admin_command("/approve"))
+    assert len(posted(api, core, text)) == 1
+
+
+def test_duplicate_is_held_for_review(api, core, handlers, monkeypatch):
+    monkeypatch.setattr(handlers, "SPAM_ACTION", "review")
+    core.review_queue.take_next(1 << 30)
+    first, second, text = new_user(), new_user(), new_text()
+    compose(core, first, text)
+    run(core, callback(first, "send_now"))
+    compose(core, second, text)
+    run(core, callback(second, "send_now"))
+
+    assert sent_to(api, second)[-1] == handlers.texts.get("in_review", "en")
+    held = core.review_queue.take_next(10)
+    assert [(post.user_id, post.text) for post in held] == [(second, text)]
+    assert held[0].reason.startswith(f"⚠️ Pesan dari user {second} sama persis")
+    assert len(posted(api, core, text, count=2, timeout=0.2)) == 1
+
+
+def test_review_commands_are_plain_text_outside_the_review_chat(api, core, handlers, review_all):
+    hold(core, api, new_user(), new_text())
+    user_id = new_user()
+    run(core, message(user_id, "/queue"))
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("hello")
+    # A confession that happens to start with /approve is just a confession
+    compose(core, user_id, "/approve 100 tolong")
+    assert sent_to(api, user_id)[-1] == handlers.texts.get("preview", "en", text="/approve 100 tolong")
+    assert len(core.review_queue) == 1
+
+
+def test_double_tapped_send_posts_once(api, core, handlers, monkeypatch):
+    from fastpath import parse_update
+
+    monkeypatch.setattr(handlers, "SPAM_ACTION", "off")
+    for _ in range(5):
+        user_id, text = new_user(), new_text()
+        compose(core, user_id, text)
+        # Two webhook deliveries of the same button, on two threads, as a double tap produces
+        taps = [parse_update(json.dumps(callback(user_id, "send_now")).encode()) for _ in range(2)]
+        start = threading.Barrier(2)
+
+        def deliver(view):
+            start.wait()
+            core.dispatcher.submit(view)
+
+        threads = [threading.Thread(target=deliver, args=(view,)) for view in taps]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(posted(api, core, text, count=2, timeout=0.3)) == 1
+        # The second tap finds the preview already sent, and its session gone
+        assert handlers.texts.get("nothing_to_send") in sent_to(api, user_id)
+
+
+def test_webhook_reports_a_bot_that_failed_to_build(core, monkeypatch):
+    import asyncio
+
+    def broken_setup():
+        raise RuntimeError("telebot is not installed")
+
+    bot = core.LazyTeleBot("123:test", setup=broken_setup)
+    assert bot.build_error is None
+    with pytest.raises(RuntimeError):
+        bot.build()
+    assert isinstance(bot.build_error, RuntimeError)
+
+    async def run_blocking(func, *args):
+        return func(*args)
+
+    monkeypatch.setattr(core, "bot", bot)
+    body = json.dumps(message(new_user(), "/start")).encode()
+    assert asyncio.run(core.receive_webhook(body, run_blocking)) == (500, {"detail": "Bot not initialized"})
+
+
+def test_review_chat_gets_no_confession_flow(api, core, handlers, review_all):
+    hold(core, api, new_user(), new_text())
+    before = len(sent_to(api, REVIEW_CHAT_ID))
+    # An admin chatting, or typing /start, in the review chat
+    run(core, admin_command("oke, saya cek dulu"), admin_command("/start"), admin_press("check_join"))
+    assert len(sent_to(api, REVIEW_CHAT_ID)) == before
+    assert core.sessions.get(REVIEW_CHAT_ID) is None
+    # The admin commands still work there
+    run(core, admin_command("/queue"))
+    assert sent_to(api, REVIEW_CHAT_ID)[-1].startswith("📋 1 pesan menunggu")
+
+
+def test_review_buttons_are_ignored_outside_the_review_chat(api, core, handlers, review_all):
+    user_id, text = new_user(), new_text()
+    post_id = hold(core, api, user_id, text)
+    run(core, callback(user_id, f"review_ok:{post_id}"))
+    assert len(core.review_queue) == 1
+    assert posted(api, core, text, timeout=0.2) == []
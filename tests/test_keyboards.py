@@ -0,0 +1,83 @@
+import json
+
+import pytest
+from telebot.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from keyboards import KeyboardRegistry, TemplateRegistry
+from outbound import OutboundScheduler
+
+
+def make_registry():
+    registry = KeyboardRegistry(languages=("id", "en"))
+    builds = []
+
+    @registry.register("confirm")
+    def confirm(language):
+        builds.append(language)
+        kb = InlineKeyboardMarkup()
+        kb.add(InlineKeyboardButton("Yes" if language == "en" else "Ya", callback_data="send_now"))
+        return kb
+
+    @registry.register("language", per_language=False)
+    def choose(language):
+        builds.append("shared")
+        kb = InlineKeyboardMarkup()
+        kb.add(InlineKeyboardButton("🇮🇩 Indonesia", callback_data="lang_id"))
+        return kb
+
+    return registry, builds
+
+
+def buttons(payload):
+    return [button["text"] for row in json.loads(payload)["inline_keyboard"] for button in row]
+
+
+def test_markups_are_built_once_per_language():
+    registry, builds = make_registry()
+    assert builds == ["id", "en", "shared"]
+    assert buttons(registry.get("confirm", "en")) == ["Yes"]
+    assert buttons(registry.get("confirm", "id")) == ["Ya"]
+    # Served from the cache: the very same string every time
+    assert registry.get("confirm", "en") is registry.get("confirm", "en")
+    assert registry.get("language", "en") is registry.get("language", "id")
+    assert builds == ["id", "en", "shared"]
+    assert "confirm" in registry and "missing" not in registry
+
+
+def test_unknown_language_falls_back_to_default():
+    registry, _ = make_registry()
+    assert registry.get("confirm") is registry.get("confirm", "id")
+    assert registry.get("confirm", "fr") is registry.get("confirm", "id")
+    with pytest.raises(KeyError):
+        registry.get("missing")
+
+
+class RecordingBot:
+    def __init__(self):
+        self.markups = []
+
+    def send_message(self, chat_id, text, reply_markup=None):
+        self.markups.append(reply_markup)
+
+
+def test_cached_payload_is_sent_as_is():
+    registry, _ = make_registry()
+    bot = RecordingBot()
+    scheduler = OutboundScheduler(bot, private_rate=1000, private_burst=1000)
+    payload = registry.get("confirm", "en")
+    assert scheduler.wait([scheduler.send_message(5, "preview", reply_markup=payload)], 5)
+    scheduler.shutdown()
+    assert bot.markups == [payload] and bot.markups[0] is payload
+
+
+def test_templates_have_per_language_variants():
+    texts = TemplateRegistry(languages=("id", "en"))
+    texts.add("preview", id='Kirim "{text}"?', en='Send "{text}"?')
+    texts.add("hello", id="👋 Halo {name}!")
+    assert texts.get("preview", "en", text="{hai}") == 'Send "{hai}"?'
+    assert texts.get("preview", "id", text="x") == 'Kirim "x"?'
+    assert texts.get("preview", "fr", text="x") == texts.get("preview", None, text="x") == 'Kirim "x"?'
+    assert texts.get("hello", "en", name="Budi") == "👋 Halo Budi!"
+    assert "hello" in texts and "missing" not in texts
+    with pytest.raises(ValueError):
+        texts.add("broken", en="English only")
@@ -0,0 +1,120 @@
+import threading
+import time
+
+import pytest
+
+from keyed_executor import KeyedExecutor, KeyQueueFull
+
+
+def test_items_of_one_key_run_in_order_never_overlapping():
+    running = set()
+    overlaps = []
+    order = {key: [] for key in range(5)}
+    lock = threading.Lock()
+
+    def run(item):
+        key, n = item
+        with lock:
+            if key in running:
+                overlaps.append(item)
+            running.add(key)
+        time.sleep(0.0005)
+        with lock:
+            running.discard(key)
+            order[key].append(n)
+
+    executor = KeyedExecutor(run, workers=4, max_pending_per_key=100)
+    for n in range(40):
+        for key in range(5):
+            executor.submit(key, (key, n))
+    executor.shutdown()
+    assert overlaps == []
+    assert all(order[key] == list(range(40)) for key in range(5))
+    assert executor.processed == 200
+
+
+def test_different_keys_run_in_parallel():
+    both = threading.Barrier(2, timeout=2)
+    executor = KeyedExecutor(lambda item: both.wait(), workers=2)
+    executor.submit("a", 1)
+    executor.submit("b", 2)
+    executor.shutdown()
+    assert executor.processed == 2 and executor.failed == 0
+
+
+def _blocked(max_keys=10, max_pending_per_key=2):
+    release = threading.Event()
+    started = threading.Event()
+
+    def run(item):
+        started.set()
+        release.wait(5)
+
+    executor = KeyedExecutor(run, workers=1, max_keys=max_keys, max_pending_per_key=max_pending_per_key)
+    executor.submit("user", 0)
+    started.wait(5)
+    return executor, release
+
+
+def test_per_key_queue_is_bounded():
+    executor, release = _blocked(max_pending_per_key=2)
+    executor.submit("user", 1)
+    executor.submit("user", 2)
+    with pytest.raises(KeyQueueFull):
+        executor.submit("user", 3)
+    # Other keys are not affected by one busy user
+    executor.submit("other", 1)
+    assert executor.qsize() == 3
+    release.set()
+    executor.shutdown()
+    assert executor.processed == 4 and executor.rejected == 1
+
+
+def test_keys_in_flight_are_bounded():
+    executor, release = _blocked(max_keys=2)
+    executor.submit("b", 1)
+    with pytest.raises(KeyQueueFull):
+        executor.submit("c", 1)
+    release.set()
+    assert executor.wait_for_space(2)
+    executor.shutdown()
+
+
+def test_idle_keys_take_the_fast_path():
+    executor, release = _blocked()
+    executor.submit("user", 1)
+    release.set()
+    executor.shutdown()
+    stats = executor.stats()
+    assert stats["fast_path"] == 1 and stats["queued_behind_key"] == 1
+    assert stats["keys_in_flight"] == 0
+
+
+def test_busy_key_yields_after_a_burst():
+    seen = []
+    gate = threading.Event()
+
+    def run(item):
+        gate.wait(5)
+        seen.append(item)
+
+    executor = KeyedExecutor(run, workers=1, max_pending_per_key=100, burst=2)
+    for n in range(6):
+        executor.submit("busy", ("busy", n))
+    executor.submit("quiet", ("quiet", 0))
+    gate.set()
+    executor.shutdown()
+    assert seen.index(("quiet", 0)) == 2
+    assert [n for key, n in seen if key == "busy"] == list(range(6))
+
+
+def test_failures_do_not_stop_the_key():
+    def run(item):
+        if item == 1:
+            raise RuntimeError("boom")
+
+    executor = KeyedExecutor(run, workers=1)
+    for n in range(3):
+        executor.submit("user", n)
+    executor.shutdown()
+    assert executor.processed == 2 and executor.failed == 1
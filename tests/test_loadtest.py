@@ -0,0 +1,86 @@
+import asyncio
+import json
+import urllib.error
+import urllib.request
+
+import pytest
+
+from loadtest.fake_bot_api import FakeBotApi
+
+
+@pytest.fixture
+def api():
+    server = FakeBotApi(seed=1)
+    yield server
+    server.stop()
+
+
+def call(api, method, **params):
+    data = json.dumps(params).encode()
+    request = urllib.request.Request(
+        api.api_url.format("123:test", method), data=data, headers={"Content-Type": "application/json"}
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=2) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_answers_the_bot_methods(api):
+    assert call(api, "getMe")[1]["result"]["username"] == "TextMenfesbot"
+    assert call(api, "getChatMember", chat_id="@Anofes", user_id=5)[1]["result"]["status"] == "member"
+    sent = call(api, "sendMessage", chat_id=5, text="hi")[1]["result"]
+    assert sent["chat"]["id"] == 5 and sent["text"] == "hi"
+    assert call(api, "answerCallbackQuery", callback_query_id="c")[1]["result"] is True
+    assert api.stats()["calls"]["sendMessage"] == 1
+
+
+def test_get_updates_hands_out_pushed_updates(api):
+    assert [api.push_update({"message": {"text": t}}) for t in "abc"] == [1, 2, 3]
+    updates = call(api, "getUpdates", limit=2)[1]["result"]
+    assert [u["update_id"] for u in updates] == [1, 2]
+    # Asking for offset 3 confirms 1 and 2
+    assert [u["update_id"] for u in call(api, "getUpdates", offset=3)[1]["result"]] == [3]
+    assert call(api, "getUpdates", offset=4, timeout=0.05)[1]["result"] == []
+
+
+def test_injects_rate_limits_and_errors(api):
+    api.rate_limit_rate = 0.2
+    api.error_rate = 0.2
+    api.retry_after = 3
+    results = [call(api, "sendMessage", chat_id=1, text="x") for _ in range(200)]
+    statuses = [status for status, _ in results]
+    stats = api.stats()
+    assert statuses.count(429) == stats["rate_limits_injected"] > 0
+    assert statuses.count(500) == stats["errors_injected"] > 0
+    limited = next(body for status, body in results if status == 429)
+    assert limited["parameters"]["retry_after"] == 3 and limited["ok"] is False
+
+
+def test_injection_can_target_methods(api):
+    api.error_rate = 1.0
+    api.inject_methods = {"getChatMember"}
+    assert call(api, "sendMessage", chat_id=1, text="x")[0] == 200
+    assert call(api, "getChatMember", chat_id="@Anofes", user_id=1)[0] == 500
+
+
+def test_on_call_sees_successful_answers_only(api):
+    seen = []
+    api.on_call = lambda method, params: seen.append((method, params.get("chat_id")))
+    call(api, "sendMessage", chat_id=7, text="x")
+    api.error_rate = 1.0
+    call(api, "sendMessage", chat_id=8, text="x")
+    assert seen == [("sendMessage", 7)]
+
+
+def test_loadgen_runs_the_whole_flow():
+    pytest.importorskip("httpx")
+    pytest.importorskip("uvicorn")
+    from loadtest import loadgen
+
+    report = asyncio.run(loadgen.run(loadgen.parse_args(["--users", "4", "--concurrency", "2"])))
+    assert report["completed_flows"] == 4 and report["failures"] == {}
+    assert report["channel_posts"] == 4
+    assert all(row["count"] == 4 for row in report["steps"].values())
+    assert report["bot_api"]["calls"]["getChatMember"] == 4 * 3
@@ -0,0 +1,76 @@
+import io
+import json
+import logging
+import threading
+
+import pytest
+
+import logsetup
+from logsetup import JsonFormatter, SamplingFilter, parse_sample_rates
+
+
+def make_record(msg="hello %s", args=("world",), level=logging.INFO, **extra):
+    record = logging.LogRecord("menfes", level, __file__, 1, msg, args, None)
+    for key, value in extra.items():
+        setattr(record, key, value)
+    return record
+
+
+def test_parse_sample_rates():
+    assert parse_sample_rates("a=0.5, b=2,c=-1,") == {"a": 0.5, "b": 1.0, "c": 0.0}
+    assert parse_sample_rates("") == {}
+    with pytest.raises(ValueError):
+        parse_sample_rates("a=often")
+
+
+def test_sampling_filter_keeps_fraction_of_tagged_events(monkeypatch):
+    sampler = SamplingFilter({"hot": 0.25, "off": 0.0})
+    draws = iter([0.1, 0.3, 0.2, 0.9])
+    monkeypatch.setattr(logsetup.random, "random", lambda: next(draws))
+    kept = [sampler.filter(make_record(event="hot")) for _ in range(4)]
+    assert kept == [True, False, True, False]
+    assert not sampler.filter(make_record(event="off"))
+    # Untagged events, unlisted events and warnings always pass
+    assert sampler.filter(make_record())
+    assert sampler.filter(make_record(event="cold"))
+    assert sampler.filter(make_record(event="off", level=logging.WARNING))
+    assert sampler.dropped == 3
+
+
+def test_json_formatter_has_fixed_fields():
+    line = JsonFormatter().format(make_record(event="update.handled", update_id=7, handler="handle_start", latency_ms=1.5))
+    entry = json.loads(line)
+    assert entry["msg"] == "hello world"
+    assert entry["update_id"] == 7 and entry["handler"] == "handle_start" and entry["latency_ms"] == 1.5
+    # Fields the call site did not provide are still present
+    entry = json.loads(JsonFormatter().format(make_record()))
+    assert set(logsetup.STRUCTURED_FIELDS) <= set(entry) and entry["update_id"] is None
+
+
+def test_background_logging_formats_on_listener_thread():
+    stream = io.StringIO()
+    rendered = []
+
+    class Payload:
+        def __str__(self):
+            rendered.append(True)
+            return "payload"
+
+    root = logging.getLogger()
+    level = root.level
+    try:
+        logsetup.configure_logging(fmt="json", background=True, sample_rates={"noise": 0.0}, stream=stream)
+        log = logging.getLogger("menfes.test")
+        log.info("dropped %s", Payload(), extra={"event": "noise"})
+        log.info("kept %s", Payload(), extra={"update_id": 3})
+        logsetup.stop_logging()
+    finally:
+        root.removeHandler(logsetup._handler)
+        logsetup._handler = None
+        root.setLevel(level)
+
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [line["msg"] for line in lines] == ["kept payload"]
+    assert lines[0]["update_id"] == 3
+    # Our handler rendered it on the listener thread, not in the caller
+    assert any(thread is not threading.current_thread() for thread in rendered)
@@ -0,0 +1,130 @@
+import time
+from types import SimpleNamespace
+
+from membership import MembershipCache, MembershipChecker
+
+CHATS = ["@a", "@b", "@c"]
+
+
+def make_lookup(statuses, delays=None):
+    delays = delays or {}
+
+    def get_chat_member(chat, user_id, timeout=None):
+        time.sleep(delays.get(chat, 0))
+        status = statuses[chat]
+        if isinstance(status, Exception):
+            raise status
+        return SimpleNamespace(status=status)
+
+    return get_chat_member
+
+
+def test_all_joined_returns_empty():
+    lookup = make_lookup({"@a": "member", "@b": "administrator", "@c": "creator"})
+    checker = MembershipChecker(lookup, CHATS)
+    assert checker.missing(1) == []
+    assert MembershipChecker(lookup, CHATS, parallel=False).missing(1) == []
+
+
+def test_parallel_latency_is_bounded_by_slowest_call():
+    lookup = make_lookup(dict.fromkeys(CHATS, "member"), dict.fromkeys(CHATS, 0.1))
+    checker = MembershipChecker(lookup, CHATS)
+    start = time.monotonic()
+    assert checker.missing(1) == []
+    assert time.monotonic() - start < 0.25
+
+
+def test_early_exit_on_first_not_joined():
+    lookup = make_lookup(
+        {"@a": "member", "@b": "left", "@c": "member"},
+        {"@a": 1.0, "@c": 1.0},
+    )
+    checker = MembershipChecker(lookup, CHATS)
+    start = time.monotonic()
+    assert checker.missing(1) == ["@b"]
+    assert time.monotonic() - start < 0.5
+
+
+def test_errors_and_timeouts_count_as_not_joined():
+    lookup = make_lookup(
+        {"@a": RuntimeError("boom"), "@b": "member", "@c": "member"},
+    )
+    assert MembershipChecker(lookup, CHATS).missing(1) == ["@a"]
+
+    slow = make_lookup(dict.fromkeys(CHATS, "member"), {"@c": 1.0})
+    assert MembershipChecker(slow, CHATS, timeout=0.1).missing(1) == ["@c"]
+
+
+def counting_lookup(statuses):
+    calls = []
+
+    def get_chat_member(chat, user_id, timeout=None):
+        calls.append(chat)
+        status = statuses[chat]
+        if isinstance(status, Exception):
+            raise status
+        return SimpleNamespace(status=status)
+
+    return get_chat_member, calls
+
+
+def test_cache_skips_api_calls_for_repeat_members():
+    lookup, calls = counting_lookup(dict.fromkeys(CHATS, "member"))
+    cache = MembershipCache()
+    checker = MembershipChecker(lookup, CHATS, cache=cache)
+    assert checker.missing(1) == []
+    assert checker.missing(1) == []
+    assert len(calls) == 3
+    assert cache.stats()["hits"] == 3
+
+
+def test_cache_negative_answer_uses_short_ttl():
+    lookup, calls = counting_lookup({"@a": "member", "@b": "left", "@c": "member"})
+    cache = MembershipCache(negative_ttl=0.05)
+    checker = MembershipChecker(lookup, CHATS, cache=cache, parallel=False)
+    assert checker.missing(1) == ["@b"]
+    assert checker.missing(1) == ["@b"]
+    assert calls.count("@b") == 1
+    time.sleep(0.06)
+    assert checker.missing(1) == ["@b"]
+    assert calls.count("@b") == 2
+
+
+def test_cache_does_not_store_api_errors():
+    lookup, calls = counting_lookup({"@a": RuntimeError("down"), "@b": "member", "@c": "member"})
+    checker = MembershipChecker(lookup, CHATS, cache=MembershipCache(), parallel=False)
+    assert checker.missing(1) == ["@a"]
+    assert checker.missing(1) == ["@a"]
+    assert calls.count("@a") == 2
+
+
+def test_cache_evicts_least_recently_used():
+    cache = MembershipCache(max_bytes=MembershipCache.ENTRY_BYTES * 2)
+    cache.set("@a", 1, True)
+    cache.set("@a", 2, True)
+    assert cache.get("@a", 1) is True
+    cache.set("@a", 3, True)
+    assert cache.get("@a", 2) is None
+    assert cache.get("@a", 1) is True
+    assert cache.stats()["evictions"] == 1
+
+
+def test_every_call_gets_the_timeout():
+    timeouts = []
+
+    def get_chat_member(chat, user_id, timeout=None):
+        timeouts.append(timeout)
+        return SimpleNamespace(status="member")
+
+    assert MembershipChecker(get_chat_member, CHATS, timeout=0.5).missing(1) == []
+    assert MembershipChecker(get_chat_member, ["@a"], timeout=0.5, parallel=False).missing(1) == []
+    assert timeouts == [0.5] * 4
+
+
+def test_not_joined_is_logged_lazily_with_its_event(caplog):
+    checker = MembershipChecker(make_lookup({"@a": "left"}), ["@a"])
+    with caplog.at_level("INFO", logger="membership"):
+        assert checker.lookup("@a", 7) is False
+    record = caplog.records[-1]
+    assert record.event == "membership.missing"
+    assert (record.msg, record.args) == ("User %s not a member of %s", (7, "@a"))
@@ -0,0 +1,99 @@
+import threading
+
+import pytest
+
+from metrics import ApiCallMetrics, Registry
+from outbound import OutboundScheduler
+
+from .test_outbound import ApiError, FakeBot
+
+
+def samples(registry):
+    """{'name{labels}': value} for every sample line"""
+    result = {}
+    for line in registry.render().splitlines():
+        if not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            result[name] = float(value)
+    return result
+
+
+def test_counter_sums_across_threads():
+    registry = Registry()
+    counter = registry.counter("hits_total", "Hits", ("path",))
+    child = counter.labels("/")
+
+    def work():
+        for _ in range(10_000):
+            child.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert samples(registry) == {'hits_total{path="/"}': 80_000}
+
+
+def test_histogram_exposition():
+    registry = Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert samples(registry) == {
+        'latency_seconds_bucket{le="0.1"}': 2,
+        'latency_seconds_bucket{le="1"}': 3,
+        'latency_seconds_bucket{le="+Inf"}': 4,
+        "latency_seconds_sum": 3.65,
+        "latency_seconds_count": 4,
+    }
+
+
+def test_gauges_labels_and_names_are_checked():
+    registry = Registry()
+    depth = [3]
+    registry.gauge("queue_depth", "Depth", lambda: depth[0])
+    registry.gauge("broken", "Raises", lambda: 1 / 0)
+    counter = registry.counter("escaped_total", "Escaping", ("value",))
+    counter.labels('a "quoted"\nvalue').inc(2)
+    assert samples(registry)["queue_depth"] == 3
+    assert samples(registry)['escaped_total{value="a \\"quoted\\"\\nvalue"}'] == 2
+    # A failing gauge is skipped rather than failing the scrape
+    assert "broken" not in samples(registry)
+    with pytest.raises(ValueError):
+        counter.labels()
+    with pytest.raises(ValueError):
+        registry.counter("queue_depth", "Duplicate")
+
+
+def test_api_metrics_record_calls_errors_and_latency():
+    registry = Registry()
+    api = ApiCallMetrics(registry)
+
+    def get_me():
+        return "me"
+
+    def get_chat_member(chat_id, user_id):
+        raise ApiError(400)
+
+    assert api.wrap("get_me", get_me)() == "me"
+    with pytest.raises(ApiError):
+        api.wrap("get_chat_member", get_chat_member)("@chan", 1)
+    values = samples(registry)
+    assert values['menfes_bot_api_calls_total{method="get_me"}'] == 1
+    assert values['menfes_bot_api_errors_total{method="get_me"}'] == 0
+    assert values['menfes_bot_api_errors_total{method="get_chat_member"}'] == 1
+    assert values['menfes_bot_api_call_duration_seconds_count{method="get_chat_member"}'] == 1
+
+
+def test_outbound_scheduler_records_api_calls():
+    registry = Registry()
+    scheduler = OutboundScheduler(FakeBot(failures=[ApiError(429, retry_after=0.01)]), api_metrics=ApiCallMetrics(registry))
+    assert scheduler.wait([scheduler.send_message(1, "hi")], 5)
+    scheduler.shutdown()
+    values = samples(registry)
+    # The rate-limited call and its successful retry
+    assert values['menfes_bot_api_calls_total{method="send_message"}'] == 2
+    assert values['menfes_bot_api_errors_total{method="send_message"}'] == 1
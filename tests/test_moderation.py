@@ -0,0 +1,54 @@
+import os
+
+from moderation import Moderator, WordFilter, parse_blocklist
+from textnorm import skeleton
+
+from .fixtures import Clock
+
+
+def test_skeleton_undoes_common_evasions():
+    assert skeleton("anjing") == "anjing"
+    assert skeleton("4NJ!iinggg") == "anjing"
+    assert skeleton("a.n.j.i.n.g") == "anjing"
+    assert skeleton("b a b i") == "babi"
+    assert skeleton("bangsat!") == "bangsat"
+
+
+def test_entries_match_whole_words_unless_starred():
+    words = WordFilter(["ass", "anjing*", "*bodoh", "dasar goblok"])
+    assert words.find("you ass") == ["ass"]
+    assert words.find("first class pass") == []
+    assert words.find("anjingnya lari") == ["anjing*"]
+    assert words.find("kamu sangatbodoh") == ["*bodoh"]
+    assert words.find("Dasar... GOBLOK!") == ["dasar goblok"]
+    assert words.find("dasar baik") == []
+
+
+def test_overlapping_entries_are_all_found_once():
+    words = WordFilter(["babi", "babi hutan", "hutan*"])
+    assert sorted(words.find("babi hutan babi")) == ["babi", "babi hutan", "hutan*"]
+    assert len(words) == 3
+
+
+def test_parse_blocklist_skips_comments_and_blanks():
+    assert parse_blocklist("# header\n\nanjing*\n  babi  \n   # note\n") == ["anjing*", "babi"]
+
+
+def test_moderator_reloads_changed_file(tmp_path):
+    path = tmp_path / "blocklist.txt"
+    path.write_text("babi\n", encoding="utf-8")
+    clock = Clock()
+    moderator = Moderator(str(path), check_interval=5.0, clock=clock)
+    assert moderator.check("dasar b4bi") == ["babi"]
+    path.write_text("babi\nkampret\n", encoding="utf-8")
+    os.utime(path, ns=(1, 1))
+    assert moderator.check("kampret") == []  # not due for a check yet
+    clock.now += 5
+    assert moderator.check("kampret") == ["kampret"]
+    assert moderator.stats()["reloads"] == 2
+
+
+def test_missing_blocklist_filters_nothing(tmp_path):
+    moderator = Moderator(str(tmp_path / "missing.txt"), clock=Clock())
+    assert moderator.check("anjing") == []
+    assert moderator.stats()["entries"] == 0
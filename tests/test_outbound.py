@@ -0,0 +1,156 @@
+import time
+
+from outbound import PRIORITY_CHANNEL, PRIORITY_REPLY, OutboundScheduler, PersistentQueue, TokenBucket
+
+from .fixtures import FakeBot
+
+
+class ApiError(Exception):
+    def __init__(self, error_code, retry_after=None):
+        super().__init__(f"Error code: {error_code}")
+        self.error_code = error_code
+        self.result_json = {"error_code": error_code, "description": "x"}
+        if retry_after is not None:
+            self.result_json["parameters"] = {"retry_after": retry_after}
+
+
+def test_token_bucket_delay():
+    bucket = TokenBucket(rate=10, capacity=2)
+    now = time.monotonic()
+    bucket.consume(now)
+    bucket.consume(now)
+    assert 0.09 < bucket.delay(now) <= 0.1
+
+
+def test_messages_to_one_chat_keep_order():
+    bot = FakeBot()
+    scheduler = OutboundScheduler(bot, private_rate=1000, private_burst=1000, senders=4)
+    futures = [scheduler.send_message(1, str(i)) for i in range(20)]
+    assert scheduler.wait(futures, 5)
+    assert [text for _, text, _ in bot.sent] == [str(i) for i in range(20)]
+    scheduler.shutdown()
+
+
+def test_per_chat_rate_limit_spaces_sends():
+    bot = FakeBot()
+    scheduler = OutboundScheduler(bot, private_rate=20, private_burst=1)
+    futures = [scheduler.send_message(1, str(i)) for i in range(4)]
+    assert scheduler.wait(futures, 5)
+    times = [t for _, _, t in bot.sent]
+    assert times[-1] - times[0] >= 0.14
+    scheduler.shutdown()
+
+
+def test_retry_after_is_honored():
+    bot = FakeBot(failures=[ApiError(429, retry_after=0.2)])
+    scheduler = OutboundScheduler(bot)
+    start = time.monotonic()
+    result = scheduler.send_message(1, "hi").result(5)
+    assert result["text"] == "hi"
+    assert time.monotonic() - start >= 0.2
+    assert scheduler.stats()["rate_limited"] == 1
+    scheduler.shutdown()
+
+
+def test_permanent_errors_fail_the_job():
+    bot = FakeBot(failures=[ApiError(400)])
+    scheduler = OutboundScheduler(bot)
+    future = scheduler.send_message(1, "hi")
+    assert isinstance(future.exception(5), ApiError)
+    assert scheduler.stats()["failed"] == 1
+    scheduler.shutdown()
+
+
+def test_replies_go_before_channel_posts_under_global_limit():
+    bot = FakeBot()
+    scheduler = OutboundScheduler(bot, global_rate=1000, senders=1)
+    scheduler.global_bucket = TokenBucket(rate=50, capacity=1)
+    scheduler.global_bucket.tokens = 0
+    futures = [scheduler.send_message(-100 - i, f"post {i}", priority=PRIORITY_CHANNEL) for i in range(3)]
+    futures.append(scheduler.send_message(7, "reply", priority=PRIORITY_REPLY))
+    assert scheduler.wait(futures, 5)
+    assert bot.sent[0][1] == "reply"
+    scheduler.shutdown()
+
+
+def test_on_done_follow_ups_are_collected():
+    bot = FakeBot()
+    scheduler = OutboundScheduler(bot)
+    with scheduler.collect() as collected:
+        scheduler.send_message(-100, "post", on_done=lambda result, error: scheduler.send_message(1, "done"))
+    assert scheduler.wait(collected, 5)
+    assert [text for _, text, _ in bot.sent] == ["post", "done"]
+    scheduler.shutdown()
+
+
+def test_persisted_jobs_survive_restart(tmp_path):
+    path = str(tmp_path / "outbound.db")
+    stalled = OutboundScheduler(FakeBot(), group_rate=0.001, group_burst=1, store=PersistentQueue(path))
+    stalled.global_bucket.tokens = 0
+    stalled.global_bucket.rate = 0.001
+    stalled.send_message(-100, "confession", priority=PRIORITY_CHANNEL, persist=True)
+    assert len(stalled.store) == 1
+
+    bot = FakeBot()
+    restarted = OutboundScheduler(bot, store=PersistentQueue(path))
+    assert restarted.restore() == 1
+    deadline = time.monotonic() + 5
+    while not bot.sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert bot.sent[0][:2] == (-100, "confession")
+    restarted.shutdown()
+    assert len(PersistentQueue(path)) == 0
+
+
+def test_transient_errors_retry_persisted_jobs_only(tmp_path):
+    failures = [ConnectionError("reset")] * 3
+    bot = FakeBot(failures=failures)
+    scheduler = OutboundScheduler(bot, max_attempts=1, max_backoff=0.01, store=PersistentQueue(str(tmp_path / "q.db")))
+    assert isinstance(scheduler.send_message(1, "reply").exception(5), ConnectionError)
+    assert scheduler.send_message(-100, "post", persist=True).result(5)["text"] == "post"
+    assert scheduler.stats()["retried"] == 2
+    scheduler.shutdown()
+
+
+def test_delayed_jobs_do_not_hold_up_their_chat():
+    bot = FakeBot()
+    scheduler = OutboundScheduler(bot, group_rate=1000, group_burst=1000)
+    submitted = time.monotonic()
+    later = scheduler.send_message(-100, "later", priority=PRIORITY_CHANNEL, delay=0.2)
+    scheduler.send_message(-100, "now", priority=PRIORITY_CHANNEL).result(5)
+    later.result(5)
+    assert [text for _, text, _ in bot.sent] == ["now", "later"]
+    assert bot.sent[1][2] - submitted >= 0.2
+    scheduler.shutdown()
+
+
+def test_delayed_jobs_are_not_collected():
+    bot = FakeBot()
+    scheduler = OutboundScheduler(bot)
+    with scheduler.collect() as collected:
+        later = scheduler.send_message(-100, "later", priority=PRIORITY_CHANNEL, delay=0.5)
+        scheduler.send_message(1, "reply")
+    started = time.monotonic()
+    assert scheduler.wait(collected, 5)
+    assert time.monotonic() - started < 0.4
+    assert [text for _, text, _ in bot.sent] == ["reply"]
+    later.result(5)
+    scheduler.shutdown()
+
+
+def test_submit_many_persists_in_one_transaction_and_sends_in_order(tmp_path):
+    bot = FakeBot()
+    store = PersistentQueue(str(tmp_path / "q.db"))
+    scheduler = OutboundScheduler(bot, group_rate=1000, group_burst=1000, store=store)
+    done = []
+    futures = scheduler.submit_many(
+        "send_message",
+        [(-100, {"text": str(i)}, lambda result, error, i=i: done.append(i)) for i in range(5)],
+        priority=PRIORITY_CHANNEL,
+        persist=True,
+    )
+    assert scheduler.wait(futures, 5)
+    assert [text for _, text, _ in bot.sent] == ["0", "1", "2", "3", "4"]
+    assert sorted(done) == [0, 1, 2, 3, 4]
+    assert len(store) == 0
+    scheduler.shutdown()
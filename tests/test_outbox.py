@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+
+import pytest
+
+import outbox
+from outbound import PRIORITY_CHANNEL, OutboundScheduler, PersistentQueue
+from outbox import OutboxLog, import_jobs
+
+from .fixtures import FakeBot
+
+
+def segments(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".log"))
+
+
+def test_pending_jobs_survive_reopening(tmp_path):
+    log = OutboxLog(str(tmp_path))
+    first = log.add("send_message", -100, {"chat_id": -100, "text": "één"}, PRIORITY_CHANNEL)
+    second = log.add("send_message", -100, {"chat_id": -100, "text": "two"}, PRIORITY_CHANNEL)
+    log.remove(first)
+    log.close()
+
+    reopened = OutboxLog(str(tmp_path))
+    assert reopened.pending() == [(second, "send_message", -100, {"chat_id": -100, "text": "two"}, PRIORITY_CHANNEL)]
+    # Ids keep growing across restarts
+    assert reopened.add("send_message", -100, {}, PRIORITY_CHANNEL) > second
+    reopened.close()
+
+
+def test_concurrent_adds_share_fsyncs(tmp_path, monkeypatch):
+    fsync = os.fsync
+
+    def slow_fsync(fd):
+        time.sleep(0.005)
+        fsync(fd)
+
+    monkeypatch.setattr(outbox.os, "fsync", slow_fsync)
+    log = OutboxLog(str(tmp_path))
+    start = threading.Barrier(16)
+
+    def writer():
+        start.wait()
+        for _ in range(10):
+            log.add("send_message", -100, {"text": "x"}, PRIORITY_CHANNEL)
+
+    threads = [threading.Thread(target=writer) for _ in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stats = log.stats()
+    assert stats["records"] == len(log) == 160
+    assert stats["commits"] < 80
+    log.close()
+    assert len(OutboxLog(str(tmp_path))) == 160
+
+
+def test_add_many_is_one_commit(tmp_path):
+    log = OutboxLog(str(tmp_path))
+    ids = log.add_many([("send_message", -100, {"text": str(i)}, PRIORITY_CHANNEL) for i in range(20)])
+    assert ids == sorted(ids) and len(set(ids)) == 20
+    assert log.stats()["commits"] == 1
+    log.close()
+    assert [job[3]["text"] for job in OutboxLog(str(tmp_path)).pending()] == [str(i) for i in range(20)]
+
+
+def test_drained_segments_are_deleted_oldest_first(tmp_path):
+    log = OutboxLog(str(tmp_path), segment_bytes=200)
+    ids = [log.add("send_message", -100, {"text": "x" * 50}, PRIORITY_CHANNEL) for _ in range(6)]
+    assert len(segments(tmp_path)) >= 3
+    # The oldest job still pending keeps its segment and every later one
+    for job_id in ids[1:]:
+        log.remove(job_id)
+    log.add("send_message", -100, {"text": "y"}, PRIORITY_CHANNEL)
+    assert segments(tmp_path)[0] == "outbox-00000001.log"
+    log.remove(ids[0])
+    log.add("send_message", -100, {"text": "z"}, PRIORITY_CHANNEL)
+    log.close()
+    assert "outbox-00000001.log" not in segments(tmp_path)
+    assert [job[3]["text"] for job in OutboxLog(str(tmp_path)).pending()] == ["y", "z"]
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    log = OutboxLog(str(tmp_path))
+    log.add("send_message", -100, {"text": "kept"}, PRIORITY_CHANNEL)
+    log.close()
+    with open(tmp_path / segments(tmp_path)[-1], "ab") as f:
+        f.write(b"\x40\x00\x00\x00garbage")
+
+    reopened = OutboxLog(str(tmp_path))
+    assert [job[3]["text"] for job in reopened.pending()] == ["kept"]
+    reopened.add("send_message", -100, {"text": "after"}, PRIORITY_CHANNEL)
+    reopened.close()
+    assert [job[3]["text"] for job in OutboxLog(str(tmp_path)).pending()] == ["kept", "after"]
+
+
+def test_failed_write_is_reported_and_not_pending(tmp_path, monkeypatch):
+    log = OutboxLog(str(tmp_path))
+
+    def broken_fsync(fd):
+        raise OSError("disk full")
+
+    monkeypatch.setattr(outbox.os, "fsync", broken_fsync)
+    with pytest.raises(OSError):
+        log.add("send_message", -100, {"text": "lost"}, PRIORITY_CHANNEL)
+    assert len(log) == 0
+    monkeypatch.undo()
+    log.add("send_message", -100, {"text": "next"}, PRIORITY_CHANNEL)
+    log.close()
+    assert [job[3]["text"] for job in OutboxLog(str(tmp_path)).pending()] == ["next"]
+
+
+def test_scheduler_replays_the_log_after_restart(tmp_path):
+    directory = str(tmp_path / "outbox")
+    stalled = OutboundScheduler(FakeBot(), group_rate=0.001, group_burst=1, store=OutboxLog(directory))
+    stalled.global_bucket.tokens = 0
+    stalled.global_bucket.rate = 0.001
+    stalled.send_message(-100, "confession", priority=PRIORITY_CHANNEL, persist=True)
+    assert len(stalled.store) == 1
+
+    bot = FakeBot()
+    restarted = OutboundScheduler(bot, store=OutboxLog(directory))
+    assert restarted.restore() == 1
+    deadline = time.monotonic() + 5
+    while not bot.sent and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert [sent[:2] for sent in bot.sent] == [(-100, "confession")]
+    restarted.shutdown()
+    assert len(OutboxLog(directory)) == 0
+
+
+def test_import_jobs_moves_a_sqlite_queue_into_the_log(tmp_path):
+    legacy = PersistentQueue(str(tmp_path / "outbound_queue.db"))
+    for text in ("a", "b"):
+        legacy.add("send_message", -100, {"chat_id": -100, "text": text}, PRIORITY_CHANNEL)
+    log = OutboxLog(str(tmp_path / "log"))
+    assert import_jobs(legacy, log) == 2
+    assert len(legacy) == 0
+    assert [job[3]["text"] for job in log.pending()] == ["a", "b"]
+    assert import_jobs(legacy, log) == 0
+    log.close()
+    legacy.close()
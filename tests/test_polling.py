@@ -0,0 +1,129 @@
+import threading
+import time
+
+from dispatch import DispatchRejected
+from polling import OffsetStore, UpdatePoller
+from tests.fixtures import message_update
+
+
+def test_offset_store_round_trip(tmp_path):
+    store = OffsetStore(str(tmp_path / "offset"))
+    assert store.load() is None
+    store.save(42)
+    store.save(43)
+    assert OffsetStore(store.path).load() == 43
+    assert [p.name for p in tmp_path.iterdir()] == ["offset"]
+
+
+def test_offset_store_ignores_garbage(tmp_path):
+    path = tmp_path / "offset"
+    path.write_text("not a number")
+    assert OffsetStore(str(path)).load() is None
+
+
+class FakeTelegram:
+    """getUpdates over a list of updates: an offset confirms everything before it"""
+
+    def __init__(self, count, batch=3, fail_first=0):
+        self.updates = [message_update(i, f"msg {i}", 100 + i % 3) for i in range(1, count + 1)]
+        self.batch = batch
+        self.fail_first = fail_first
+        self.offsets = []
+        self.in_flight = threading.Event()
+
+    def fetch(self, offset, timeout, limit):
+        self.offsets.append(offset)
+        if self.fail_first:
+            self.fail_first -= 1
+            raise ConnectionError("network down")
+        self.in_flight.set()
+        pending = [u for u in self.updates if offset is None or u["update_id"] >= offset]
+        if not pending:
+            time.sleep(0.01)
+        return pending[: min(limit, self.batch)]
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.005)
+    return False
+
+
+def test_updates_are_dispatched_in_order_and_the_offset_saved(tmp_path):
+    telegram = FakeTelegram(10)
+    seen = []
+    store = OffsetStore(str(tmp_path / "offset"))
+    poller = UpdatePoller(telegram.fetch, lambda view: seen.append(view.update_id), store, limit=100)
+    poller.start()
+    assert wait_for(lambda: poller.offset == 11)
+    poller.stop(timeout=5)
+    assert seen == list(range(1, 11))
+    assert store.load() == 11
+    assert telegram.offsets[:4] == [None, 4, 7, 10]
+    assert poller.stats()["updates"] == 10
+
+
+def test_restart_resumes_from_the_saved_offset(tmp_path):
+    store = OffsetStore(str(tmp_path / "offset"))
+    store.save(6)
+    telegram = FakeTelegram(8)
+    seen = []
+    poller = UpdatePoller(telegram.fetch, lambda view: seen.append(view.update_id), store)
+    poller.start()
+    assert wait_for(lambda: poller.offset == 9)
+    poller.stop(timeout=5)
+    assert telegram.offsets[0] == 6
+    assert seen == [6, 7, 8]
+
+
+def test_next_poll_runs_while_a_batch_is_dispatched(tmp_path):
+    telegram = FakeTelegram(6)
+    release = threading.Event()
+
+    def submit(view):
+        release.wait(5)
+
+    poller = UpdatePoller(telegram.fetch, submit, OffsetStore(str(tmp_path / "offset")))
+    poller.start()
+    # The first batch is stuck in submit, yet the second has already been fetched
+    assert wait_for(lambda: telegram.offsets[:2] == [None, 4])
+    assert poller.offset is None
+    release.set()
+    assert wait_for(lambda: poller.offset == 7)
+    poller.stop(timeout=5)
+
+
+def test_rejected_updates_are_retried_not_dropped(tmp_path):
+    telegram = FakeTelegram(3)
+    seen = []
+    rejections = [2]
+
+    def submit(view):
+        if view.update_id == 2 and rejections[0]:
+            rejections[0] -= 1
+            raise DispatchRejected("full")
+        seen.append(view.update_id)
+
+    poller = UpdatePoller(telegram.fetch, submit, OffsetStore(str(tmp_path / "offset")))
+    poller.start()
+    assert wait_for(lambda: poller.offset == 4)
+    poller.stop(timeout=5)
+    assert seen == [1, 2, 3]
+    assert poller.stats()["dispatch_retries"] == 2
+
+
+def test_fetch_errors_back_off_and_recover(tmp_path):
+    telegram = FakeTelegram(2, fail_first=2)
+    seen = []
+    poller = UpdatePoller(
+        telegram.fetch, lambda view: seen.append(view.update_id), OffsetStore(str(tmp_path / "offset")),
+        retry_interval=0.01,
+    )
+    poller.start()
+    assert wait_for(lambda: poller.offset == 3)
+    poller.stop(timeout=5)
+    assert seen == [1, 2]
+    assert poller.stats()["errors"] == 2
@@ -0,0 +1,137 @@
+import threading
+
+from ratelimit import SubmissionLimiter, gcra
+from state_backend import MemoryBackend, SqliteBackend
+
+from .fixtures import Clock
+
+# Wall-clock time, as the limiter's default clock gives
+START = 1_700_000_000.0
+
+
+def test_gcra_allows_a_burst_then_one_per_interval():
+    tat, now = 0.0, 100.0
+    results = []
+    for _ in range(4):
+        allowed, value = gcra(tat, now, 10.0, 20.0)
+        results.append(allowed)
+        if allowed:
+            tat = value
+    assert results == [True, True, True, False]
+    assert gcra(tat, now + 10, 10.0, 20.0)[0]
+
+
+def test_per_user_limit_and_retry_after():
+    clock = Clock(START)
+    limiter = SubmissionLimiter(3, 3600, clock=clock)
+    assert [limiter.acquire(7) for _ in range(3)] == [None, None, None]
+    limited = limiter.acquire(7)
+    assert limited.scope == "user" and limited.retry_after == 1200
+    # Other users are not affected
+    assert limiter.acquire(8) is None
+    clock.now += 1200
+    assert limiter.acquire(7) is None
+    assert limiter.acquire(7) is not None
+
+
+def test_global_limit_covers_every_user():
+    clock = Clock(START)
+    limiter = SubmissionLimiter(0, 3600, global_limit=2, global_period=60, clock=clock)
+    assert limiter.acquire(1) is None and limiter.acquire(2) is None
+    limited = limiter.acquire(3)
+    assert limited.scope == "global" and limited.retry_after == 30
+    stats = limiter.stats()
+    assert stats["allowed"] == 2 and stats["limited"] == 1
+
+
+def test_refused_submissions_are_not_counted():
+    clock = Clock(START)
+    limiter = SubmissionLimiter(1, 60, global_limit=100, global_period=60, clock=clock)
+    limiter.acquire(1)
+    for _ in range(50):
+        limiter.acquire(1)
+    # Only the one allowed submission used up global capacity
+    assert all(limiter.acquire(user) is None for user in range(2, 101))
+
+
+def test_memory_stays_bounded_with_many_users():
+    clock = Clock(START)
+    limiter = SubmissionLimiter(2, 3600, slots=1024, clock=clock)
+    for user in range(1, 100_001):
+        limiter.acquire(user)
+    assert limiter.stats()["slots"] == 1024
+    assert limiter.stats()["evicted"] > 0
+    # Recent users still have their state
+    limiter.acquire(100_000)
+    assert limiter.acquire(100_000) is not None
+
+
+def test_expired_state_frees_the_slot():
+    clock = Clock(START)
+    limiter = SubmissionLimiter(1, 10, slots=4, ways=4, clock=clock)
+    for user in range(1, 5):
+        limiter.acquire(user)
+    clock.now += 11
+    limiter.acquire(5)
+    assert limiter.stats()["evicted"] == 0
+
+
+def test_workers_share_limits_through_the_backend(tmp_path):
+    clock = Clock(START)
+    backend = SqliteBackend(str(tmp_path / "state.db"))
+    workers = [SubmissionLimiter(2, 3600, global_limit=10, backend=backend, clock=clock) for _ in range(2)]
+    assert workers[0].acquire(7) is None
+    assert workers[1].acquire(7) is None
+    assert workers[0].acquire(7).scope == "user"
+    assert workers[1].acquire(7).scope == "user"
+    backend.close()
+
+
+def test_backend_errors_fall_back_to_local_limits():
+    class Broken(MemoryBackend):
+        def get_many(self, keys):
+            raise ConnectionError("down")
+
+    limiter = SubmissionLimiter(1, 3600, backend=Broken(), clock=Clock(START))
+    assert limiter.acquire(7) is None
+    assert limiter.acquire(7) is not None
+    assert limiter.stats()["backend_errors"] == 2
+
+
+def test_concurrent_acquires_never_exceed_the_limit():
+    limiter = SubmissionLimiter(5, 3600)
+    allowed = []
+
+    def submit():
+        for _ in range(10):
+            if limiter.acquire(42) is None:
+                allowed.append(1)
+
+    threads = [threading.Thread(target=submit) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(allowed) == 5
+
+
+def test_backend_round_trips_do_not_hold_the_lock():
+    release = threading.Event()
+
+    class Slow(MemoryBackend):
+        def get_many(self, keys):
+            if "limit:7" in keys:
+                release.wait(5)
+            return super().get_many(keys)
+
+    limiter = SubmissionLimiter(1, 3600, backend=Slow(), clock=Clock(START))
+    stalled = threading.Thread(target=limiter.acquire, args=(7,))
+    stalled.start()
+    try:
+        # Another user is not held up by user 7's slow read
+        assert limiter.acquire(8) is None
+        assert stalled.is_alive()
+    finally:
+        release.set()
+        stalled.join()
+    assert limiter.acquire(7) is not None
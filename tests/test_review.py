@@ -0,0 +1,109 @@
+import threading
+
+import pytest
+
+from review import ReviewQueue
+
+from .fixtures import Clock
+
+
+def test_posts_are_taken_once_and_oldest_first(tmp_path):
+    queue = ReviewQueue(str(tmp_path / "review.db"), clock=Clock())
+    ids = [queue.add(user_id, f"post {i}", "📝") for i, user_id in enumerate((1, 2, 1, 3))]
+    assert queue.take(ids[1]).user_id == 2
+    assert queue.take(ids[1]) is None
+    assert [post.text for post in queue.take_next(2)] == ["post 0", "post 2"]
+    assert [post.id for post in queue.take_next(5)] == [ids[3]]
+    assert len(queue) == 0
+    queue.close()
+
+
+def test_take_user_leaves_other_users_posts(tmp_path):
+    queue = ReviewQueue(str(tmp_path / "review.db"), clock=Clock())
+    for user_id in (7, 8, 7, 7):
+        queue.add(user_id, "x", "🚫 spam")
+    assert [post.user_id for post in queue.take_user(7)] == [7, 7, 7]
+    assert queue.take_user(7) == []
+    assert len(queue) == 1
+    queue.close()
+
+
+def test_queue_survives_reopening(tmp_path):
+    path = str(tmp_path / "review.db")
+    clock = Clock()
+    queue = ReviewQueue(path, clock=clock)
+    post_id = queue.add(5, "held", "⚠️ duplicate")
+    queue.close()
+
+    clock.now += 120
+    reopened = ReviewQueue(path, clock=clock)
+    assert reopened.stats()["pending"] == 1
+    assert reopened.stats()["oldest_age"] == 120
+    post = reopened.take(post_id)
+    assert (post.user_id, post.text, post.reason) == (5, "held", "⚠️ duplicate")
+    reopened.close()
+
+
+def test_concurrent_admins_decide_each_post_once(tmp_path):
+    path = str(tmp_path / "review.db")
+    queue = ReviewQueue(path)
+    for i in range(200):
+        queue.add(i, "x", "📝")
+    # Two workers sharing the file, each with admins pressing "approve next"
+    workers = [queue, ReviewQueue(path)]
+    taken = []
+    start = threading.Barrier(8)
+
+    def admin(worker):
+        start.wait()
+        while True:
+            posts = worker.take_next(7)
+            if not posts:
+                return
+            taken.extend(post.id for post in posts)
+
+    threads = [threading.Thread(target=admin, args=(workers[i % 2],)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert sorted(taken) == list(range(1, 201))
+    for worker in workers:
+        worker.close()
+
+
+def test_posts_stay_queued_when_handling_them_fails(tmp_path):
+    queue = ReviewQueue(str(tmp_path / "review.db"), clock=Clock())
+    for user_id in (1, 2):
+        queue.add(user_id, "held", "📝")
+
+    def fail(posts):
+        raise OSError("disk full")
+
+    with pytest.raises(OSError):
+        queue.take_next(2, fail)
+    assert len(queue) == 2
+    handled = []
+    assert [post.user_id for post in queue.take_next(2, handled.extend)] == [1, 2]
+    assert [post.user_id for post in handled] == [1, 2]
+    assert len(queue) == 0
+    queue.close()
+
+
+def test_language_is_kept_and_old_queues_get_the_column(tmp_path):
+    import sqlite3
+
+    path = str(tmp_path / "review.db")
+    old = sqlite3.connect(path)
+    old.execute(
+        "CREATE TABLE review (id INTEGER PRIMARY KEY AUTOINCREMENT, user_id INTEGER NOT NULL, "
+        "text TEXT NOT NULL, reason TEXT NOT NULL, created REAL NOT NULL)"
+    )
+    old.execute("INSERT INTO review (user_id, text, reason, created) VALUES (1, 'old', '📝', 0)")
+    old.commit()
+    old.close()
+
+    queue = ReviewQueue(path, clock=Clock())
+    queue.add(2, "new", "📝", "en")
+    assert [(post.text, post.language) for post in queue.take_next(2)] == [("old", None), ("new", "en")]
+    queue.close()
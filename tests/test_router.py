@@ -0,0 +1,106 @@
+import pytest
+
+from fastpath import UpdateView
+from router import Router
+
+from .fixtures import callback_update, message_update
+
+
+def make_router(steps=None):
+    steps = steps or {}
+    router = Router(step_lookup=lambda chat_id: steps.get(chat_id))
+    calls = []
+
+    def record(name):
+        def handler(arg):
+            calls.append((name, arg))
+        handler.__name__ = name
+        return handler
+
+    router.command("start")(record("start"))
+    router.callback("check_join")(record("check_join"))
+    router.callback_prefix("lang_")(record("lang"))
+    router.callback_prefix("lang_en_")(record("lang_en_variant"))
+    router.message(step="wait_msg", raw=True)(record("input"))
+    router.message(raw=True)(record("fallback"))
+    return router, calls
+
+
+def route_name(router, update):
+    route = router.resolve(UpdateView(update))
+    return route.name if route else None
+
+
+def test_callbacks_exact_then_longest_prefix():
+    router, _ = make_router()
+    assert route_name(router, callback_update(1, "check_join", "c", "m")) == "check_join"
+    assert route_name(router, callback_update(1, "lang_id", "c", "m")) == "lang"
+    assert route_name(router, callback_update(1, "lang_en_us", "c", "m")) == "lang_en_variant"
+    assert route_name(router, callback_update(1, "lan", "c", "m")) is None
+    assert route_name(router, callback_update(1, "send_now", "c", "m")) is None
+
+
+def test_messages_by_command_then_step_then_default():
+    router, _ = make_router(steps={1: "wait_msg"})
+    assert route_name(router, message_update(1, "/start", user_id=1)) == "start"
+    assert route_name(router, message_update(1, "/start@TextMenfesbot", user_id=2)) == "start"
+    assert route_name(router, message_update(1, "rahasia", user_id=1)) == "input"
+    # Unknown commands are plain text to the step handler, like with telebot
+    assert route_name(router, message_update(1, "/help", user_id=1)) == "input"
+    assert route_name(router, message_update(1, "rahasia", user_id=2)) == "fallback"
+
+
+def test_chat_limited_commands_are_plain_text_elsewhere():
+    router, _ = make_router(steps={1: "wait_msg"})
+    router.command("approve", chats=lambda chat_id: chat_id == 555)(lambda message: None)
+    assert route_name(router, message_update(1, "/approve 5", user_id=555)) == "<lambda>"
+    assert route_name(router, message_update(1, "/approve 5", user_id=1)) == "input"
+    assert route_name(router, message_update(1, "/approve", user_id=2)) == "fallback"
+
+
+def test_reserved_chats_get_only_their_own_routes():
+    router, _ = make_router(steps={555: "wait_msg"})
+    router.reserved_chats = frozenset({555})
+    router.command("queue", chats=lambda chat_id: chat_id == 555)(lambda message: None)
+    router.callback_prefix("review_", chats=lambda chat_id: chat_id == 555)(lambda call: None)
+    assert route_name(router, message_update(1, "/queue", user_id=555)) == "<lambda>"
+    assert route_name(router, callback_update(1, "review_ok:1", "c", "m", user_id=555)) == "<lambda>"
+    for text in ("/start", "balasan admin"):
+        assert route_name(router, message_update(1, text, user_id=555)) is None
+    assert route_name(router, callback_update(1, "check_join", "c", "m", user_id=555)) is None
+    # Users elsewhere are unaffected, and cannot press the admin buttons
+    assert route_name(router, message_update(1, "/start", user_id=1)) == "start"
+    assert route_name(router, callback_update(1, "review_ok:1", "c", "m", user_id=1)) is None
+
+
+def test_non_text_and_other_updates_are_not_routed():
+    router, _ = make_router()
+    photo = message_update(1, None)
+    del photo["message"]["text"]
+    assert route_name(router, photo) is None
+    assert router.resolve(UpdateView({"update_id": 1, "edited_message": {}})) is None
+
+
+def test_dispatch_passes_view_or_telebot_object():
+    pytest.importorskip("telebot")
+    router, calls = make_router()
+    router.dispatch(UpdateView(callback_update(1, "check_join", "c", "m")))
+    router.dispatch(UpdateView(message_update(2, "halo")))
+    assert calls[0][0] == "check_join" and calls[0][1].data == "check_join"
+    assert calls[1][0] == "fallback" and isinstance(calls[1][1], UpdateView)
+
+
+def test_step_is_looked_up_once_per_update():
+    lookups = []
+    router = Router(step_lookup=lambda chat_id: lookups.append(chat_id))
+    router.message(step="wait_msg")(lambda message: None)
+    router.resolve(UpdateView(message_update(1, "halo")))
+    assert len(lookups) == 1
+
+
+def test_duplicate_routes_are_rejected():
+    router, _ = make_router()
+    with pytest.raises(ValueError):
+        router.callback("check_join")(lambda call: None)
+    with pytest.raises(ValueError):
+        router.callback_prefix("lang_")(lambda call: None)
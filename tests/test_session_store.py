@@ -0,0 +1,54 @@
+import time
+
+from session_store import STEP_CHOOSE_LANG, STEP_PREVIEW, STEP_VERIFYING, STEP_WAIT_MSG, Session, SessionStore
+
+
+def test_language_is_carried_across_steps():
+    store = SessionStore()
+    store.set(1, STEP_VERIFYING, language="en")
+    store.set(1, STEP_WAIT_MSG)
+    session = store.set(1, STEP_PREVIEW, text="halo", message_id=7)
+    assert (session.step, session.language, session.text, session.message_id) == (STEP_PREVIEW, "en", "halo", 7)
+    assert store.set(1, STEP_CHOOSE_LANG, language=None).language is None
+
+
+def test_idle_sessions_expire():
+    store = SessionStore(idle_timeout=0.05)
+    store.set(1, STEP_WAIT_MSG)
+    assert store.step(1) == STEP_WAIT_MSG
+    time.sleep(0.06)
+    assert store.get(1) is None
+    assert len(store) == 0
+    assert store.stats()["expirations"] == 1
+
+
+def test_expired_sessions_are_purged_on_write():
+    store = SessionStore(idle_timeout=0.05)
+    for user_id in range(10):
+        store.set(user_id, STEP_WAIT_MSG)
+    time.sleep(0.06)
+    store.set(99, STEP_WAIT_MSG)
+    assert len(store) == 1
+
+
+def test_lru_eviction_caps_size():
+    store = SessionStore(max_sessions=2)
+    store.set(1, STEP_WAIT_MSG)
+    store.set(2, STEP_WAIT_MSG)
+    store.get(1)
+    store.set(3, STEP_WAIT_MSG)
+    assert 2 not in store
+    assert 1 in store and 3 in store
+    assert store.stats()["evictions"] == 1
+
+
+def test_discard_releases_session():
+    store = SessionStore()
+    store.set(1, STEP_PREVIEW, text="x")
+    store.discard(1)
+    assert store.get(1) is None
+    assert store.stats()["live_sessions"] == 0
+
+
+def test_session_has_no_instance_dict():
+    assert not hasattr(Session(STEP_WAIT_MSG), "__dict__")
@@ -0,0 +1,60 @@
+from similarity import DuplicateIndex, simhash
+from textnorm import fold
+
+from .fixtures import Clock
+
+CONFESSION = (
+    "Aku suka banget sama kamu yang duduk di pojok perpustakaan tiap hari selasa, semoga kamu baca ini ya"
+)
+
+
+def test_fold_ignores_case_accents_and_punctuation():
+    assert fold("Café  MANTAP!!  \n") == "cafe mantap"
+    assert fold("…") == ""
+
+
+def test_simhash_is_stable_and_close_for_small_edits():
+    words = fold(CONFESSION).split()
+    assert simhash(words) == simhash(list(words))
+    edited = words + ["plis"]
+    assert bin(simhash(words) ^ simhash(edited)).count("1") < 16
+
+
+def test_exact_and_near_duplicates_are_found():
+    index = DuplicateIndex(clock=Clock())
+    index.add(index.fingerprint(CONFESSION), user_id=1)
+    exact = index.check(index.fingerprint(CONFESSION.upper() + "!!!"))
+    assert exact.exact and exact.user_id == 1
+    near = index.check(index.fingerprint(CONFESSION + " plis"))
+    assert near is not None and not near.exact and near.distance <= 3
+    assert index.check(index.fingerprint("Hari ini kantin penuh banget, ada yang tau kenapa? kayaknya ada acara")) is None
+
+
+def test_short_texts_only_match_exactly():
+    index = DuplicateIndex(clock=Clock())
+    index.add(index.fingerprint("halo semua"), user_id=1)
+    assert index.check(index.fingerprint("Halo, semua!")).exact
+    assert index.check(index.fingerprint("halo semuanya")) is None
+    index.add(index.fingerprint("🔥🔥🔥"), user_id=2)
+    assert index.check(index.fingerprint("🔥🔥🔥")).user_id == 2
+    assert index.check(index.fingerprint("🙏")) is None
+
+
+def test_entries_expire_after_the_window():
+    clock = Clock()
+    index = DuplicateIndex(window=60, clock=clock)
+    index.add(index.fingerprint(CONFESSION), user_id=1)
+    clock.now += 59
+    assert index.check(index.fingerprint(CONFESSION)).age == 59
+    clock.now += 2
+    assert index.check(index.fingerprint(CONFESSION)) is None
+    assert len(index) == 0
+
+
+def test_reused_slots_are_forgotten():
+    index = DuplicateIndex(capacity=4, clock=Clock())
+    index.add(index.fingerprint(CONFESSION), user_id=1)
+    for n in range(4):
+        index.add(index.fingerprint(f"pesan nomor {n} yang lain"), user_id=2)
+    assert index.check(index.fingerprint(CONFESSION)) is None
+    assert index.check(index.fingerprint("pesan nomor 3 yang lain")).user_id == 2
@@ -0,0 +1,100 @@
+import time
+
+import pytest
+
+from session_store import STEP_PREVIEW, STEP_VERIFYING, STEP_WAIT_MSG, SessionStore
+from state_backend import MemoryBackend, RedisBackend, SqliteBackend, create_backend
+
+from .resp_standin import RespStandin
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        yield MemoryBackend()
+    elif request.param == "sqlite":
+        backend = SqliteBackend(str(tmp_path / "state.db"))
+        yield backend
+        backend.close()
+    else:
+        server = RespStandin()
+        backend = RedisBackend(port=server.port)
+        backend.standin = server
+        yield backend
+        backend.close()
+        server.shutdown()
+        server.server_close()
+
+
+def test_backend_roundtrip(backend):
+    backend.set_many({"a": b"1", "b": b"2"}, ttl=60)
+    assert backend.get_many(["a", "b", "c"]) == {"a": b"1", "b": b"2"}
+    backend.set_many({"a": None})
+    assert backend.get("a") is None
+    assert backend.get("b") == b"2"
+
+
+def test_backend_ttl_expires(backend):
+    backend.set_many({"a": b"1"}, ttl=0.01)
+    time.sleep(0.03)
+    assert backend.get("a") is None
+
+
+def test_sessions_are_shared_between_workers(backend):
+    worker_a = SessionStore(backend=backend, cache_ttl=0)
+    worker_b = SessionStore(backend=backend, cache_ttl=0)
+
+    worker_a.set(1, STEP_VERIFYING, language="en")
+    worker_a.flush()
+    worker_b.set(1, STEP_WAIT_MSG)
+    worker_b.flush()
+
+    session = worker_a.get(1)
+    assert session.step == STEP_WAIT_MSG
+    assert session.language == "en"
+
+    worker_a.discard(1)
+    worker_a.flush()
+    assert worker_b.get(1) is None
+
+
+def test_writes_are_batched_until_flush(backend):
+    store = SessionStore(backend=backend)
+    for user_id in range(20):
+        store.set(user_id, STEP_PREVIEW, text=f"pesan {user_id}", language="id")
+    assert backend.get("3") is None
+    store.flush()
+    assert store.stats()["backend_writes"] == 1
+    assert SessionStore(backend=backend).get(3).text == "pesan 3"
+
+
+def test_cached_session_skips_backend_reads(backend):
+    store = SessionStore(backend=backend, cache_ttl=60)
+    store.set(1, STEP_WAIT_MSG)
+    store.flush()
+    reads = store.stats()["backend_reads"]
+    for _ in range(5):
+        assert store.step(1) == STEP_WAIT_MSG
+    assert store.stats()["backend_reads"] == reads
+
+
+def test_redis_batch_is_one_pipelined_write(tmp_path):
+    server = RespStandin()
+    try:
+        store = SessionStore(backend=RedisBackend(port=server.port))
+        for user_id in range(10):
+            store.set(user_id, STEP_WAIT_MSG)
+        store.flush()
+        assert sum(1 for cmd in server.commands if cmd[0] == b"SET") == 10
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_create_backend_urls(tmp_path):
+    assert create_backend("memory") is None
+    assert isinstance(create_backend(f"sqlite:///{tmp_path}/s.db"), SqliteBackend)
+    redis = create_backend("redis://:secret@localhost:6380/2")
+    assert (redis.host, redis.port, redis.db, redis.password) == ("localhost", 6380, 2, "secret")
+    with pytest.raises(ValueError):
+        create_backend("mongodb://localhost")
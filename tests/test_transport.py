@@ -0,0 +1,113 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from transport import TRANSPORT_HTTPX, TRANSPORT_REQUESTS, BotApiTransport, PoolExhausted
+
+from loadtest.fake_bot_api import FakeBotApi
+
+BACKENDS = [TRANSPORT_REQUESTS]
+try:
+    import httpx  # noqa: F401
+
+    BACKENDS.append(TRANSPORT_HTTPX)
+except ImportError:
+    pass
+
+
+@pytest.fixture
+def api():
+    server = FakeBotApi()
+    yield server
+    server.stop()
+
+
+@pytest.fixture(params=BACKENDS)
+def transport(request):
+    transport = BotApiTransport(pool_size=4, backend=request.param)
+    yield transport
+    transport.close()
+
+
+def call(transport, api, method="sendMessage", **params):
+    url = api.api_url.format("123:test", method)
+    return transport.request("post", url, params=params, timeout=(1, 2))
+
+
+def test_connections_are_reused_across_threads(transport, api):
+    with ThreadPoolExecutor(16) as pool:
+        responses = list(pool.map(lambda i: call(transport, api, chat_id=i, text=str(i)), range(200)))
+    assert all(response.status_code == 200 for response in responses)
+    assert responses[7].json()["result"]["chat"]["id"] == 7
+    # 16 threads, one shared pool: never more connections than pool slots
+    assert api.connections <= transport.pool_size
+    stats = transport.stats()
+    assert stats["requests"] == 200 and stats["in_use"] == 0
+    assert stats["max_in_use"] <= transport.pool_size
+
+
+def test_none_params_are_not_sent(transport, api):
+    call(transport, api, chat_id=1, text="hi", reply_markup=None)
+    assert api.calls[-1] == ("sendMessage", {"chat_id": "1", "text": "hi"})
+
+
+def test_busy_pool_is_measured_and_bounded(api):
+    api.latency = 0.1
+    transport = BotApiTransport(pool_size=2, backend=TRANSPORT_REQUESTS)
+    with ThreadPoolExecutor(6) as pool:
+        list(pool.map(lambda i: call(transport, api, chat_id=i), range(6)))
+    stats = transport.stats()
+    assert stats["max_in_use"] == 2 and api.max_active <= 2
+    assert stats["waits"] >= 4 and stats["wait_seconds"] > 0
+    transport.close()
+
+
+def test_pool_exhaustion_raises_after_connect_timeout(api):
+    api.latency = 0.5
+    transport = BotApiTransport(pool_size=1, backend=TRANSPORT_REQUESTS)
+    slow = threading.Thread(target=call, args=(transport, api))
+    slow.start()
+    while transport.in_use == 0:
+        time.sleep(0.005)
+    with pytest.raises(PoolExhausted):
+        transport.request("post", api.api_url.format("123:test", "getMe"), timeout=(0.05, 1))
+    slow.join()
+    assert transport.stats()["exhausted"] == 1
+    transport.close()
+
+
+def test_read_timeout_is_per_request(transport, api):
+    api.latency = 0.3
+    with pytest.raises(Exception):
+        transport.request("post", api.api_url.format("123:test", "getMe"), timeout=(1, 0.05))
+    assert transport.stats()["errors"] == 1
+
+
+def test_installed_into_telebot(transport, api, monkeypatch):
+    from telebot import TeleBot, apihelper
+
+    monkeypatch.setattr(apihelper, "API_URL", api.api_url)
+    monkeypatch.setattr(apihelper, "CUSTOM_REQUEST_SENDER", None)
+    monkeypatch.setattr(apihelper, "CONNECT_TIMEOUT", apihelper.CONNECT_TIMEOUT)
+    monkeypatch.setattr(apihelper, "READ_TIMEOUT", apihelper.READ_TIMEOUT)
+    transport.install()
+    bot = TeleBot("123:test", threaded=False)
+    assert bot.get_me().username == "TextMenfesbot"
+    assert bot.send_message(42, "halo").chat.id == 42
+    assert transport.stats()["requests"] == 2
+
+
+def test_timeout_caps_this_threads_requests(transport, api):
+    api.latency = 0.3
+    url = api.api_url.format("123:test", "getMe")
+    with transport.timeout(0.05):
+        with pytest.raises(Exception):
+            transport.request("post", url, timeout=(1, 1))
+        # A looser inner cap does not lift the outer one
+        with transport.timeout(5), pytest.raises(Exception):
+            transport.request("post", url, timeout=(1, 1))
+    assert transport.request("post", url, timeout=(1, 1)).status_code == 200
+    with transport.timeout(None):
+        assert transport.request("post", url, timeout=(1, 1)).status_code == 200